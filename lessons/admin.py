@@ -1,6 +1,6 @@
 """Configuration of the admin interface for MSMS"""
 from django.contrib import admin
-from .models import UserAccount,Lesson, Invoice, Transaction,Term
+from .models import UserAccount,Lesson, Invoice, Transaction,Term,LedgerEntry,InvoiceSequence
 # Register your models here.
 @admin.register(UserAccount)
 class UserAdmin(admin.ModelAdmin):
@@ -25,6 +25,16 @@ class TransactionAdmin(admin.ModelAdmin):
     list_display = ['Student_ID_transaction', 'invoice_reference_transaction', 'transaction_amount'
     ]
 
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ['family', 'student', 'entry_type', 'amount', 'invoice_reference', 'created_at'
+    ]
+
+@admin.register(InvoiceSequence)
+class InvoiceSequenceAdmin(admin.ModelAdmin):
+    list_display = ['student', 'last_number'
+    ]
+
 @admin.register(Term)
 class TermAdmin(admin.ModelAdmin):
     list_display = ['term_number', 'start_date', 'end_date'
@@ -0,0 +1,35 @@
+from .models import UserAccount, UserRole, Lesson, LessonStatus
+
+"""
+Sections of the admin feed.
+The admin feed page is only a shell of collapsed panels: each section is served a page at a time by the admin_feed_section view
+when its panel is expanded, so the shell renders without reading any student or lesson whatever the size of the school.
+The rows of a section are read with keyset pagination (see lessons/pagination.py), with only() restricted to the columns the
+section shows and with the teacher of a lesson joined in the same query.
+"""
+
+#Columns of the account and lesson tables, the rows are loaded with only these fields
+ACCOUNT_FIELDS = ('id', 'first_name', 'last_name', 'email', 'is_staff', 'is_active')
+LESSON_FIELDS = ('lesson_id', 'request_date', 'type', 'duration', 'lesson_date_time', 'term', 'lesson_status',
+    'teacher_id', 'teacher_id__first_name', 'teacher_id__last_name')
+
+"""
+Description of one section: the template of its table and the function returning the unordered queryset of its rows
+"""
+class FeedSection:
+    def __init__(self, template, rows):
+        self.template = template
+        self.rows = rows
+
+def student_accounts(is_parent):
+    return UserAccount.objects.filter(role = UserRole.STUDENT, is_parent = is_parent).only(*ACCOUNT_FIELDS)
+
+def lessons_with_status(lesson_status):
+    return Lesson.objects.filter(lesson_status = lesson_status).select_related('teacher_id').only(*LESSON_FIELDS)
+
+ADMIN_FEED_SECTIONS = {
+    'students': FeedSection('partials/admin_feed_accounts.html', lambda: student_accounts(False)),
+    'parents': FeedSection('partials/admin_feed_accounts.html', lambda: student_accounts(True)),
+    'pending': FeedSection('partials/admin_feed_lessons.html', lambda: lessons_with_status(LessonStatus.UNFULFILLED)),
+    'booked': FeedSection('partials/admin_feed_lessons.html', lambda: lessons_with_status(LessonStatus.FULLFILLED)),
+}
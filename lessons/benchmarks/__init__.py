@@ -0,0 +1,33 @@
+"""
+Benchmarks for the lessons app.
+Every benchmark runs against a throwaway test database created through the Django test database machinery and
+caches its fragments in a throwaway cache (see msms.test_runner.isolated_fragment_cache), so they never touch the
+configured database or the fragments of the site. Run them as modules, for example:
+
+    python -m lessons.benchmarks.relabel --lessons 1000000
+"""
+import os
+from contextlib import contextmanager
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'msms.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def benchmark_database():
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from msms.test_runner import isolated_fragment_cache
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with isolated_fragment_cache():
+            yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
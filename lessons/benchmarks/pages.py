@@ -0,0 +1,61 @@
+"""
+Benchmark of every page of the site over seeded data sets.
+Seeds each scale (in families) with the bulk seeder, requests every route of msms/urls.py through the Django test client and
+writes the median wall time, SQL query count and SQL time per route to a JSON report. With --compare, the routes that make
+more queries or got slower than the tolerance allows against an earlier report are listed and the exit status is 1
+"""
+import argparse
+import json
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000], help='numbers of families to seed and benchmark')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the data sets')
+    parser.add_argument('--repeat', type=int, default=5, help='timed requests per route')
+    parser.add_argument('--routes', nargs='+', help='url names of the routes to benchmark, every route by default')
+    parser.add_argument('--output', default='benchmark.json', help='file the JSON report is written to')
+    parser.add_argument('--compare', help='JSON report of an earlier run to flag regressions against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='relative slow down that counts as a regression')
+    arguments = parser.parse_args()
+
+    from lessons.benchmarks import setup_django
+    setup_django()
+    from lessons.benchmarks.routes import ROUTES
+    from lessons.benchmarks.runner import run_benchmarks, compare_reports
+
+    routes = ROUTES
+    if arguments.routes:
+        routes = [route for route in ROUTES if route.url_name in arguments.routes]
+        unknown = set(arguments.routes) - {route.url_name for route in routes}
+        if unknown:
+            parser.error(f'unknown routes: {", ".join(sorted(unknown))}')
+
+    # the baseline is read first so a wrong path fails before the benchmark runs
+    baseline = None
+    if arguments.compare:
+        with open(arguments.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    report = run_benchmarks(arguments.scales, arguments.seed, arguments.repeat, routes)
+    with open(arguments.output, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+
+    for scale, scale_report in report['scales'].items():
+        print(f'{scale} families, seeded in {scale_report["seed_seconds"]:.2f}s')
+        for url_name, result in scale_report['routes'].items():
+            print(f'  {url_name:<36} {result["status"]}  {result["wall_ms"]:>10.2f} ms  {result["queries"]:>5} queries  {result["sql_ms"]:>10.2f} ms SQL')
+    print(f'report written to {arguments.output}')
+
+    if baseline is not None:
+        regressions = compare_reports(report, baseline, arguments.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print(f'no regressions against {arguments.compare}')
+
+
+if __name__ == '__main__':
+    main()
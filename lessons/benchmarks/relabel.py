@@ -0,0 +1,104 @@
+"""
+Benchmark of the set based term relabeling.
+Inserts lessons spread over the school year, labels them, moves every term by a week and times relabel_lessons() each time
+"""
+import argparse
+import datetime
+import time
+
+from lessons.benchmarks import setup_django, benchmark_database
+
+
+def create_terms(Term):
+    dates = [
+        (datetime.date(2022, 9,1), datetime.date(2022, 10,21)),
+        (datetime.date(2022, 10,31), datetime.date(2022, 12,16)),
+        (datetime.date(2023, 1,3), datetime.date(2023, 2,10)),
+        (datetime.date(2023, 2,20), datetime.date(2023, 3,31)),
+        (datetime.date(2023, 4,17), datetime.date(2023, 5,26)),
+        (datetime.date(2023, 6,5), datetime.date(2023, 7,21)),
+    ]
+    for term_number, (start_date, end_date) in enumerate(dates, start=1):
+        Term.objects.create(term_number=term_number, start_date=start_date, end_date=end_date)
+
+
+def create_lessons(number_of_lessons, batch_size):
+    from django.db import connection
+    from django.utils import timezone
+    from lessons.models import UserAccount, UserRole, Lesson, LessonStatus
+
+    teacher = UserAccount(first_name='Bench', last_name='Teacher', email='bench.teacher@example.org', role=UserRole.TEACHER)
+    teacher.set_unusable_password()
+    teacher.save()
+
+    students = [UserAccount(first_name='Bench', last_name=f'Student{i}', email=f'bench.student{i}@example.org', role=UserRole.STUDENT) for i in range(1000)]
+    for student in students:
+        student.set_unusable_password()
+    students = UserAccount.objects.bulk_create(students)
+
+    # Lessons are written with executemany rather than through the ORM so that setting up a million rows stays quick
+    first_lesson = datetime.datetime(2022, 8, 15, 9, 0, tzinfo=timezone.utc)
+    request_date = datetime.date(2022, 8, 1)
+    lessons_per_student = max(1, -(-number_of_lessons // len(students)))
+    step = datetime.timedelta(days=365) / lessons_per_student
+
+    table = Lesson._meta.db_table
+    sql = (f'INSERT INTO {table} (request_date, type, duration, lesson_date_time, lesson_end_time, teacher_id_id, student_id_id, lesson_status, term) '
+           'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)')
+    with connection.cursor() as cursor:
+        for batch_start in range(0, number_of_lessons, batch_size):
+            rows = [
+                (
+                    request_date,
+                    'INSTR',
+                    '30',
+                    (first_lesson + step * (i // len(students))).replace(tzinfo=None),
+                    (first_lesson + step * (i // len(students)) + datetime.timedelta(minutes=30)).replace(tzinfo=None),
+                    teacher.id,
+                    students[i % len(students)].id,
+                    LessonStatus.FULLFILLED,
+                    'N/A',
+                )
+                for i in range(batch_start, min(batch_start + batch_size, number_of_lessons))
+            ]
+            cursor.executemany(sql, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lessons', type=int, default=1000000, help='number of lessons to relabel')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    arguments = parser.parse_args()
+
+    setup_django()
+    from django.db.models import F
+    from lessons.models import Lesson, Term
+    from lessons.term_calendar import term_calendar, relabel_lessons
+
+    with benchmark_database():
+        create_terms(Term)
+
+        started = time.perf_counter()
+        create_lessons(arguments.lessons, arguments.batch_size)
+        print(f'inserted {Lesson.objects.count()} unlabelled lessons in {time.perf_counter() - started:.2f}s')
+
+        started = time.perf_counter()
+        updated = relabel_lessons()
+        print(f'labelled {updated} of {arguments.lessons} lessons in {time.perf_counter() - started:.2f}s')
+
+        # Queryset updates skip the model signals, so the calendar is invalidated by hand
+        Term.objects.update(start_date=F('start_date') + datetime.timedelta(days=7), end_date=F('end_date') + datetime.timedelta(days=7))
+        term_calendar.invalidate()
+
+        started = time.perf_counter()
+        updated = relabel_lessons()
+        elapsed = time.perf_counter() - started
+        print(f'relabelled {updated} of {arguments.lessons} lessons in {elapsed:.2f}s')
+
+        started = time.perf_counter()
+        updated = relabel_lessons()
+        print(f'relabel with no term change updated {updated} lessons in {time.perf_counter() - started:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
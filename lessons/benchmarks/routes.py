@@ -0,0 +1,208 @@
+import datetime
+
+from django.utils import timezone
+
+from ..family import root_of
+from ..models import UserAccount, UserRole, Lesson, LessonType, LessonDuration, LessonStatus, Invoice, InvoiceStatus, Term
+from ..term_calendar import term_calendar
+
+"""
+Routes driven by the benchmark suite, one per url of msms/urls.py.
+A Route names the url, the role of the account requesting it and the HTTP method, and has a prepare function that returns
+the url arguments and the POST data from the BenchmarkContext of the seeded database. prepare may create the rows the
+request needs (for example a saved lesson to delete), it runs in the same rolled back transaction as the request but is
+not timed
+"""
+
+#Hour of the lessons created for the benchmark, the seeded lessons are all between 9:00 and 17:00 so it never clashes
+BENCHMARK_LESSON_HOUR = 8
+
+"""
+Accounts and rows of the seeded database the routes are requested with.
+The student is the family root of the first invoice left to pay, so the student pages show invoices, lessons and children
+"""
+class BenchmarkContext:
+    def __init__(self):
+        self.admin = UserAccount.objects.filter(role = UserRole.ADMIN).order_by('id').first()
+        self.director = UserAccount.objects.filter(role = UserRole.DIRECTOR).order_by('id').first()
+        self.teacher = UserAccount.objects.filter(role = UserRole.TEACHER).order_by('id').first()
+
+        invoice = Invoice.objects.filter(invoice_status__in = [InvoiceStatus.UNPAID, InvoiceStatus.PARTIALLY_PAID], student_account__isnull = False).select_related('student_account__parent_of_user').order_by('id').first()
+        if invoice is not None:
+            self.student = root_of(invoice.student_account)
+            self.invoice_reference = invoice.reference_number
+        else:
+            self.student = UserAccount.objects.filter(role = UserRole.STUDENT, parent_of_user__isnull = True).order_by('id').first()
+            self.invoice_reference = ''
+
+        # an account outside of the family, to delete and to promote
+        self.other_student = UserAccount.objects.filter(role = UserRole.STUDENT).exclude(id = self.student.id).exclude(parent_of_user = self.student).order_by('-id').first()
+
+        self.booked_lesson = Lesson.objects.filter(lesson_status = LessonStatus.FULLFILLED).order_by('lesson_id').first()
+        self.pending_lesson = Lesson.objects.filter(lesson_status = LessonStatus.UNFULFILLED).order_by('lesson_id').first()
+        self.first_term = term_calendar.all()[0]
+        self.last_term = term_calendar.all()[-1]
+
+    def account(self, role):
+        return {
+            'student': self.student,
+            'admin': self.admin,
+            'director': self.director,
+            'anonymous': None,
+        }[role]
+
+    # Date and time of the lessons created for the benchmark, in the first week of the first term
+    def lesson_date_time(self, day = 0):
+        lesson_date = self.first_term.start_date + datetime.timedelta(days = day)
+        return datetime.datetime.combine(lesson_date, datetime.time(BENCHMARK_LESSON_HOUR), tzinfo = timezone.utc)
+
+    def create_lesson(self, status):
+        return Lesson.objects.create(
+            type = LessonType.INSTRUMENT,
+            duration = LessonDuration.HOUR,
+            lesson_date_time = self.lesson_date_time(),
+            teacher_id = self.teacher,
+            student_id = self.student,
+            lesson_status = status,
+        )
+
+    def lesson_form(self, day):
+        return {
+            'type': LessonType.THEORY,
+            'duration': LessonDuration.FOURTY_FIVE,
+            'lesson_date_time': self.lesson_date_time(day).strftime('%Y-%m-%d %H:%M'),
+            'teachers': self.teacher.id,
+        }
+
+class Route:
+    def __init__(self, url_name, role, method = 'GET', prepare = None):
+        self.url_name = url_name
+        self.role = role
+        self.method = method
+        self.prepare = prepare or (lambda context: ((), {}))
+
+def booked_lesson(context):
+    return context.booked_lesson or context.create_lesson(LessonStatus.FULLFILLED)
+
+def pending_lesson(context):
+    return context.pending_lesson or context.create_lesson(LessonStatus.UNFULFILLED)
+
+def new_lesson(context):
+    data = context.lesson_form(1)
+    data['selectedStudent'] = context.student.email
+    return (), data
+
+def save_lessons(context):
+    context.create_lesson(LessonStatus.SAVED)
+    return (), {}
+
+def delete_pending(context):
+    return (context.create_lesson(LessonStatus.UNFULFILLED).lesson_id,), {}
+
+def delete_saved(context):
+    return (context.create_lesson(LessonStatus.SAVED).lesson_id,), {}
+
+def edit_lesson(context):
+    return (context.create_lesson(LessonStatus.UNFULFILLED).lesson_id,), {}
+
+def pay_for_invoice(context):
+    return (), {'invocie_reference': context.invoice_reference, 'amounts_pay': 10}
+
+def pay_family_invoices(context):
+    return (), {'amounts_pay': 10}
+
+def student_id(context):
+    return (context.student.id,), {}
+
+def booked_lesson_id(context):
+    return (booked_lesson(context).lesson_id,), {}
+
+def admin_update_request(context):
+    return (booked_lesson(context).lesson_id,), context.lesson_form(2)
+
+def admin_confirm_booking(context):
+    return (pending_lesson(context).lesson_id,), {}
+
+def bulk_confirm_family(context):
+    pending_lesson(context)
+    return (), {'family': context.student.id}
+
+def admin_feed_students(context):
+    return ('students',), {}
+
+def export_invoices(context):
+    return ('invoices',), {}
+
+# Frees the number of the last term so it can be created again
+def create_term(context):
+    Term.objects.filter(term_number = context.last_term.term_number).delete()
+    return (), {'term_number': context.last_term.term_number, 'start_date': context.last_term.start_date, 'end_date': context.last_term.end_date}
+
+def first_term_number(context):
+    return (context.first_term.term_number,), {}
+
+def update_term_details(context):
+    term = context.first_term
+    return (term.term_number,), {'term_number': term.term_number, 'start_date': term.start_date, 'end_date': term.end_date - datetime.timedelta(days = 1)}
+
+def last_term_number(context):
+    return (context.last_term.term_number,), {}
+
+def other_student_email(context):
+    return (context.other_student.email,), {}
+
+def admin_id(context):
+    return (context.admin.id,), {}
+
+ROUTES = [
+    Route('home', 'anonymous'),
+    Route('js-catalog', 'anonymous'),
+    Route('sign_up', 'anonymous'),
+    Route('admin:index', 'director'),
+
+    Route('student_feed', 'student'),
+    Route('requests_page', 'student'),
+    Route('new_lesson', 'student', 'POST', new_lesson),
+    Route('save_lessons', 'student', 'POST', save_lessons),
+    Route('delete_pending', 'student', 'POST', delete_pending),
+    Route('delete_saved', 'student', 'POST', delete_saved),
+    Route('edit_lesson', 'student', 'GET', edit_lesson),
+    Route('sign_up_child', 'student'),
+    Route('balance', 'student'),
+    Route('pay_for_invoice', 'student', 'POST', pay_for_invoice),
+    Route('pay_family_invoices', 'student', 'POST', pay_family_invoices),
+    Route('log_out', 'student'),
+
+    Route('admin_feed', 'admin'),
+    Route('admin_feed_section', 'admin', 'GET', admin_feed_students),
+    Route('student_requests', 'admin', 'GET', student_id),
+    Route('admin_update_request_page', 'admin', 'GET', booked_lesson_id),
+    Route('admin_update_request', 'admin', 'POST', admin_update_request),
+    Route('admin_confirm_booking', 'admin', 'GET', admin_confirm_booking),
+    Route('admin_bulk_confirm_booking', 'admin', 'POST', bulk_confirm_family),
+    Route('pending_conflicts', 'admin'),
+    Route('outstanding_balances', 'admin'),
+    Route('delete_lesson', 'admin', 'GET', booked_lesson_id),
+    Route('transaction_history', 'admin'),
+    Route('invoices_history', 'admin'),
+    Route('export_history', 'admin', 'GET', export_invoices),
+    Route('student_invoices_and_transactions', 'admin', 'GET', student_id),
+
+    Route('term_management', 'admin'),
+    Route('add_term_page', 'admin'),
+    Route('create_term', 'admin', 'POST', create_term),
+    Route('edit_term_details_page', 'admin', 'GET', first_term_number),
+    Route('update_term_details', 'admin', 'POST', update_term_details),
+    Route('delete_term', 'admin', 'GET', last_term_number),
+
+    Route('director_feed', 'director'),
+    Route('director_manage_roles', 'director'),
+    Route('promote_director', 'director', 'GET', other_student_email),
+    Route('promote_admin', 'director', 'GET', other_student_email),
+    Route('disable_user', 'director', 'GET', other_student_email),
+    Route('delete_user', 'director', 'GET', other_student_email),
+    Route('create_admin_page', 'director'),
+    Route('update_user', 'director', 'GET', admin_id),
+
+    Route('metrics', 'admin'),
+]
@@ -0,0 +1,175 @@
+import datetime
+import statistics
+import time
+
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from ..seeding import seed_at_scale
+from . import benchmark_database
+from .routes import ROUTES, BenchmarkContext
+
+"""
+Benchmark runner.
+Every route is requested repeat times after one untimed warm up request, each request inside its own transaction that is
+rolled back afterwards, so requests that change data leave the seeded data set as it was for the next one. The wall time of
+the request, the number of SQL queries and the time spent in them are recorded, and the report is a JSON serialisable
+dictionary of the medians per scale and per route
+"""
+
+#Number of timed requests per route
+DEFAULT_REPEAT = 5
+
+#Relative slow down of a route over the baseline that counts as a regression
+DEFAULT_TOLERANCE = 0.25
+
+#Wall and SQL time differences under this many milliseconds are noise and never count as a regression
+MIN_REGRESSION_MS = 2.0
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 3)
+
+# Database execute wrapper counting the queries run and the time spent in them
+class QueryTimer:
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
+
+"""
+@params: client: test Client, route: Route, context: BenchmarkContext
+@return type: tuple of (float, int, float, int)
+
+@Description: Requests the route once and returns the wall time in seconds, the number of SQL queries, the SQL time in seconds
+              and the status code. Streamed responses are read to the end, the data set is left unchanged
+"""
+def request_route(client, route, context):
+    with transaction.atomic():
+        account = context.account(route.role)
+        if account is None:
+            client.logout()
+        else:
+            client.force_login(account)
+        args, data = route.prepare(context)
+        url = reverse(route.url_name, args = args)
+
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            if route.method == 'POST':
+                response = client.post(url, data)
+            else:
+                response = client.get(url, data)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+
+        transaction.set_rollback(True)
+
+    return elapsed, timer.queries, timer.seconds, response.status_code
+
+"""
+@params: repeat: number of timed requests per route, routes: list of Route
+@return type: Dictionary of route results by url name
+
+@Description: Benchmarks the routes against the data set in the database. Lessons can be booked from the start of the
+              seeded term calendar, whatever the date today
+"""
+def benchmark_routes(repeat = DEFAULT_REPEAT, routes = ROUTES):
+    context = BenchmarkContext()
+    client = Client()
+    results = {}
+    with override_settings(CURRENT_DATE = context.first_term.start_date):
+        for route in routes:
+            request_route(client, route, context)
+            runs = [request_route(client, route, context) for _ in range(repeat)]
+            wall_times = [run[0] for run in runs]
+            results[route.url_name] = {
+                'role': route.role,
+                'method': route.method,
+                'status': runs[-1][3],
+                'wall_ms': milliseconds(statistics.median(wall_times)),
+                'wall_ms_min': milliseconds(min(wall_times)),
+                'wall_ms_max': milliseconds(max(wall_times)),
+                'queries': round(statistics.median(run[1] for run in runs)),
+                'sql_ms': milliseconds(statistics.median(run[2] for run in runs)),
+            }
+    return results
+
+"""
+@params: families: number of families seeded, seed: seed of the data set, repeat: number of timed requests per route, routes: list of Route
+@return type: Dictionary
+
+@Description: Seeds the data set into a throwaway benchmark database and benchmarks every route against it
+"""
+def benchmark_scale(families, seed = 0, repeat = DEFAULT_REPEAT, routes = ROUTES):
+    with benchmark_database():
+        started = time.perf_counter()
+        counts = seed_at_scale(families, seed)
+        seed_seconds = time.perf_counter() - started
+        return {
+            'rows': counts,
+            'seed_seconds': round(seed_seconds, 3),
+            'routes': benchmark_routes(repeat, routes),
+        }
+
+"""
+@params: scales: list of numbers of families, seed: seed of the data sets, repeat: number of timed requests per route, routes: list of Route
+@return type: Dictionary
+
+@Description: Returns the report of the benchmark of every route at every scale, keyed by the number of families
+"""
+def run_benchmarks(scales, seed = 0, repeat = DEFAULT_REPEAT, routes = ROUTES):
+    return {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'database': connection.vendor,
+        'seed': seed,
+        'repeat': repeat,
+        'scales': {str(families): benchmark_scale(families, seed, repeat, routes) for families in scales},
+    }
+
+# A route of the report that got slower or made more queries than in the baseline
+class Regression:
+    def __init__(self, scale, url_name, metric, baseline, current):
+        self.scale = scale
+        self.url_name = url_name
+        self.metric = metric
+        self.baseline = baseline
+        self.current = current
+
+    def __str__(self):
+        return f'{self.url_name} at {self.scale} families: {self.metric} went from {self.baseline} to {self.current}'
+
+"""
+@params: report: benchmark report, baseline: benchmark report saved earlier, tolerance: allowed relative slow down
+@return type: List of Regression
+
+@Description: Compares the routes benchmarked at the same scale in both reports. A route regresses when it makes more queries than
+              in the baseline, or when its median wall time or SQL time grew by more than the tolerance and by more than
+              MIN_REGRESSION_MS milliseconds
+"""
+def compare_reports(report, baseline, tolerance = DEFAULT_TOLERANCE):
+    regressions = []
+    for scale, scale_report in report['scales'].items():
+        baseline_routes = baseline['scales'].get(scale, {}).get('routes', {})
+        for url_name, result in scale_report['routes'].items():
+            baseline_result = baseline_routes.get(url_name)
+            if baseline_result is None:
+                continue
+
+            if result['queries'] > baseline_result['queries']:
+                regressions.append(Regression(scale, url_name, 'queries', baseline_result['queries'], result['queries']))
+            for metric in ('wall_ms', 'sql_ms'):
+                limit = max(baseline_result[metric] * (1 + tolerance), baseline_result[metric] + MIN_REGRESSION_MS)
+                if result[metric] > limit:
+                    regressions.append(Regression(scale, url_name, metric, baseline_result[metric], result[metric]))
+    return regressions
@@ -0,0 +1,105 @@
+from collections import namedtuple
+
+from django.db import transaction
+
+from .models import UserAccount, Lesson, LessonStatus, Invoice, InvoiceStatus
+from .invoice_references import allocate_invoice_references
+from .ledger import post_invoices, family_id_of
+from .fragment_cache import bump_student_version
+from .outstanding_balances import refresh_outstanding
+from .conflicts import find_queue_conflicts
+
+"""
+Bulk booking of pending lessons.
+Booking a lesson makes it FULLFILLED, issues an UNPAID invoice for its fees and charges the invoice to the balance of the
+family. confirm_bookings does it for any number of pending lessons in one transaction: the pending lessons that overlap another
+booked or pending lesson of their teacher or of their student are skipped and reported (see conflicts.find_queue_conflicts),
+the others are booked with one UPDATE per BOOKING_CHUNK_SIZE lessons, the invoice references of each student are reserved with one counter update, the invoices are inserted with one
+bulk insert and each family balance is moved once (see ledger.post_invoices). The update and the bulk insert skip the model
+signals, so what the families owe is recomputed and the fragment versions of the students are replaced here. The term labels of the lessons do not
+depend on their status, so they are left as they are instead of being recomputed lesson by lesson
+"""
+
+#Most lessons booked by one UPDATE, so the ids bound stay below the variable limit of SQLite
+BOOKING_CHUNK_SIZE = 500
+
+#A lesson booked by confirm_bookings and the invoice issued for it
+BookedLesson = namedtuple('BookedLesson', ['lesson', 'invoice'])
+
+#The lessons booked for the students of a family, the fees charged to the family and its balance afterwards
+FamilyCharge = namedtuple('FamilyCharge', ['family', 'lessons', 'fees', 'balance'])
+
+# Result of confirm_bookings, the booked lessons in the order of their students and dates, the charges grouped by family
+# and the pending lessons left unbooked because they overlap another lesson, as QueueConflict
+class BookingSummary:
+    def __init__(self, booked, families, skipped):
+        self.booked = booked
+        self.families = families
+        self.skipped = skipped
+
+    def total_fees(self):
+        return sum(family.fees for family in self.families)
+
+"""
+@params: lessons: QuerySet of Lesson model objects, the ones that are not pending are left alone
+@return type: BookingSummary
+
+@Description: Books every pending lesson of the queryset in one transaction and returns what was booked and charged.
+              The pending lessons are locked first, so a lesson booked concurrently by another admin is never invoiced twice.
+              The ones overlapping another booked or pending lesson are left pending and returned as skipped
+"""
+def confirm_bookings(lessons):
+    with transaction.atomic():
+        pending = list(
+            lessons.filter(lesson_status = LessonStatus.UNFULFILLED)
+            .select_for_update(of = ('self',))
+            .select_related('student_id', 'teacher_id')
+            .order_by('student_id', 'lesson_date_time', 'lesson_id')
+        )
+        skipped = find_queue_conflicts(pending)
+        skipped_ids = {queue_conflict.lesson.lesson_id for queue_conflict in skipped}
+        pending = [lesson for lesson in pending if lesson.lesson_id not in skipped_ids]
+        if len(pending) == 0:
+            return BookingSummary([], [], skipped)
+
+        for start in range(0, len(pending), BOOKING_CHUNK_SIZE):
+            Lesson.objects.filter(lesson_id__in = [lesson.lesson_id for lesson in pending[start:start + BOOKING_CHUNK_SIZE]]).update(lesson_status = LessonStatus.FULLFILLED)
+
+        lessons_by_student = {}
+        for lesson in pending:
+            lesson.lesson_status = LessonStatus.FULLFILLED
+            lessons_by_student.setdefault(lesson.student_id_id, []).append(lesson)
+
+        invoices = []
+        for student_id, student_lessons in lessons_by_student.items():
+            references = allocate_invoice_references(student_id, len(student_lessons))
+            for lesson, reference_number in zip(student_lessons, references):
+                fees = int(Invoice.calculate_fees_amount(lesson.duration))
+                invoices.append(Invoice(
+                    reference_number = reference_number,
+                    student_ID = str(student_id),
+                    fees_amount = fees,
+                    invoice_status = InvoiceStatus.UNPAID,
+                    amounts_need_to_pay = fees,
+                    lesson_ID = str(lesson.lesson_id),
+                    student_account = lesson.student_id,
+                    booked_lesson = lesson,
+                ))
+        Invoice.objects.bulk_create(invoices)
+        refresh_outstanding(list(lessons_by_student))
+        for student_id in lessons_by_student:
+            bump_student_version(student_id)
+        fees_by_family = post_invoices(invoices)
+
+        families = UserAccount.objects.in_bulk(list(fees_by_family))
+
+    lessons_by_family = {}
+    for lesson in pending:
+        family_id = family_id_of(lesson.student_id)
+        lessons_by_family[family_id] = lessons_by_family.get(family_id, 0) + 1
+
+    return BookingSummary(
+        [BookedLesson(invoice.booked_lesson, invoice) for invoice in invoices],
+        [FamilyCharge(families[family_id], lessons_by_family[family_id], fees, families[family_id].balance) for family_id, fees in fees_by_family.items()],
+        skipped,
+    )
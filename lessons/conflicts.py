@@ -0,0 +1,120 @@
+from collections import namedtuple
+from itertools import chain
+
+from django.db.models import Q
+
+from .models import Lesson, LessonStatus, LONGEST_LESSON, end_of_lesson
+
+"""
+Double booking detection.
+A teacher or a student is busy during every booked (FULLFILLED) or pending (UNFULFILLED) lesson they have, from its
+lesson_date_time to its stored lesson_end_time. Two lessons overlap when each one starts before the other one ends, so
+lessons back to back do not conflict. No lesson lasts longer than LONGEST_LESSON, which bounds the start of every lesson
+that can still be running at a given time and turns the lookup into a range scan of the (teacher_id, lesson_date_time)
+and (student_id, lesson_date_time) indexes, the stored end time is only checked on the few rows of that range.
+Saved lessons are drafts, they never occupy anyone
+"""
+
+#Lesson statuses that occupy the teacher and the student of the lesson
+OCCUPYING_STATUSES = [LessonStatus.UNFULFILLED, LessonStatus.FULLFILLED]
+
+#A lesson of the validated queue and the booked or pending lessons it overlaps, in the order they start
+QueueConflict = namedtuple('QueueConflict', ['lesson', 'conflicts'])
+
+"""
+@params: teacher_id: id of the teacher, student_id: id of the student, lesson_date_time: start of the lesson, duration: LessonDuration value,
+         exclude_lesson_id: id of the lesson being edited, never reported as a conflict with itself
+@return type: List of Lesson model objects
+
+@Description: Returns the booked or pending lessons of the teacher or of the student that overlap the lesson, in the order they start,
+              with one indexed range query
+"""
+def find_conflicts(teacher_id, student_id, lesson_date_time, duration, exclude_lesson_id = None):
+    lesson_end_time = end_of_lesson(lesson_date_time, duration)
+    conflicts = Lesson.objects.filter(
+        Q(teacher_id = teacher_id) | Q(student_id = student_id),
+        lesson_date_time__gt = lesson_date_time - LONGEST_LESSON,
+        lesson_date_time__lt = lesson_end_time,
+        lesson_end_time__gt = lesson_date_time,
+        lesson_status__in = OCCUPYING_STATUSES,
+    )
+    if exclude_lesson_id is not None:
+        conflicts = conflicts.exclude(lesson_id = exclude_lesson_id)
+    return list(conflicts.order_by('lesson_date_time', 'lesson_id'))
+
+"""
+@params: lessons: iterable of Lesson model objects ordered by lesson_date_time
+@return type: Generator of (Lesson, Lesson) tuples
+
+@Description: Sweeps the lessons in the order they start, keeping the lessons still running for every teacher and every student,
+              and yields every pair of lessons sharing a teacher or a student that overlap, the earlier lesson first. A pair sharing
+              both is yielded once
+"""
+def overlapping_pairs(lessons):
+    running = {}
+    for lesson in lessons:
+        overlapping = {}
+        for key in (('teacher', lesson.teacher_id_id), ('student', lesson.student_id_id)):
+            still_running = [other for other in running.get(key, []) if other.lesson_end_time > lesson.lesson_date_time]
+            for other in still_running:
+                overlapping[other.lesson_id] = other
+            still_running.append(lesson)
+            running[key] = still_running
+        for other in overlapping.values():
+            yield other, lesson
+
+#Most lessons of a queue whose windows are looked up with one query, each lesson binds eight SQL variables
+#so a chunk stays far below the variable limit of SQLite
+QUEUE_CHUNK_SIZE = 50
+
+# Returns the pending lessons in the order the pending conflicts page checks them a page at a time, see keyset_page
+def pending_lessons():
+    return Lesson.objects.filter(lesson_status = LessonStatus.UNFULFILLED).select_related('teacher_id', 'student_id')
+
+"""
+@params: queue: list of Lesson model objects
+@return type: Q
+
+@Description: Matches the lessons of the teachers and of the students of the queue that can overlap one of its lessons, one window
+              per lesson and per teacher or student, each a range of the (teacher_id, lesson_date_time) or (student_id, lesson_date_time) index
+"""
+def queue_windows(queue):
+    windows = Q()
+    for lesson in queue:
+        window = Q(lesson_date_time__gt = lesson.lesson_date_time - LONGEST_LESSON, lesson_date_time__lt = lesson.lesson_end_time, lesson_end_time__gt = lesson.lesson_date_time)
+        windows |= Q(window, teacher_id = lesson.teacher_id_id) | Q(window, student_id = lesson.student_id_id)
+    return windows
+
+"""
+@params: queue: list of Lesson model objects to validate, such as a page of pending_lessons()
+@return type: List of QueueConflict
+
+@Description: Validates a queue of lessons in one pass and returns the lessons of the queue that overlap a booked or pending lesson of
+              their teacher or of their student (including another lesson of the queue), in the order they start.
+              The booked and pending lessons overlapping the queue are read with one windowed query per QUEUE_CHUNK_SIZE lessons
+              of the queue, so the work grows with the queue and not with the school
+"""
+def find_queue_conflicts(queue):
+    queue = list(queue)
+    if len(queue) == 0:
+        return []
+
+    queued_ids = {lesson.lesson_id for lesson in queue}
+    occupying = Lesson.objects.filter(lesson_status__in = OCCUPYING_STATUSES).select_related('teacher_id', 'student_id')
+    candidates = {}
+    for start in range(0, len(queue), QUEUE_CHUNK_SIZE):
+        for lesson in occupying.filter(queue_windows(queue[start:start + QUEUE_CHUNK_SIZE])):
+            if lesson.lesson_id not in queued_ids:
+                candidates[lesson.lesson_id] = lesson
+    lessons = sorted(chain(queue, candidates.values()), key = lambda lesson: (lesson.lesson_date_time, lesson.lesson_id))
+
+    conflicts_by_lesson = {}
+    for earlier, later in overlapping_pairs(lessons):
+        for lesson, other in ((earlier, later), (later, earlier)):
+            if lesson.lesson_id in queued_ids:
+                conflicts_by_lesson.setdefault(lesson.lesson_id, (lesson, []))[1].append(other)
+
+    return [
+        QueueConflict(lesson, sorted(conflicts, key = lambda other: (other.lesson_date_time, other.lesson_id)))
+        for lesson, conflicts in sorted(conflicts_by_lesson.values(), key = lambda entry: (entry[0].lesson_date_time, entry[0].lesson_id))
+    ]
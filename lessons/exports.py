@@ -0,0 +1,95 @@
+import csv
+import datetime
+import json
+
+from .models import Invoice, Transaction, Lesson
+from .term_calendar import start_of_day
+
+"""
+Streaming exports of the invoice, transaction and lesson history.
+Rows are read as values_list tuples with QuerySet.iterator(chunk_size), so only one chunk of rows is in memory at a time,
+and are turned into CSV or JSON lines one by one. Used by the export_history view (StreamingHttpResponse) and by the
+export_history management command, so an export starts producing output straight away whatever the size of the table.
+"""
+
+#Number of rows fetched from the database at a time
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+"""
+Description of one export: the model it reads, the columns written (field names passed to values_list, also used as the header),
+the datetime field the date range filters on and the field the student filter compares with.
+Invoices and transactions have no date of their own, they are dated by the lesson the invoice was issued for
+"""
+class Export:
+    def __init__(self, model, columns, date_field, student_field):
+        self.model = model
+        self.columns = columns
+        self.date_field = date_field
+        self.student_field = student_field
+
+EXPORTS = {
+    'invoices': Export(
+        Invoice,
+        ('reference_number', 'student_ID', 'fees_amount', 'invoice_status', 'amounts_need_to_pay', 'lesson_ID'),
+        'booked_lesson__lesson_date_time',
+        'student_account_id',
+    ),
+    'transactions': Export(
+        Transaction,
+        ('Student_ID_transaction', 'invoice_reference_transaction', 'transaction_amount'),
+        'invoice__booked_lesson__lesson_date_time',
+        'student_account_id',
+    ),
+    'lessons': Export(
+        Lesson,
+        ('lesson_id', 'student_id', 'teacher_id', 'type', 'duration', 'lesson_date_time', 'request_date', 'lesson_status', 'term'),
+        'lesson_date_time',
+        'student_id',
+    ),
+}
+
+"""
+@params: export_name: key of EXPORTS, start_date: first date included, end_date: last date included, student_id: id of the student
+@return type: QuerySet of tuples
+
+@Description: Returns the rows of the export in primary key order, restricted to the date range and student when given
+"""
+def export_rows(export_name, start_date = None, end_date = None, student_id = None):
+    export = EXPORTS[export_name]
+    queryset = export.model.objects.all()
+    if start_date is not None:
+        queryset = queryset.filter(**{export.date_field + '__gte': start_of_day(start_date)})
+    if end_date is not None:
+        queryset = queryset.filter(**{export.date_field + '__lt': start_of_day(end_date + datetime.timedelta(days=1))})
+    if student_id is not None:
+        queryset = queryset.filter(**{export.student_field: student_id})
+    return queryset.order_by('pk').values_list(*export.columns)
+
+# Write target of csv.writer that hands the formatted line back instead of storing it
+class Echo:
+    def write(self, value):
+        return value
+
+def json_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+"""
+@params: export_name: key of EXPORTS, export_format: 'csv' or 'jsonl', rows: values_list QuerySet from export_rows
+@return type: generator of String
+
+@Description: Yields the export one line at a time, the CSV header first
+"""
+def export_lines(export_name, export_format, rows):
+    columns = EXPORTS[export_name].columns
+    if export_format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        for row in rows.iterator(chunk_size = EXPORT_CHUNK_SIZE):
+            yield writer.writerow(row)
+    else:
+        for row in rows.iterator(chunk_size = EXPORT_CHUNK_SIZE):
+            yield json.dumps(dict(zip(columns, map(json_value, row)))) + '\n'
@@ -0,0 +1,72 @@
+from django.db.models import Q
+
+from .models import UserAccount
+
+"""
+Family graph of student accounts.
+A family is a root student (the parent) and the child students whose parent_of_user points at it, children never have
+children of their own. Parents are resolved through the indexed parent_of_user foreign key and the children of a
+student are loaded with one indexed query, then memoized on the UserAccount object for the rest of the request.
+Views and helpers should go through these functions instead of querying parent_of_user themselves.
+"""
+
+#Name of the attribute the children of a student are memoized under
+CHILDREN_CACHE_ATTRIBUTE = '_family_children'
+
+"""
+@params: user: UserAccount model object
+@return type: UserAccount model object
+
+@Description: Returns the account at the root of the user's family, the parent for a child student and the user itself otherwise
+"""
+def root_of(user):
+    if user.parent_of_user_id is None:
+        return user
+    return user.parent_of_user
+
+"""
+@params: user: UserAccount model object
+@return type: List of UserAccount model objects
+
+@Description: Returns the children of the user in the order they were created, an empty list when the user has none
+"""
+def children_of(user):
+    children = getattr(user, CHILDREN_CACHE_ATTRIBUTE, None)
+    if children is None:
+        children = list(UserAccount.objects.filter(parent_of_user_id = user.id).order_by('id'))
+        setattr(user, CHILDREN_CACHE_ATTRIBUTE, children)
+    return children
+
+"""
+@params: user: UserAccount model object
+@return type: List of UserAccount model objects
+
+@Description: Returns the whole family of the user, the root account first followed by its children
+"""
+def family_of(user):
+    root = root_of(user)
+    return [root] + children_of(root)
+
+"""
+@params: user: UserAccount model object
+@return type: List of int
+
+@Description: Returns the ids of the whole family of the user, the root account first
+"""
+def family_ids_of(user):
+    return [member.id for member in family_of(user)]
+
+"""
+@params: user: UserAccount model object
+@return type: QuerySet of the ids of UserAccount model objects
+
+@Description: Returns the ids of the user and of its children as a subquery, so other tables can be filtered by family in the same query
+              with student_id__in, which uses their student indexes where an OR across the parent_of_user join cannot
+"""
+def family_member_ids(user):
+    return UserAccount.objects.filter(Q(id = user.id) | Q(parent_of_user_id = user.id)).values('id')
+
+# Drops the memoized children of the user, called whenever a child is added to it
+def forget_family(user):
+    if hasattr(user, CHILDREN_CACHE_ATTRIBUTE):
+        delattr(user, CHILDREN_CACHE_ATTRIBUTE)
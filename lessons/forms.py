@@ -3,8 +3,11 @@ from django.core.validators import RegexValidator
 from .models import UserAccount, Gender, Lesson, Term
 from  django.contrib.admin.widgets import AdminSplitDateTime
 from django.shortcuts import render
-from .models import UserAccount, Gender, Lesson, UserRole, Term
+from .models import UserAccount, Gender, Lesson, UserRole, Term, InvoiceStatus
+from django.conf import settings
 from django.forms import DateTimeInput
+from django.forms.models import ModelChoiceIterator
+from .reference_data import teachers, teacher_with_id
 import datetime
 from bootstrap_datepicker_plus.widgets import DateTimePickerInput, DatePickerInput
 
@@ -150,6 +153,40 @@ class TermDatesForm(forms.ModelForm):
             }
         ordering = ['term_number']
 
+class CachedTeacherIterator(ModelChoiceIterator):
+    """Iterates over the teachers of the reference data cache instead of querying them on every render"""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for teacher in teachers():
+            yield self.choice(teacher)
+
+    def __len__(self):
+        return len(teachers()) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or len(teachers()) > 0
+
+class TeacherChoiceField(forms.ModelChoiceField):
+    """Drop down of the teachers, rendered and validated from the reference data cache without a query"""
+
+    iterator = CachedTeacherIterator
+
+    def __init__(self, **kwargs):
+        super().__init__(queryset = UserAccount.objects.filter(role = UserRole.TEACHER), **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, UserAccount):
+            value = value.pk
+
+        teacher = teacher_with_id(value)
+        if teacher is None:
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code = 'invalid_choice', params = {'value': value})
+        return teacher
+
 class RequestForm(forms.ModelForm):
     """Form enabling Students to request a lesson they wish to book."""
 
@@ -177,7 +214,7 @@ class RequestForm(forms.ModelForm):
                     }
 
     #returns drop down of all teachers that can be selected by a student
-    teachers = forms.ModelChoiceField(queryset = UserAccount.objects.filter(role = UserRole.TEACHER) , widget = forms.Select, empty_label = None, initial = 0)
+    teachers = TeacherChoiceField(widget = forms.Select, empty_label = None, initial = 0)
     # def clean(self, request):
     #     """Clean the data and generate messages for any errors."""
 
@@ -216,3 +253,86 @@ class RequestForm(forms.ModelForm):
         to_edit_lesson.save()
 
         return to_edit_lesson
+
+
+class HistoryFilterForm(forms.Form):
+    """Form filtering and paging the rows of the invoice and transaction history pages, submitted with GET"""
+
+    status = forms.ChoiceField(label='Invoice status', choices=[('', 'Any')] + InvoiceStatus.choices, required=False)
+    student = forms.IntegerField(label='Student ID', min_value=1, required=False)
+    min_amount = forms.IntegerField(label='Minimum amount', min_value=0, required=False)
+    max_amount = forms.IntegerField(label='Maximum amount', min_value=0, required=False)
+    page_size = forms.IntegerField(label='Rows per page', min_value=1, required=False)
+    after = forms.IntegerField(min_value=0, required=False, widget=forms.HiddenInput())
+    before = forms.IntegerField(min_value=0, required=False, widget=forms.HiddenInput())
+
+    def clean(self):
+        super().clean()
+        min_amount = self.cleaned_data.get('min_amount')
+        max_amount = self.cleaned_data.get('max_amount')
+        if min_amount is not None and max_amount is not None and min_amount > max_amount:
+            self.add_error('max_amount', 'Maximum amount cannot be less than the minimum amount')
+
+    # The requested page size, never more than HISTORY_MAX_PAGE_SIZE whatever was asked for
+    def page_size_value(self):
+        page_size = self.cleaned_data.get('page_size') or settings.HISTORY_PAGE_SIZE
+        return min(page_size, settings.HISTORY_MAX_PAGE_SIZE)
+
+    # Applies the filters to the queryset in the database, status_field and amount_field name the fields they filter on
+    def filter_queryset(self, queryset, status_field, amount_field):
+        status = self.cleaned_data.get('status')
+        if status:
+            queryset = queryset.filter(**{status_field: status})
+        if self.cleaned_data.get('student') is not None:
+            queryset = queryset.filter(student_account_id = self.cleaned_data['student'])
+        if self.cleaned_data.get('min_amount') is not None:
+            queryset = queryset.filter(**{amount_field + '__gte': self.cleaned_data['min_amount']})
+        if self.cleaned_data.get('max_amount') is not None:
+            queryset = queryset.filter(**{amount_field + '__lte': self.cleaned_data['max_amount']})
+        return queryset
+
+
+class ExportFilterForm(forms.Form):
+    """Form choosing the format and rows of a history export, submitted with GET"""
+
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('jsonl', 'JSON lines')], required=False)
+    start_date = forms.DateField(required=False)
+    end_date = forms.DateField(required=False)
+    student = forms.IntegerField(min_value=1, required=False)
+
+    def clean(self):
+        super().clean()
+        start_date = self.cleaned_data.get('start_date')
+        end_date = self.cleaned_data.get('end_date')
+        if start_date is not None and end_date is not None and start_date > end_date:
+            self.add_error('end_date', 'End date cannot be before the start date')
+
+
+class FeedSectionPageForm(forms.Form):
+    """Form choosing the page of a section of the admin feed, submitted with GET"""
+
+    page_size = forms.IntegerField(min_value=1, required=False)
+    after = forms.IntegerField(min_value=0, required=False)
+    before = forms.IntegerField(min_value=0, required=False)
+
+    # The requested page size, never more than HISTORY_MAX_PAGE_SIZE whatever was asked for
+    def page_size_value(self):
+        page_size = self.cleaned_data.get('page_size') or settings.HISTORY_PAGE_SIZE
+        return min(page_size, settings.HISTORY_MAX_PAGE_SIZE)
+
+
+class BatchPaymentForm(forms.Form):
+    """Form paying one amount towards several invoices of the family at once"""
+
+    amounts_pay = forms.IntegerField(label='Payment amounts', min_value=1, max_value=10000, error_messages={
+        'required': 'You cannot submit without enter a value!',
+        'invalid': 'You cannot submit without enter a value!',
+        'min_value': 'Transaction amount cannot be less than 1!',
+        'max_value': 'Transaction amount cannot be larger than 10000!',
+    })
+    invoice_references = forms.CharField(label='Invoice references', required=False)
+
+    # The references entered, separated by commas, None when none were entered and every unpaid invoice is paid oldest first
+    def references(self):
+        references = [reference.strip() for reference in self.cleaned_data.get('invoice_references', '').split(',') if reference.strip()]
+        return references or None
@@ -0,0 +1,106 @@
+from threading import local
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from .family import children_of
+
+"""
+Versioned per family fragment cache.
+The data a page shows a student (the lessons, invoices, transactions and balance of the student and of their children) is
+cached per user together with the version every family member had when it was built. Nothing is ever deleted: a write to
+the lessons, invoices, transactions or account of a student replaces the version of that student (see lessons.signals, and
+ledger, which moves balances with queryset updates), so the next read of any page showing the student misses and rebuilds.
+A version is a fresh random token rather than an incremented number, so two workers sharing a cache that is not atomic
+(the file based one) can never end up writing the same version for different data.
+Writes that skip model signals (queryset update/delete, bulk_create, raw SQL) must call bump_student_version or
+invalidate_all_fragments themselves.
+While a write is still uncommitted inside an atomic block the fragments are rebuilt per call instead of cached,
+so data that is rolled back never ends up in the cache. The version is replaced again once the write commits
+"""
+
+#Key of the generation every fragment depends on, replacing it invalidates the fragments of all families at once
+GENERATION_KEY = 'fragments:generation'
+
+_state = local()
+
+def fragment_cache():
+    return caches[settings.FRAGMENT_CACHE]
+
+def new_version():
+    return uuid.uuid4().hex
+
+def student_version_key(student_id):
+    return f'fragments:student:{student_id}:version'
+
+"""
+@params: keys: list of version keys
+@return type: Dictionary of the version by key
+
+@Description: Returns the current version stored under each key, a key without one is given a fresh version first.
+              When two workers start the same key at once the version added first wins and both use it
+"""
+def current_versions(keys):
+    cache = fragment_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = new_version()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return versions
+
+def replace_version(key):
+    fragment_cache().set(key, new_version(), None)
+
+# Replaces the version now and again once the surrounding transaction commits, readers skip the cache until then
+def version_changed(key):
+    replace_version(key)
+    if connection.in_atomic_block:
+        _state.uncommitted_writes = True
+        transaction.on_commit(lambda: replace_version(key))
+
+# Invalidates every cached fragment showing the student with the id
+def bump_student_version(student_id):
+    version_changed(student_version_key(student_id))
+
+# Invalidates the cached fragments of every family, used after writes that are not tied to one family (teachers, seeding)
+def invalidate_all_fragments():
+    version_changed(GENERATION_KEY)
+
+def caching_allowed():
+    if getattr(_state, 'uncommitted_writes', False):
+        if connection.in_atomic_block:
+            return False
+        _state.uncommitted_writes = False
+    return True
+
+"""
+@params: user: UserAccount model object the fragment is shown to, name: name of the fragment,
+         build: function without arguments returning the picklable data of the fragment
+@return type: the data returned by build
+
+@Description: Returns the fragment of the user from the cache, building and storing it when the user or one of their children
+              changed since it was cached. Costs two cache reads and no query on a hit, the fragment and the versions it was built at
+"""
+def family_fragment(user, name, build):
+    if not caching_allowed():
+        return build()
+
+    cache = fragment_cache()
+    key = f'fragments:{name}:{user.id}'
+    cached = cache.get(key)
+    if cached is not None:
+        built_at, fragment = cached
+        if cache.get_many(list(built_at)) == built_at:
+            return fragment
+
+    # the versions are read before building, so a write made while building leaves the stored fragment out of date
+    member_ids = [user.id] + [child.id for child in children_of(user)]
+    built_at = current_versions([GENERATION_KEY] + [student_version_key(member_id) for member_id in member_ids])
+    fragment = build()
+    cache.set(key, (built_at, fragment), settings.FRAGMENT_CACHE_TIMEOUT)
+    return fragment
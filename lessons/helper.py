@@ -1,9 +1,14 @@
 from django.conf import settings
 from django.shortcuts import redirect
-from .models import UserRole, UserAccount, Lesson, LessonStatus, LessonType, Gender, Invoice, Transaction, InvoiceStatus,Term
-from itertools import chain
+from .models import UserRole, UserAccount, Lesson, LessonStatus, LessonType, LessonDuration, Gender, Invoice, Transaction, InvoiceStatus,Term
+from .term_calendar import term_calendar
+from .family import children_of, family_member_ids
+from .reference_data import admin_contact
+from .ownership import student_owns_lesson
+from django.db.models import Case, When, Value
 from django.utils import timezone
 import datetime
+from collections import namedtuple
 
 # Ensures user must log in before logging out (and redirects specific roles to their home page)
 
@@ -22,54 +27,41 @@ def login_prohibited(view_function):
 
 """
 @params: student: Student UserAccount model object, statusType: status of the lessons to filter
-@return type: list of lessons model object
+@return type: queryset of lessons model object
 
-@Description: Returns a list of lessons of the specified statustype including both that of the student and those of any of their children
+@Description: Returns the lessons of the specified statustype including both that of the student and those of any of their children
+              Fetched with a single query that also loads the teacher and student of each lesson, the student's own lessons come first
+              followed by those of each child
 """
 def get_student_and_child_lessons(student, statusType):
-    student_queryset = Lesson.objects.filter(lesson_status = statusType, student_id = student)
-
-    if student.is_parent:
-        child_queryset = UserAccount.objects.filter(parent_of_user = student)
-        result_queryset = student_queryset
-
-        for eachChild in child_queryset:
-            lesson_queryset = Lesson.objects.filter(student_id = eachChild , lesson_status = statusType)
-            result_queryset = chain(result_queryset, lesson_queryset)
-
-        return list(result_queryset)
-
-    return list(student_queryset)
+    return Lesson.objects.filter(
+        student_id__in = family_member_ids(student),
+        lesson_status = statusType,
+    ).select_related('teacher_id', 'student_id').order_by(
+        Case(When(student_id = student, then = Value(0)), default = Value(1)),
+        'student_id',
+        'lesson_id',
+    )
 
 """
 @params: student_id: Student UserAccount model object, other_lesson: Lesson model object
 @return type: Boolean
 
-@Description: returns whether the passed Student can access/perform operations on the passed Lesson by looping over the students' existing
-              UNFULFILLED lessons. Extends to both the student and any children they have
+@Description: returns whether the passed Student can access/perform operations on the passed Lesson, which must be one of the students'
+              UNFULFILLED lessons. Extends to both the student and any children they have, checked with one query (see ownership.py)
 """
 def check_correct_student_accessing_pending_lesson(student_id, other_lesson):
-    all_student_lessons = get_student_and_child_lessons(student_id,LessonStatus.UNFULFILLED)
-    for lesson in all_student_lessons:
-        if lesson.is_equal(other_lesson):
-            return True
-
-    return False
+    return student_owns_lesson(student_id, other_lesson, LessonStatus.UNFULFILLED)
 
 """
 @params: student_id: Student UserAccount model object, other_lesson: Lesson model,object
 @return type: Boolean
 
-@Description: returns whether the passed Student can access/perform operations on the passed Lesson by looping over the students' existing
-              SAVED lessons. Extends to both the student and any children they have
+@Description: returns whether the passed Student can access/perform operations on the passed Lesson, which must be one of the students'
+              SAVED lessons. Extends to both the student and any children they have, checked with one query (see ownership.py)
 """
 def check_correct_student_accessing_saved_lesson(student_id, other_lesson):
-    all_student_lessons = get_student_and_child_lessons(student_id,LessonStatus.SAVED)
-    for lesson in all_student_lessons:
-        if lesson.is_equal(other_lesson):
-            return True
-
-    return False
+    return student_owns_lesson(student_id, other_lesson, LessonStatus.SAVED)
 
 """
 @params: lesson_date: date of the lesson
@@ -78,17 +70,11 @@ def check_correct_student_accessing_saved_lesson(student_id, other_lesson):
 @Description: returns whether the lesson date requested or edited is valid by checking it falls within the range of term dates
 """
 def check_valid_date(lesson_date):
-    terms_list = (Term.objects.all())
-
-    term_number_list = []
-    for term in terms_list:
-        term_number_list.append(term.term_number)
-    
-    last_term = max(term_number_list)
-    first_term = min(term_number_list)
-    
-    last_term_end_date = Term.objects.get(term_number = last_term).end_date
-    first_term_start_date = Term.objects.get(term_number = first_term).start_date
+    bookable_range = term_calendar.bookable_range()
+    if bookable_range is None:
+        return False
+
+    first_term_start_date, last_term_end_date = bookable_range
     return (first_term_start_date <= lesson_date <= last_term_end_date) and (settings.CURRENT_DATE <= lesson_date)
 
 
@@ -105,10 +91,10 @@ def get_saved_lessons(student):
 """
 @return type: UserAccount model object
 
-@Description: Returns the first ADMIN UserAccount model object present in the database
+@Description: Returns the first ADMIN UserAccount model object present in the database, read from the reference data cache
 """
 def get_admin_email():
-    return UserAccount.objects.filter(role = UserRole.ADMIN).first()
+    return admin_contact()
 
 
 """
@@ -118,94 +104,56 @@ def get_admin_email():
 @Description: Returns a list of the the student and any corresponding children the student may have
 """
 def get_student_and_child_objects(student):
-    list_of_students = []
-    list_of_students.append(student)
-
-    if student.is_parent is True:
-        child_students = UserAccount.objects.filter(parent_of_user = student)
-
-        for child in child_students:
-            list_of_students.append(child)
-
-    return list_of_students
+    return [student] + children_of(student)
 
 """
-@params: student_user: UserAccount model object of role STUDENT
-@return type: Dictionary of FULFILLED Lesson Model Objects. Key: Lesson Object, Value: Dictionary with specific keys representing information to be displayed about the lesson such as the Student,Teacher,Lesson Duration
-
-@Description: Returns a dictionary of dictionaries that store timetabling information relevant to each lesson
+Row of the timetable of booked lessons, every field is already formatted for display
 """
+TimetableRow = namedtuple('TimetableRow', ['lesson_id', 'student', 'lesson', 'lesson_date', 'lesson_time', 'teacher'])
 
-def make_lesson_timetable_dictionary(student_user):
-    fullfilled_lessons = get_student_and_child_lessons(student_user,LessonStatus.FULLFILLED)
-
-    fullfilled_lessons_dict = {}
-
-    if len(fullfilled_lessons) == 0:
-        return fullfilled_lessons_dict
-
-    for lesson in fullfilled_lessons:
-        lesson_type_str = ''
-
-        #formats the lesson_type_str depedending on the lesson type
-        if lesson.type == LessonType.INSTRUMENT:
-            lesson_type_str = LessonType.INSTRUMENT.label
-        elif lesson.type == LessonType.THEORY:
-            lesson_type_str = LessonType.THEORY.label
-        elif lesson.type == LessonType.PRACTICE:
-            lesson_type_str = LessonType.PRACTICE.label
-        elif lesson.type == LessonType.PERFORMANCE:
-            lesson_type_str = LessonType.PERFORMANCE.label
-
-
-        new_time = lesson.lesson_date_time + datetime.timedelta(minutes=int(lesson.duration))
-
-        new_lesson_hr_str = ''
-        lesson_date_hr_str = ''
-
-        new_time_minute_str = ''
-        lesson_date_minute_str = ''
+#Lookup tables used to format the timetable rows
+TIMETABLE_LESSON_LABELS = dict(LessonType.choices)
+TIMETABLE_DURATIONS = {duration: datetime.timedelta(minutes=int(duration)) for duration in LessonDuration.values}
+TIMETABLE_TEACHER_TITLES = {Gender.FEMALE.value: 'Miss ', Gender.MALE.value: 'Mr '}
 
-        #format minutes using :00 notation
-        if new_time.minute < 10:
-            new_time_minute_str = f'0{new_time.minute}'
-        else:
-            new_time_minute_str = f'{new_time.minute}'
-
-        if lesson.lesson_date_time.minute < 10:
-            lesson_date_minute_str = f'0{lesson.lesson_date_time.minute}'
-        else:
-            lesson_date_minute_str = f'{lesson.lesson_date_time.minute}'
-
-        #format hours using 00: notation
-        if new_time.hour < 10:
-            new_lesson_hr_str = f'0{new_time.hour}'
-        else:
-            new_lesson_hr_str = f'{new_time.hour}'
-
-        if lesson.lesson_date_time.hour < 10:
-            lesson_date_hr_str = f'0{lesson.lesson_date_time.hour}'
-        else:
-            lesson_date_hr_str = f'{lesson.lesson_date_time.hour}'
-
-        teacher_str = ''
-
-        #formats teacher_str
-        if lesson.teacher_id.gender == Gender.FEMALE:
-            teacher_str = f'Miss {lesson.teacher_id}'
-        elif lesson.teacher_id.gender == Gender.MALE:
-            teacher_str = f'Mr {lesson.teacher_id}'
-        else:
-            teacher_str = f'{lesson.teacher_id}'
-
-        #formats the duration as 09:45 - 10:15
-        duration_str = f'{lesson_date_hr_str}:{lesson_date_minute_str} - {new_lesson_hr_str}:{new_time_minute_str}'
-
-        #adds each dictionary case as the value to the lesson as a key
-        case = {'Student':lesson.student_id,'Lesson': f'{lesson_type_str}', 'Lesson Date': f'{lesson.lesson_date_time.date()}', 'Lesson Duration': f'{duration_str}', 'Teacher': f'{teacher_str}'}
-        fullfilled_lessons_dict[lesson] = case
-
-    return fullfilled_lessons_dict
+"""
+@params: student_user: UserAccount model object of role STUDENT
+@return type: Tuple of TimetableRow
+
+@Description: Returns the timetable of the FULFILLED lessons of the student and of their children, the student's own lessons first,
+              then those of each child, each in date order. Read with one query joining the student and the teacher, without building
+              any model object. Lesson times are formatted as 09:45 - 10:15 and teachers as Miss/Mr followed by their name
+"""
+def make_lesson_timetable(student_user):
+    lessons = Lesson.objects.filter(
+        student_id__in = family_member_ids(student_user),
+        lesson_status = LessonStatus.FULLFILLED,
+    ).order_by(
+        Case(When(student_id = student_user, then = Value(0)), default = Value(1)),
+        'student_id',
+        'lesson_date_time',
+        'lesson_id',
+    ).values_list(
+        'lesson_id', 'type', 'duration', 'lesson_date_time',
+        'student_id__first_name', 'student_id__last_name',
+        'teacher_id__first_name', 'teacher_id__last_name', 'teacher_id__gender',
+    )
+
+    # the labels are translated once per timetable instead of once per lesson
+    lesson_labels = {lesson_type: str(label) for lesson_type, label in TIMETABLE_LESSON_LABELS.items()}
+
+    timetable = []
+    for lesson_id, lesson_type, duration, lesson_date_time, student_first_name, student_last_name, teacher_first_name, teacher_last_name, teacher_gender in lessons:
+        end_time = lesson_date_time + TIMETABLE_DURATIONS[duration]
+        timetable.append(TimetableRow(
+            lesson_id,
+            f'{student_first_name} {student_last_name}',
+            lesson_labels[lesson_type],
+            lesson_date_time.date().isoformat(),
+            f'{lesson_date_time.hour:02d}:{lesson_date_time.minute:02d} - {end_time.hour:02d}:{end_time.minute:02d}',
+            f'{TIMETABLE_TEACHER_TITLES.get(teacher_gender, "")}{teacher_first_name} {teacher_last_name}',
+        ))
+    return tuple(timetable)
 
 """
 @params: student_user: UserAccount model object of role STUDENT, lessonStatus: status of lesson to format in dictionary
@@ -0,0 +1,58 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .models import Invoice, InvoiceSequence
+
+"""
+Invoice reference allocation.
+Every student has an InvoiceSequence row holding the number of the last invoice reference handed out to them.
+Allocating references moves the counter forward with a single atomic UPDATE, which locks the row until the transaction
+commits, so concurrent admin sessions can never be handed the same reference number and allocation costs the same
+however many invoices the student already has.
+"""
+
+"""
+@params: student_id: id of the student
+@return type: int
+
+@Description: Returns the highest invoice number already used by the student, used to start the counter of a student
+              whose invoices were written without going through the allocator (for example from the django admin page)
+"""
+def highest_existing_invoice_number(student_id):
+    reference_numbers = Invoice.objects.filter(student_ID = str(student_id)).values_list('reference_number', flat=True)
+    highest = 0
+    count = 0
+    for reference_number in reference_numbers:
+        count += 1
+        suffix = reference_number.rpartition('-')[2]
+        if suffix.isdigit():
+            highest = max(highest, int(suffix))
+    return max(highest, count)
+
+"""
+@params: student_id: id of the student, count: number of references to reserve
+@return type: List of String
+
+@Description: Reserves count consecutive invoice reference numbers for the student and returns them in order
+"""
+def allocate_invoice_references(student_id, count):
+    if count < 1:
+        return []
+
+    student_id = int(student_id)
+    with transaction.atomic():
+        updated = InvoiceSequence.objects.filter(student_id = student_id).update(last_number = F('last_number') + count)
+        if updated == 0:
+            try:
+                with transaction.atomic():
+                    InvoiceSequence.objects.create(student_id = student_id, last_number = highest_existing_invoice_number(student_id) + count)
+            except IntegrityError:
+                # another session started the counter first, take the next numbers from it instead
+                InvoiceSequence.objects.filter(student_id = student_id).update(last_number = F('last_number') + count)
+        last_number = InvoiceSequence.objects.filter(student_id = student_id).values_list('last_number', flat=True).get()
+
+    first_number = last_number - count
+    return [Invoice.generate_new_invoice_reference_number(str(student_id), number) for number in range(first_number, last_number)]
+
+# Reserves the next invoice reference number for the student
+def allocate_invoice_reference(student_id):
+    return allocate_invoice_references(student_id, 1)[0]
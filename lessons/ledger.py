@@ -0,0 +1,141 @@
+from django.db import transaction
+from django.db.models import F, Sum
+from .models import UserAccount, Invoice, Transaction, LedgerEntry, LedgerEntryType
+from .family import family_ids_of
+from .fragment_cache import bump_student_version
+from .outstanding_balances import invalidate_outstanding_balances
+
+"""
+Balance ledger.
+Every invoice, invoice adjustment and payment is posted as an append-only LedgerEntry against the family account
+(the parent for a child student, the student itself otherwise) and the family's UserAccount.balance is moved by the
+same amount with an F() update in the same transaction. Posting costs the same however many invoices a family has,
+and reading a balance is a plain read of UserAccount.balance. The F() update skips the model signals, so the fragment
+version of the family account and the outstanding balances of the admins are invalidated here.
+"""
+
+"""
+@params: student: UserAccount model object or the id of one
+@return type: int
+
+@Description: Returns the id of the account that carries the balance of the student
+"""
+def family_id_of(student):
+    if isinstance(student, UserAccount):
+        return student.parent_of_user_id or student.id
+
+    parent_id = UserAccount.objects.filter(id = student).values_list('parent_of_user_id', flat=True).first()
+    return parent_id or int(student)
+
+"""
+@params: family_id: id of the family account, entry_type: LedgerEntryType, amount: change to the balance,
+         student_id: id of the student the entry is for, invoice_reference: reference number of the related invoice
+@return type: LedgerEntry model object
+
+@Description: Appends an entry to the ledger and applies it to the family balance atomically
+"""
+def post_entry(family_id, entry_type, amount, student_id = None, invoice_reference = ''):
+    with transaction.atomic():
+        entry = LedgerEntry.objects.create(
+            family_id = family_id,
+            student_id = student_id,
+            entry_type = entry_type,
+            amount = amount,
+            invoice_reference = invoice_reference,
+        )
+        if amount != 0:
+            UserAccount.objects.filter(id = family_id).update(balance = F('balance') + amount)
+            bump_student_version(family_id)
+        invalidate_outstanding_balances()
+    return entry
+
+# Posts a newly issued invoice, the family owes its fees
+def post_invoice(invoice, student = None):
+    student = student if student is not None else invoice.student_ID
+    student_id = student.id if isinstance(student, UserAccount) else int(student)
+    return post_entry(family_id_of(student), LedgerEntryType.INVOICE, -int(invoice.fees_amount), student_id, invoice.reference_number)
+
+"""
+@params: invoices: list of newly issued Invoice model objects whose student_account is loaded
+@return type: Dictionary of the fees posted by family id
+
+@Description: Posts many invoices at once: the entries of every invoice are appended with one insert and the balance of each
+              family is moved once by the fees of all its invoices, instead of one insert and one update per invoice
+"""
+def post_invoices(invoices):
+    entries = []
+    fees_by_family = {}
+    for invoice in invoices:
+        family_id = family_id_of(invoice.student_account)
+        amount = -int(invoice.fees_amount)
+        entries.append(LedgerEntry(family_id = family_id, student_id = invoice.student_account.id, entry_type = LedgerEntryType.INVOICE, amount = amount, invoice_reference = invoice.reference_number))
+        fees_by_family[family_id] = fees_by_family.get(family_id, 0) - amount
+
+    with transaction.atomic():
+        LedgerEntry.objects.bulk_create(entries)
+        for family_id, fees in fees_by_family.items():
+            if fees != 0:
+                UserAccount.objects.filter(id = family_id).update(balance = F('balance') - fees)
+                bump_student_version(family_id)
+        invalidate_outstanding_balances()
+    return fees_by_family
+
+# Posts a change of the fees of an existing invoice, fees_difference is new fees minus old fees
+def post_invoice_adjustment(invoice, fees_difference, student = None):
+    student = student if student is not None else invoice.student_ID
+    student_id = student.id if isinstance(student, UserAccount) else int(student)
+    return post_entry(family_id_of(student), LedgerEntryType.ADJUSTMENT, -int(fees_difference), student_id, invoice.reference_number)
+
+# Posts a payment made by the payer towards an invoice
+def post_payment(payment, payer):
+    return post_entry(family_id_of(payer), LedgerEntryType.PAYMENT, int(payment.transaction_amount), payer.id, payment.invoice_reference_transaction)
+
+"""
+@params: payments: list of Transaction model objects paid by the payer, payer: Student UserAccount model object
+@return type: int, the total posted
+
+@Description: Posts many payments of one payer at once: the entries of every payment are appended with one insert and the
+              balance of the family is moved once by their total
+"""
+def post_payments(payments, payer):
+    family_id = family_id_of(payer)
+    entries = [LedgerEntry(family_id = family_id, student_id = payer.id, entry_type = LedgerEntryType.PAYMENT, amount = int(payment.transaction_amount), invoice_reference = payment.invoice_reference_transaction) for payment in payments]
+    total = sum(entry.amount for entry in entries)
+
+    with transaction.atomic():
+        LedgerEntry.objects.bulk_create(entries)
+        if total != 0:
+            UserAccount.objects.filter(id = family_id).update(balance = F('balance') + total)
+            bump_student_version(family_id)
+        invalidate_outstanding_balances()
+    return total
+
+"""
+@params: family: UserAccount model object of the family account
+@return type: int
+
+@Description: Recomputes the balance of the family from scratch: payments made by the family account and its children minus
+              the fees of every invoice of the family account and its children, as post_payment credits a payment of a child to
+              its family. Used to reconcile the ledger, never on a request path
+"""
+def compute_family_balance(family):
+    member_ids = family_ids_of(family)
+    invoice_fee_total = Invoice.objects.filter(student_account__in = member_ids).aggregate(total = Sum('fees_amount'))['total'] or 0
+    payment_fee_total = Transaction.objects.filter(student_account__in = member_ids).aggregate(total = Sum('transaction_amount'))['total'] or 0
+    return payment_fee_total - invoice_fee_total
+
+"""
+@params: family: UserAccount model object of the family account
+@return type: int, the reconciled balance
+
+@Description: Brings the materialized balance of the family in line with its invoices and transactions by posting a
+              single ADJUSTMENT entry for any difference, so the ledger still sums to the balance
+"""
+def reconcile_family_balance(family):
+    with transaction.atomic():
+        expected = compute_family_balance(family)
+        current = UserAccount.objects.select_for_update().filter(id = family.id).values_list('balance', flat=True).first() or 0
+        if expected != current:
+            post_entry(family.id, LedgerEntryType.ADJUSTMENT, expected - current, family.id)
+    family.balance = expected
+    return expected
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from lessons.exports import EXPORTS, EXPORT_FORMATS, export_rows, export_lines
+import datetime
+
+class Command(BaseCommand):
+    help = 'Streams the invoices, transactions or lessons of the school as CSV or JSON lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export_name', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--start-date', type=datetime.date.fromisoformat, help='first date included, YYYY-MM-DD')
+        parser.add_argument('--end-date', type=datetime.date.fromisoformat, help='last date included, YYYY-MM-DD')
+        parser.add_argument('--student', type=int, help='only export the rows of the student with this id')
+        parser.add_argument('--output', help='file to write to, standard output by default')
+
+    # Writes the export line by line, so memory use does not grow with the number of rows
+    def handle(self, *args, **options):
+        start_date = options['start_date']
+        end_date = options['end_date']
+        if start_date is not None and end_date is not None and start_date > end_date:
+            raise CommandError('End date cannot be before the start date')
+
+        rows = export_rows(options['export_name'], start_date, end_date, options['student'])
+        lines = export_lines(options['export_name'], options['format'], rows)
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from lessons.term_calendar import term_calendar, relabel_lessons
+import time
+
+class Command(BaseCommand):
+    help = 'Recomputes the term label of every lesson from the current term dates'
+
+    # Relabels all lessons with set based updates, one per term window
+    def handle(self, *args, **options):
+        term_calendar.invalidate()
+
+        started = time.perf_counter()
+        updated = relabel_lessons()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f'Relabelled {updated} lessons in {elapsed:.2f}s')
@@ -7,18 +7,35 @@ import datetime
 from datetime import date
 from django.utils import timezone
 from django.db import IntegrityError
+from lessons.ledger import reconcile_family_balance
+from lessons.invoice_references import allocate_invoice_references
+from lessons.seeding import seed_terms, seed_at_scale, BATCH_SIZE, SEED_PASSWORD
+import time
 
 letters = string.ascii_lowercase
 
 
 class Command(BaseCommand):
 
-    def __init__(self):
-        super().__init__()
+    help = 'Seeds the database with users, lessons, invoices and transactions'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
         self.faker = Faker()
 
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, help='bulk seed this many families instead of the default data set')
+        parser.add_argument('--seed', type=int, help='seed of the random generators, the same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='rows per INSERT when seeding with --scale')
+
     # Seeds the database with users
     def handle(self, *args, **options):
+        if options.get('scale') is not None:
+            return self.handle_scale(options['scale'], options.get('seed') or 0, options.get('batch_size') or BATCH_SIZE)
+
+        if options.get('seed') is not None:
+            random.seed(options['seed'])
+            Faker.seed(options['seed'])
 
         # Add the set Student, Admin and Directors
         UserAccount.objects.create_admin(
@@ -36,41 +53,7 @@ class Command(BaseCommand):
             gender ="PNOT",
         )
 
-        Term.objects.create(
-            term_number=1,
-            start_date = datetime.date(2022, 9,1),
-            end_date = datetime.date(2022, 10,21),
-        )
-
-        Term.objects.create(
-            term_number=2,
-            start_date = datetime.date(2022, 10,31),
-            end_date = datetime.date(2022, 12,16),
-        )
-
-        Term.objects.create(
-            term_number=3,
-            start_date = datetime.date(2023, 1,3),
-            end_date = datetime.date(2023, 2,10),
-        )
-
-        Term.objects.create(
-            term_number=4,
-            start_date = datetime.date(2023, 2,20),
-            end_date = datetime.date(2023, 3,31),
-        )
-
-        Term.objects.create(
-            term_number=5,
-            start_date = datetime.date(2023, 4,17),
-            end_date = datetime.date(2023, 5,26),
-        )
-
-        Term.objects.create(
-            term_number=6,
-            start_date = datetime.date(2023, 6,5),
-            end_date = datetime.date(2023, 7,21),
-        )
+        seed_terms()
 
         #restet fakers uniqueness every time we seed
         self.faker.unique.clear()
@@ -311,13 +294,13 @@ class Command(BaseCommand):
             students_id_string = str(student_Id) # turn the studen id to string so it will able to use for constructingt the reference number of the invoice
 
             # this filter out all the booked lesson for this student
-            lessons_booked = Lesson.objects.filter(student_id = students[i], lesson_status = LessonStatus.FULLFILLED)
-            for lesson in lessons_booked:
-                # for each lesson, calculate the fees and contruct the reference number of the invoice
+            lessons_booked = list(Lesson.objects.filter(student_id = students[i], lesson_status = LessonStatus.FULLFILLED))
+            # reserve the reference numbers of all invoices of this student at once
+            reference_numbers = allocate_invoice_references(student_Id, len(lessons_booked))
+            for lesson, reference_number_temp in zip(lessons_booked, reference_numbers):
+                # for each lesson, calculate the fees of the invoice
                 fees = Invoice.calculate_fees_amount(lesson.duration)
                 fees_int = int(fees)
-                student_number_of_invoice_pre_exist = Invoice.objects.filter(student_ID = student_Id)
-                reference_number_temp = Invoice.generate_new_invoice_reference_number(students_id_string, len(student_number_of_invoice_pre_exist))
 
                 # the invoice status is random, there's low probably to create UNPAID and PARTIALLY_PAID invoice and a very low chance to create OVERPAID invoice
                 # if the invoice status is not UNPAID, a transaction will also be created
@@ -348,44 +331,21 @@ class Command(BaseCommand):
                     else:
                         Transaction.objects.create(Student_ID_transaction = students_id_string, invoice_reference_transaction = reference_number_temp, transaction_amount = fees_int)
 
-            # this calculate the balance for student, if this student has children, the children's invoice will also be use to calculte the balance
+            # the invoices and transactions above are written directly, so the family balance is reconciled through the ledger
+            # if this student is a child, the balance is carried by the parent
             if(students[i].parent_of_user):
-                current_existing_invoice_parent = Invoice.objects.filter(student_ID = students[i].parent_of_user.id)
-
-                list_of_child_invoice = []
-                children = UserAccount.objects.filter(parent_of_user = students[i].parent_of_user)
-                for child in children:
-                    child_invoice = Invoice.objects.filter(student_ID = child.id)
-                    for invoice in child_invoice:
-                        list_of_child_invoice.append(invoice)
-
-                current_existing_transaction = Transaction.objects.filter(Student_ID_transaction = students[i].parent_of_user.id)
-
-                invoice_fee_total = 0
-                payment_fee_total = 0
-
-                for invoice in list_of_child_invoice:
-                    invoice_fee_total += invoice.fees_amount
-
-                for invoice in current_existing_invoice_parent:
-                    invoice_fee_total += invoice.fees_amount
-
-                for transaction in current_existing_transaction:
-                    payment_fee_total += transaction.transaction_amount
-
-                students[i].parent_of_user.balance = payment_fee_total - invoice_fee_total
-                students[i].parent_of_user.save()
+                reconcile_family_balance(students[i].parent_of_user)
             else:
-                current_existing_invoice = Invoice.objects.filter(student_ID = student_Id)
-                current_existing_transaction = Transaction.objects.filter(Student_ID_transaction = student_Id)
-                invoice_fee_total = 0
-                payment_fee_total = 0
+                reconcile_family_balance(students[i])
 
-                for invoice in current_existing_invoice:
-                    invoice_fee_total += invoice.fees_amount
+    # Bulk seeds a production sized data set, see lessons/seeding.py
+    def handle_scale(self, families, seed, batch_size):
+        if families < 1:
+            raise CommandError('--scale must be at least 1')
 
-                for transaction in current_existing_transaction:
-                    payment_fee_total += transaction.transaction_amount
+        started = time.perf_counter()
+        counts = seed_at_scale(families, seed, batch_size)
+        elapsed = time.perf_counter() - started
 
-                students[i].balance = payment_fee_total - invoice_fee_total
-                students[i].save()
+        self.stdout.write(', '.join(f'{count} {name}' for name, count in counts.items()) + f' seeded in {elapsed:.2f}s')
+        self.stdout.write(f'Every seeded account uses the password {SEED_PASSWORD}')
@@ -1,15 +1,29 @@
 from django.core.management.base import BaseCommand, CommandError
 from faker import Faker
 from lessons.models import UserAccount, Invoice, Transaction, Term
+from lessons.seeding import unseed_all
+import time
+
+#Account that is never deleted
+PROTECTED_EMAIL = "admin@example.org"
 
 class Command(BaseCommand):
+
+    help = 'Deletes every account except admin@example.org, and every invoice, transaction and term'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fast', action='store_true', help='delete with one statement per table in a single transaction')
+
     # Delete all users, except for email admin@example.org
     # Delete all invoices that generate base on existing user and bookings
     def handle(self, *args, **options):
+        if options.get('fast'):
+            return self.handle_fast()
+
         users = UserAccount.objects.all()
         for i in range(len(users)):
 
-            if users[i].email != "admin@example.org":
+            if users[i].email != PROTECTED_EMAIL:
                 users[i].delete()
 
         invoices = Invoice.objects.all()
@@ -23,3 +37,12 @@ class Command(BaseCommand):
         terms_list = Term.objects.all()
         for i in range(len(terms_list)):
             terms_list[i].delete()
+
+    # Set based reset, see unseed_all in lessons/seeding.py
+    def handle_fast(self):
+        started = time.perf_counter()
+        counts = unseed_all(PROTECTED_EMAIL)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(', '.join(f'{count} {name}' for name, count in counts.items()))
+        self.stdout.write(f'{sum(counts.values())} rows removed in {elapsed:.2f}s')
@@ -0,0 +1,60 @@
+# Generated by Django 4.1.3 on 2026-10-18 09:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db.models import Sum
+
+
+# Opens the ledger of every family with its current balance, recomputed from its invoices and transactions
+# The balance of a child is carried by the parent from now on, so child balances are reset to zero
+def open_family_ledgers(apps, schema_editor):
+    UserAccount = apps.get_model('lessons', 'UserAccount')
+    Invoice = apps.get_model('lessons', 'Invoice')
+    Transaction = apps.get_model('lessons', 'Transaction')
+    LedgerEntry = apps.get_model('lessons', 'LedgerEntry')
+
+    family_of = dict(UserAccount.objects.values_list('id', 'parent_of_user_id'))
+    balances = {}
+
+    for student_id, total in Invoice.objects.values_list('student_ID').annotate(total=Sum('fees_amount')):
+        if student_id.isdigit() and int(student_id) in family_of:
+            family_id = family_of[int(student_id)] or int(student_id)
+            balances[family_id] = balances.get(family_id, 0) - total
+
+    for student_id, total in Transaction.objects.values_list('Student_ID_transaction').annotate(total=Sum('transaction_amount')):
+        if student_id.isdigit() and int(student_id) in family_of:
+            family_id = family_of[int(student_id)] or int(student_id)
+            balances[family_id] = balances.get(family_id, 0) + total
+
+    UserAccount.objects.update(balance=0)
+    entries = []
+    for family_id, balance in balances.items():
+        if balance != 0:
+            UserAccount.objects.filter(id=family_id).update(balance=balance)
+            entries.append(LedgerEntry(family_id=family_id, student_id=family_id, entry_type='ADJ', amount=balance))
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('INV', 'Invoice issued'), ('ADJ', 'Invoice adjusted'), ('PAY', 'Payment received')], max_length=3)),
+                ('amount', models.IntegerField()),
+                ('invoice_reference', models.CharField(blank=True, max_length=30)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('family', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to=settings.AUTH_USER_MODEL)),
+                ('student', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(open_family_ledgers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.1.3 on 2026-10-18 09:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Starts the invoice counter of every student that already has invoices after the highest number used so far,
+# so references allocated from the counter never collide with existing ones
+def start_invoice_sequences(apps, schema_editor):
+    UserAccount = apps.get_model('lessons', 'UserAccount')
+    Invoice = apps.get_model('lessons', 'Invoice')
+    InvoiceSequence = apps.get_model('lessons', 'InvoiceSequence')
+
+    student_ids = set(UserAccount.objects.values_list('id', flat=True))
+    last_numbers = {}
+    for student_id, reference_number in Invoice.objects.values_list('student_ID', 'reference_number').iterator(chunk_size=2000):
+        if not student_id.isdigit() or int(student_id) not in student_ids:
+            continue
+        suffix = reference_number.rpartition('-')[2]
+        count = last_numbers.get(int(student_id), (0, 0))[0] + 1
+        highest = max(last_numbers.get(int(student_id), (0, 0))[1], int(suffix) if suffix.isdigit() else 0)
+        last_numbers[int(student_id)] = (count, highest)
+
+    InvoiceSequence.objects.bulk_create(
+        [InvoiceSequence(student_id=student_id, last_number=max(count, highest)) for student_id, (count, highest) in last_numbers.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0002_ledgerentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(start_invoice_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.1.3 on 2026-10-18 09:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0003_invoicesequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='booked_lesson',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoices', to='lessons.lesson'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='student_account',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoices', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='invoice',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='lessons.invoice'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='student_account',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,72 @@
+from django.db import migrations, transaction
+
+
+# Number of rows backfilled per transaction, each chunk only holds its write lock for a short time
+CHUNK_SIZE = 1000
+
+
+def id_chunks(model):
+    last_id = 0
+    while True:
+        ids = list(model.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:CHUNK_SIZE])
+        if len(ids) == 0:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def digit_ids(values):
+    return {int(value) for value in values if value.isdigit()}
+
+
+# Fills Invoice.student_account and Invoice.booked_lesson from student_ID and lesson_ID, chunk by chunk
+def backfill_invoices(apps, schema_editor):
+    UserAccount = apps.get_model('lessons', 'UserAccount')
+    Lesson = apps.get_model('lessons', 'Lesson')
+    Invoice = apps.get_model('lessons', 'Invoice')
+
+    for ids in id_chunks(Invoice):
+        with transaction.atomic():
+            rows = list(Invoice.objects.filter(id__in=ids).values_list('id', 'student_ID', 'lesson_ID'))
+            students = set(UserAccount.objects.filter(id__in=digit_ids(row[1] for row in rows)).values_list('id', flat=True))
+            lessons = set(Lesson.objects.filter(lesson_id__in=digit_ids(row[2] for row in rows)).values_list('lesson_id', flat=True))
+
+            invoices = []
+            for invoice_id, student_ID, lesson_ID in rows:
+                student_account_id = int(student_ID) if student_ID.isdigit() and int(student_ID) in students else None
+                booked_lesson_id = int(lesson_ID) if lesson_ID.isdigit() and int(lesson_ID) in lessons else None
+                invoices.append(Invoice(id=invoice_id, student_account_id=student_account_id, booked_lesson_id=booked_lesson_id))
+            Invoice.objects.bulk_update(invoices, ['student_account', 'booked_lesson'])
+
+
+# Fills Transaction.student_account and Transaction.invoice from Student_ID_transaction and invoice_reference_transaction, chunk by chunk
+def backfill_transactions(apps, schema_editor):
+    UserAccount = apps.get_model('lessons', 'UserAccount')
+    Invoice = apps.get_model('lessons', 'Invoice')
+    Transaction = apps.get_model('lessons', 'Transaction')
+
+    for ids in id_chunks(Transaction):
+        with transaction.atomic():
+            rows = list(Transaction.objects.filter(id__in=ids).values_list('id', 'Student_ID_transaction', 'invoice_reference_transaction'))
+            students = set(UserAccount.objects.filter(id__in=digit_ids(row[1] for row in rows)).values_list('id', flat=True))
+            invoices_by_reference = dict(Invoice.objects.filter(reference_number__in={row[2] for row in rows if row[2]}).values_list('reference_number', 'id'))
+
+            transactions = []
+            for transaction_id, student_ID, reference_number in rows:
+                student_account_id = int(student_ID) if student_ID.isdigit() and int(student_ID) in students else None
+                transactions.append(Transaction(id=transaction_id, student_account_id=student_account_id, invoice_id=invoices_by_reference.get(reference_number)))
+            Transaction.objects.bulk_update(transactions, ['student_account', 'invoice'])
+
+
+class Migration(migrations.Migration):
+    # every chunk commits on its own instead of the whole backfill running in one long transaction
+    atomic = False
+
+    dependencies = [
+        ('lessons', '0004_invoice_transaction_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_invoices, migrations.RunPython.noop),
+        migrations.RunPython(backfill_transactions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1.3 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0005_backfill_invoice_transaction_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='lesson_end_time',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Lesson End Time'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['teacher_id', 'lesson_date_time'], name='lesson_teacher_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['student_id', 'lesson_date_time'], name='lesson_student_start_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+import datetime
+
+from django.db import migrations, models, transaction
+
+
+# Number of rows backfilled per transaction, each chunk only holds its write lock for a short time
+CHUNK_SIZE = 1000
+
+
+def lesson_id_chunks(Lesson):
+    last_id = 0
+    while True:
+        ids = list(Lesson.objects.filter(lesson_id__gt=last_id).order_by('lesson_id').values_list('lesson_id', flat=True)[:CHUNK_SIZE])
+        if len(ids) == 0:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+# Fills Lesson.lesson_end_time from lesson_date_time and duration, chunk by chunk
+def backfill_lesson_end_times(apps, schema_editor):
+    Lesson = apps.get_model('lessons', 'Lesson')
+
+    for ids in lesson_id_chunks(Lesson):
+        with transaction.atomic():
+            lessons = [
+                Lesson(lesson_id=lesson_id, lesson_end_time=lesson_date_time + datetime.timedelta(minutes=int(duration)))
+                for lesson_id, lesson_date_time, duration in Lesson.objects.filter(lesson_id__in=ids).values_list('lesson_id', 'lesson_date_time', 'duration')
+            ]
+            Lesson.objects.bulk_update(lessons, ['lesson_end_time'])
+
+
+class Migration(migrations.Migration):
+    # every chunk commits on its own instead of the whole backfill running in one long transaction
+    atomic = False
+
+    dependencies = [
+        ('lessons', '0006_lesson_end_time'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_lesson_end_times, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='lesson',
+            name='lesson_end_time',
+            field=models.DateTimeField(editable=False, verbose_name='Lesson End Time'),
+        ),
+    ]
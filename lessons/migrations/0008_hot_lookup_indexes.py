@@ -0,0 +1,33 @@
+# Generated by Django 4.1.3 on 2026-10-18 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0007_backfill_lesson_end_time'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['student_ID'], name='invoice_student_string_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['student_id', 'lesson_status'], name='lesson_student_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['lesson_status', 'lesson_date_time'], name='lesson_status_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['Student_ID_transaction'], name='transaction_student_string_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useraccount',
+            index=models.Index(fields=['role', 'is_parent'], name='useraccount_role_idx'),
+        ),
+    ]
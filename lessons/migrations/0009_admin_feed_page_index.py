@@ -0,0 +1,17 @@
+# Generated by Django 4.1.3 on 2026-10-18 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0008_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['lesson_status', 'lesson_id'], name='lesson_status_id_idx'),
+        ),
+    ]
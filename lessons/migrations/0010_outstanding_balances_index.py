@@ -0,0 +1,17 @@
+# Generated by Django 4.1.3 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0009_admin_feed_page_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['invoice_status', 'student_account'], name='invoice_status_student_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.1.3 on 2026-10-18 11:30
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+# Fills in what the open invoices of every family still owe, carried by the parent for the invoices of a child
+def fill_family_outstanding(apps, schema_editor):
+    UserAccount = apps.get_model('lessons', 'UserAccount')
+    Invoice = apps.get_model('lessons', 'Invoice')
+
+    family_of = dict(UserAccount.objects.values_list('id', 'parent_of_user_id'))
+    outstanding = {}
+
+    open_invoices = Invoice.objects.filter(invoice_status__in=['UNPAID', 'PARTIALLY_PAID'], amounts_need_to_pay__gt=0, student_account__isnull=False)
+    for student_id, total in open_invoices.values_list('student_account_id').annotate(total=Sum('amounts_need_to_pay')):
+        family_id = family_of[student_id] or student_id
+        outstanding[family_id] = outstanding.get(family_id, 0) + total
+
+    for family_id, total in outstanding.items():
+        UserAccount.objects.filter(id=family_id).update(outstanding=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0010_outstanding_balances_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useraccount',
+            name='outstanding',
+            field=models.IntegerField(blank=True, default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='useraccount',
+            index=models.Index(condition=models.Q(('outstanding__gt', 0)), fields=['-outstanding', 'id'], name='useraccount_outstanding_idx'),
+        ),
+        migrations.RunPython(fill_family_outstanding, migrations.RunPython.noop),
+    ]
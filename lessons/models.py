@@ -5,6 +5,7 @@ from django.core.validators import RegexValidator,MaxValueValidator,MinValueVali
 from django.contrib.auth.base_user import BaseUserManager
 
 from django.utils import timezone
+import datetime
 
 from django.utils.translation import gettext_lazy as _
 
@@ -13,6 +14,8 @@ from django.conf import settings
 
 from django.core.exceptions import ObjectDoesNotExist
 
+from .term_calendar import term_calendar, UNLABELLED
+
 #Shows the status of the invoices
 class InvoiceStatus(models.TextChoices):
     PAID = 'PAID', _('This invoices has been paid')
@@ -20,6 +23,9 @@ class InvoiceStatus(models.TextChoices):
     PARTIALLY_PAID = 'PARTIALLY_PAID', _('This invoice has been partially paid')
     DELETED = 'DELETED', _('This invoice has been deleted')
 
+#Statuses of the invoices that can still be paid
+PAYABLE_INVOICE_STATUSES = (InvoiceStatus.UNPAID, InvoiceStatus.PARTIALLY_PAID)
+
 #Enum type for the status of a lesson
 class LessonStatus(models.TextChoices):
     SAVED = 'SA', _('The lesson has been saved')
@@ -47,6 +53,12 @@ class UserRole(models.TextChoices):
     DIRECTOR = 'DIR', _('Director')
     TEACHER = 'TEA', _('Teacher')
 
+#Enum type for the entries posted to the balance ledger
+class LedgerEntryType(models.TextChoices):
+    INVOICE = 'INV', _('Invoice issued')
+    ADJUSTMENT = 'ADJ', _('Invoice adjusted')
+    PAYMENT = 'PAY', _('Payment received')
+
 #Enum type for the gender of the student user
 class Gender(models.TextChoices):
     MALE = 'M' , _('Male')
@@ -101,7 +113,12 @@ class UserAccountManager(BaseUserManager):
         extra_fields.setdefault('is_superuser', False)
         extra_fields.setdefault('is_active', True)
         extra_fields.setdefault('role', UserRole.STUDENT)
-        return self._create_user(email, password, **extra_fields)
+        child = self._create_user(email, password, **extra_fields)
+
+        #the children memoized on the parent object no longer include the new child
+        from .family import forget_family
+        forget_family(parent)
+        return child
 
     #creates an admin account, which has staff permissions, assigned ADMIN UserRole type
     def create_admin(self, email, password, **extra_fields):
@@ -213,6 +230,21 @@ class UserAccount(AbstractBaseUser, PermissionsMixin):
         editable=False,
     )
 
+    #outstanding is what the open invoices of the family still owe, kept on the family account by lessons.outstanding_balances
+    #and always 0 on a child account
+    outstanding = models.IntegerField(
+        default=0,
+        blank = True,
+        editable=False,
+    )
+
+    #remembers the parent the account was loaded with, so moving a child to another family can update the family it left
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_parent_of_user_id = instance.__dict__.get('parent_of_user_id')
+        return instance
+
     def get_student_balance(self):
         return f'{self.balance}'
 
@@ -221,6 +253,33 @@ class UserAccount(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
+
+    #accounts are listed by role, and students by whether they are parents
+    class Meta:
+        indexes = [
+            models.Index(fields = ['role', 'is_parent'], name = 'useraccount_role_idx'),
+            models.Index(fields = ['-outstanding', 'id'], name = 'useraccount_outstanding_idx', condition = models.Q(outstanding__gt = 0)),
+        ]
+"""
+Manager for the lesson model
+bulk_create skips Lesson.save, so the term label is assigned here from the term calendar before the rows are inserted
+"""
+#Longest lesson that can be booked, no lesson starting earlier than this before a time can still be running at that time
+LONGEST_LESSON = datetime.timedelta(minutes = max(int(duration) for duration in LessonDuration.values))
+
+#Returns when a lesson starting at lesson_date_time and lasting duration minutes ends
+def end_of_lesson(lesson_date_time, duration):
+    return lesson_date_time + datetime.timedelta(minutes = int(duration))
+
+class LessonManager(models.Manager):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        calendar = term_calendar.snapshot()
+        for lesson in objs:
+            lesson.term = calendar.label_for(lesson.lesson_date_time.date()) or UNLABELLED
+            lesson.lesson_end_time = end_of_lesson(lesson.lesson_date_time, lesson.duration)
+        return super().bulk_create(objs, *args, **kwargs)
+
 """
 Lesson model refers to the single lesson requested by the student user
 It can have varying information such as the type of lessons, its duration , the teacher related to the lesson and the student that requested it
@@ -249,6 +308,8 @@ class Lesson(models.Model):
 
     lesson_date_time = models.DateTimeField('Lesson Date And Time', blank = False)
 
+    lesson_end_time = models.DateTimeField('Lesson End Time', editable = False)
+
     teacher_id = models.ForeignKey(UserAccount,on_delete=models.CASCADE, related_name = 'teacher')
 
     student_id = models.ForeignKey(UserAccount, on_delete = models.CASCADE, related_name = 'student')
@@ -257,39 +318,14 @@ class Lesson(models.Model):
 
     term = models.CharField(max_length=3,default = 'N/A')
 
+    objects = LessonManager()
 
-    def save(self, *args,**kwargs):
 
-        terms_list = Term.objects.all()
-
-        for eachterm in terms_list :
-
-            #Calculate mid-term date
-            start = eachterm.start_date
-            end = eachterm.end_date
-            mid_term_date = start + (end - start)/2
-            close_to_end_of_term = end-(end - mid_term_date)/6
-
-            try:
-                next_term = Term.objects.get(term_number = eachterm.term_number + 1)
-            except ObjectDoesNotExist:
-                next_term = None
-
-            #Display term number only if the lesson starts before mid-term
-            if(eachterm.start_date <= self.lesson_date_time.date()  <= close_to_end_of_term):
-                self.term = 'Term : ' + str(eachterm.term_number) #+ '            For reference : ' + str(self.lesson_date_time.date())
-                break
-            #Set term date for next term if the current term is close to finishing
-            elif (next_term != None and close_to_end_of_term <= self.lesson_date_time.date()  < next_term.start_date):
-                term = eachterm.term_number + 1
-                self.term = 'Term : ' + str(term) + '(Close to next term)'#               For reference : ' + str(self.lesson_date_time.date())
-                break
-            #Set term date for next term if the current term is close to finishing and the is no next term set
-            elif(next_term == None and close_to_end_of_term <= self.lesson_date_time.date()  < end):
-                self.term = 'Term : ' + str(eachterm.term_number) + '(Close to next term but no next term)'#       For reference : ' + str(self.lesson_date_time.date())
-                break
-            # else:#If lesson is not before mid term and is not close to end of term
-            #     self.term = 'N/A'
+    #Labels the lesson with the term it falls in (or is close to), UNLABELLED when no term matches as relabel_lessons does,
+    #and stores when the lesson ends so overlapping lessons can be found with an index range query
+    def save(self, *args,**kwargs):
+        self.term = term_calendar.label_for(self.lesson_date_time.date()) or UNLABELLED
+        self.lesson_end_time = end_of_lesson(self.lesson_date_time, self.duration)
 
         super(Lesson,self).save(*args, **kwargs)
 
@@ -297,6 +333,14 @@ class Lesson(models.Model):
 
     class Meta:
         unique_together = (('request_date', 'lesson_date_time', 'student_id'),)
+        indexes = [
+            models.Index(fields = ['teacher_id', 'lesson_date_time'], name = 'lesson_teacher_start_idx'),
+            models.Index(fields = ['student_id', 'lesson_date_time'], name = 'lesson_student_start_idx'),
+            models.Index(fields = ['student_id', 'lesson_status'], name = 'lesson_student_status_idx'),
+            models.Index(fields = ['lesson_status', 'lesson_date_time'], name = 'lesson_status_start_idx'),
+            #pages of the lessons with a status are read in lesson_id order by the admin feed
+            models.Index(fields = ['lesson_status', 'lesson_id'], name = 'lesson_status_id_idx'),
+        ]
 
     def is_equal(self,other_lesson):
         return ((self.lesson_id == other_lesson.lesson_id) and (self.request_date == other_lesson.request_date) and (self.lesson_date_time == other_lesson.lesson_date_time) and (self.student_id == other_lesson.student_id))
@@ -308,6 +352,8 @@ class Lesson(models.Model):
 # invoices_status field refers to the status of this invoices, can be PAID, UNPAID, PARTIALLY_PAID and DELETED
 # amounts_need_to_pay refers to the amount left for student to pay for this invoice
 # lesson_ID refers to the lesson this invoice pay for
+# student_account and booked_lesson are the indexed foreign keys of student_ID and lesson_ID, they are resolved from the string fields on save
+# and are what lookups and joins should use, they are left empty when the string does not refer to an existing row
 class Invoice(models.Model):
     reference_number = models.CharField(
         max_length=30,
@@ -362,6 +408,33 @@ class Invoice(models.Model):
         )]
     )
 
+    student_account = models.ForeignKey(UserAccount, on_delete=models.SET_NULL, related_name='invoices', blank=True, null=True, editable=False)
+
+    booked_lesson = models.ForeignKey(Lesson, on_delete=models.SET_NULL, related_name='invoices', blank=True, null=True, editable=False)
+
+    #student_ID is still looked up by the invoice reference fallback and by new accounts adopting their existing invoices
+    class Meta:
+        indexes = [
+            models.Index(fields = ['student_ID'], name = 'invoice_student_string_idx'),
+            #the open invoices of every family are summed up by the outstanding balances page
+            models.Index(fields = ['invoice_status', 'student_account'], name = 'invoice_status_student_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.resolve_foreign_keys()
+        super().save(*args, **kwargs)
+
+    # Points student_account and booked_lesson at the rows student_ID and lesson_ID refer to
+    # The database is only queried when a string field no longer matches its foreign key
+    def resolve_foreign_keys(self):
+        student_ID = str(self.student_ID)
+        if student_ID != str(self.student_account_id):
+            self.student_account_id = UserAccount.objects.filter(id = student_ID).values_list('id', flat=True).first() if student_ID.isdigit() else None
+
+        lesson_ID = str(self.lesson_ID)
+        if lesson_ID != str(self.booked_lesson_id):
+            self.booked_lesson_id = Lesson.objects.filter(lesson_id = lesson_ID).values_list('lesson_id', flat=True).first() if lesson_ID.isdigit() else None
+
     # This function is use to construct reference number for invoice
     # The reference number is create base on the student id and the number of pre exist invoices for this student
     # The contructed invoice reference number will then be return
@@ -393,6 +466,7 @@ class Invoice(models.Model):
 # Student_ID_transaction refers to the student id of the student who made the transaction
 # invoice_reference_transaction refers to the invoice this transaction paid for, this field can't be unique as student can pay for same invoice multiple times
 # transaction_amount refers to the amount of the money student paid outside the system
+# student_account and invoice are the indexed foreign keys of Student_ID_transaction and invoice_reference_transaction, resolved from them on save
 class Transaction(models.Model):
     Student_ID_transaction = models.CharField(
         max_length = 30,
@@ -422,6 +496,62 @@ class Transaction(models.Model):
         ]
     )
 
+    student_account = models.ForeignKey(UserAccount, on_delete=models.SET_NULL, related_name='transactions', blank=True, null=True, editable=False)
+
+    invoice = models.ForeignKey(Invoice, on_delete=models.SET_NULL, related_name='transactions', blank=True, null=True, editable=False)
+
+    #Student_ID_transaction is still looked up by new accounts adopting their existing transactions
+    class Meta:
+        indexes = [
+            models.Index(fields = ['Student_ID_transaction'], name = 'transaction_student_string_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.resolve_foreign_keys()
+        super().save(*args, **kwargs)
+
+    # Points student_account and invoice at the rows Student_ID_transaction and invoice_reference_transaction refer to
+    # The database is only queried when a string field no longer matches its foreign key
+    def resolve_foreign_keys(self):
+        student_ID = str(self.Student_ID_transaction)
+        if student_ID != str(self.student_account_id):
+            self.student_account_id = UserAccount.objects.filter(id = student_ID).values_list('id', flat=True).first() if student_ID.isdigit() else None
+
+        reference_number = self.invoice_reference_transaction
+        cached_invoice = self.invoice if Transaction.invoice.is_cached(self) else None
+        if cached_invoice is None or cached_invoice.reference_number != reference_number:
+            self.invoice = Invoice.objects.filter(reference_number = reference_number).first() if reference_number else None
+
+# LedgerEntry models refers to one append-only entry of the balance ledger, entries are never edited or deleted once posted
+# family refers to the account that carries the balance, the parent for a child student and the student itself otherwise
+# student refers to the student the entry was made for, which can be a child of the family account
+# amount refers to the change to the family balance, invoices are negative and payments positive
+# invoice_reference refers to the invoice the entry relates to, blank for balance corrections
+class LedgerEntry(models.Model):
+    family = models.ForeignKey(UserAccount, on_delete=models.CASCADE, related_name='ledger_entries')
+
+    student = models.ForeignKey(UserAccount, on_delete=models.CASCADE, related_name='+', blank=True, null=True)
+
+    entry_type = models.CharField(
+        max_length=3,
+        choices=LedgerEntryType.choices,
+        blank=False,
+    )
+
+    amount = models.IntegerField(blank=False)
+
+    invoice_reference = models.CharField(max_length=30, blank=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+# InvoiceSequence models refers to the counter used to number the invoices of a student
+# last_number refers to the number of the last invoice reference allocated to the student, the next invoice gets last_number + 1
+# The counter is only ever moved forward with an atomic update, see lessons/invoice_references.py
+class InvoiceSequence(models.Model):
+    student = models.OneToOneField(UserAccount, on_delete=models.CASCADE, primary_key=True, related_name='+')
+
+    last_number = models.PositiveIntegerField(default=0)
+
 class Term(models.Model):
     term_number =  models.IntegerField(
         # blank = True,
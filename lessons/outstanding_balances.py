@@ -0,0 +1,137 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Case, Count, Func, Min, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import UserAccount, Invoice, PAYABLE_INVOICE_STATUSES
+from .fragment_cache import GENERATION_KEY, fragment_cache, current_versions, version_changed, caching_allowed
+
+"""
+Outstanding balances of the families, shown to admins ranked by how much they owe.
+What the open invoices of a family still owe is kept on the family account in UserAccount.outstanding (the parent for a
+child student, the student itself otherwise, child accounts always hold 0). It is recomputed for the families an invoice or
+account write touches with one UPDATE reading their open invoices through the (invoice_status, student_account) index: the
+Invoice and UserAccount signals do it for model saves, and the payments and bookings that write invoices with queryset and
+bulk operations do it themselves. A page is then read in order from the partial index over the families owing something,
+plus one query counting the open invoices of the families of the page. What is left to pay on an invoice already has its
+payments taken off, so the transactions do not need to be read again.
+Pages are cached in the cache named by FRAGMENT_CACHE under a version that is replaced by every invoice, payment and student
+account write (see lessons.signals and lessons.ledger, which every invoice and payment is posted through) and by
+invalidate_all_fragments. As with the fragment cache, pages are read per call instead of cached while a write is uncommitted.
+"""
+
+#Key of the version of the outstanding balances, replaced whenever an invoice, a payment or a student account is written
+OUTSTANDING_VERSION_KEY = 'outstanding:version'
+
+#Number of families shown per page
+OUTSTANDING_PAGE_SIZE = 50
+
+#Most students whose families are recomputed by one UPDATE, each one binds two SQL variables
+REFRESH_CHUNK_SIZE = 400
+
+#One family: its account, what its open invoices still owe, how many there are and when the lesson of the oldest one takes place
+FamilyOutstanding = namedtuple('FamilyOutstanding', ['family', 'outstanding', 'open_invoices', 'oldest_unpaid'])
+
+def open_invoices():
+    return Invoice.objects.filter(invoice_status__in = PAYABLE_INVOICE_STATUSES, amounts_need_to_pay__gt = 0)
+
+"""
+@return type: Expression
+
+@Description: What the open invoices of the account and of its children still owe, 0 for a child account.
+              Computed with one correlated subquery over the (invoice_status, student_account) index
+"""
+def owed_by_family():
+    members = UserAccount.objects.filter(Q(id = OuterRef(OuterRef('id'))) | Q(parent_of_user = OuterRef(OuterRef('id')))).values('id')
+    owed = open_invoices().filter(student_account__in = members).annotate(total = Func('amounts_need_to_pay', function = 'SUM')).values('total')
+    return Case(
+        When(parent_of_user__isnull = False, then = Value(0)),
+        default = Coalesce(Subquery(owed), Value(0)),
+    )
+
+"""
+@params: student_ids: ids of the students whose invoices or family changed, every account when None
+@return type: int, number of accounts updated
+
+@Description: Recomputes what the families of the students owe with one UPDATE per REFRESH_CHUNK_SIZE students, the accounts of the
+              students and of their parents
+"""
+def refresh_outstanding(student_ids = None):
+    if student_ids is None:
+        return UserAccount.objects.update(outstanding = owed_by_family())
+    student_ids = [student_id for student_id in student_ids if student_id is not None]
+    refreshed = 0
+    for start in range(0, len(student_ids), REFRESH_CHUNK_SIZE):
+        chunk = student_ids[start:start + REFRESH_CHUNK_SIZE]
+        accounts = UserAccount.objects.filter(Q(id__in = chunk) | Q(id__in = UserAccount.objects.filter(id__in = chunk, parent_of_user__isnull = False).values('parent_of_user_id')))
+        refreshed += accounts.update(outstanding = owed_by_family())
+    return refreshed
+
+class OutstandingPage:
+    def __init__(self, number, families, has_next):
+        self.number = number
+        self.families = families
+        self.has_previous = number > 1
+        self.has_next = has_next
+
+    def __iter__(self):
+        return iter(self.families)
+
+    def __len__(self):
+        return len(self.families)
+
+"""
+@params: number: number of the page, starting from 1
+@return type: OutstandingPage
+
+@Description: Reads the page of the families that owe the most, largest outstanding amount first
+"""
+def load_outstanding_page(number):
+    offset = (number - 1) * OUTSTANDING_PAGE_SIZE
+    accounts = list(UserAccount.objects.filter(outstanding__gt = 0).order_by('-outstanding', 'id')
+        .only('id', 'first_name', 'last_name', 'email', 'balance', 'outstanding')[offset:offset + OUTSTANDING_PAGE_SIZE + 1])
+
+    families = accounts[:OUTSTANDING_PAGE_SIZE]
+    family_ids = [family.id for family in families]
+    details = {}
+    if len(families) > 0:
+        members = UserAccount.objects.filter(Q(id__in = family_ids) | Q(parent_of_user__in = family_ids)).values('id')
+        details = {row['family_id']: row for row in open_invoices()
+            .filter(student_account__in = members)
+            .values(family_id = Coalesce('student_account__parent_of_user_id', 'student_account_id'))
+            .annotate(open_invoices = Count('id'), oldest_unpaid = Min('booked_lesson__lesson_date_time'))
+            .order_by()}
+
+    return OutstandingPage(number, [
+        FamilyOutstanding(family, family.outstanding, details.get(family.id, {}).get('open_invoices', 0), details.get(family.id, {}).get('oldest_unpaid'))
+        for family in families
+    ], len(accounts) > OUTSTANDING_PAGE_SIZE)
+
+"""
+@params: number: number of the page, starting from 1
+@return type: OutstandingPage
+
+@Description: Returns the page from the cache, computing and storing it when an invoice, payment or account was written since
+"""
+def outstanding_page(number):
+    if not caching_allowed():
+        return load_outstanding_page(number)
+
+    cache = fragment_cache()
+    key = f'outstanding:page:{number}'
+    cached = cache.get(key)
+    if cached is not None:
+        built_at, page = cached
+        if cache.get_many(list(built_at)) == built_at:
+            return page
+
+    # the versions are read before computing, so a write made meanwhile leaves the stored page out of date
+    built_at = current_versions([GENERATION_KEY, OUTSTANDING_VERSION_KEY])
+    page = load_outstanding_page(number)
+    cache.set(key, (built_at, page), settings.FRAGMENT_CACHE_TIMEOUT)
+    return page
+
+# Invalidates every cached page of the outstanding balances
+def invalidate_outstanding_balances():
+    version_changed(OUTSTANDING_VERSION_KEY)
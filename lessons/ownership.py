@@ -0,0 +1,32 @@
+from .models import Lesson, Invoice
+from .family import family_member_ids
+
+"""
+Ownership checks of the student views.
+A student may touch the lessons and invoices of their own account and of their children. Each check is one EXISTS query
+that looks the row up by its primary key and matches its student against the family subquery of family_member_ids, so it
+costs the same however many lessons or invoices the family has.
+"""
+
+"""
+@params: student: Student UserAccount model object, lesson: Lesson model object or its lesson_id, lesson_status: LessonStatus the
+         lesson must have, any status when None
+@return type: Boolean
+
+@Description: Returns whether the lesson belongs to the student or to one of their children and has the status
+"""
+def student_owns_lesson(student, lesson, lesson_status = None):
+    lesson_id = lesson.lesson_id if isinstance(lesson, Lesson) else lesson
+    lessons = Lesson.objects.filter(lesson_id = lesson_id, student_id__in = family_member_ids(student))
+    if lesson_status is not None:
+        lessons = lessons.filter(lesson_status = lesson_status)
+    return lessons.exists()
+
+"""
+@params: student: Student UserAccount model object, invoice: Invoice model object
+@return type: Boolean
+
+@Description: Returns whether the invoice was issued to the student or to one of their children
+"""
+def student_owns_invoice(student, invoice):
+    return Invoice.objects.filter(id = invoice.id, student_account__in = family_member_ids(student)).exists()
@@ -0,0 +1,51 @@
+"""
+Keyset (cursor) pagination.
+A page is read with WHERE pk > cursor ORDER BY pk LIMIT n, so any page costs the same as the first one,
+unlike OFFSET pagination which reads and throws away every row before the requested page.
+The cursors handed to templates are the primary keys of the first and last rows of the page
+"""
+
+class KeysetPage:
+    def __init__(self, items, has_previous, has_next):
+        self.items = items
+        self.has_previous = has_previous
+        self.has_next = has_next
+
+    @property
+    def previous_cursor(self):
+        return self.items[0].pk if self.has_previous and len(self.items) != 0 else None
+
+    @property
+    def next_cursor(self):
+        return self.items[-1].pk if self.has_next and len(self.items) != 0 else None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+"""
+@params: queryset: QuerySet to paginate, page_size: number of rows per page,
+         after: primary key the page starts after, before: primary key the page ends before
+@return type: KeysetPage
+
+@Description: Returns one page of the queryset in primary key order. Without a cursor the first page is returned,
+              with after the page following that row and with before the page preceding it
+"""
+def keyset_page(queryset, page_size, after = None, before = None):
+    if before is not None:
+        rows = list(queryset.filter(pk__lt = before).order_by('-pk')[:page_size + 1])
+        has_previous = len(rows) > page_size
+        items = rows[:page_size][::-1]
+        return KeysetPage(items, has_previous, queryset.filter(pk__gte = before).exists())
+
+    if after is not None:
+        queryset_after = queryset.filter(pk__gt = after)
+        has_previous = queryset.filter(pk__lte = after).exists()
+    else:
+        queryset_after = queryset
+        has_previous = False
+
+    rows = list(queryset_after.order_by('pk')[:page_size + 1])
+    return KeysetPage(rows[:page_size], has_previous, len(rows) > page_size)
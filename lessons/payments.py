@@ -0,0 +1,112 @@
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+
+from .models import UserAccount, Invoice, InvoiceStatus, Transaction, PAYABLE_INVOICE_STATUSES
+from .ledger import post_payment, post_payments, family_id_of
+from .family import family_member_ids
+from .fragment_cache import bump_student_version
+from .outstanding_balances import refresh_outstanding
+
+"""
+Invoice payments.
+A payment is applied with a single conditional UPDATE of the invoice row: the amount left to pay and the status are computed
+by the database from the values the row has at that moment, and only while the invoice can still be paid. The update, the
+transaction recording the payment and its ledger entry are written in one atomic block, so concurrent payments towards the
+same invoice queue on the row instead of overwriting each other, and a payment is either recorded completely or not at all.
+The update is the first statement of the block, so on SQLite the write lock is taken straight away instead of being upgraded
+from a read lock, which another writer could be holding.
+A batch payment spreads one amount over several open invoices of a family. It starts the same way, with an UPDATE of the family
+account that changes nothing but takes the write lock, so batch payments of a family queue on the account row (and on SQLite on
+the database) before anything is read. Its invoices are then read with select_for_update and the split is worked out in Python,
+then written with one bulk update, one bulk insert of transactions and one ledger posting.
+"""
+
+"""
+@params: payer: Student UserAccount model object paying, invoice: Invoice model object, amount: int, amount paid
+@return type: Transaction model object, None when the invoice could not be paid any more
+
+@Description: Pays the amount towards the invoice. The invoice is paid off when the amount covers what is left to pay, partially
+              paid otherwise, and is refreshed with its new status and amount left to pay. The whole amount is credited to the
+              family of the payer
+"""
+def pay_invoice(payer, invoice, amount):
+    with transaction.atomic():
+        updated = Invoice.objects.filter(id = invoice.id, invoice_status__in = PAYABLE_INVOICE_STATUSES).update(
+            invoice_status = Case(When(amounts_need_to_pay__lte = amount, then = Value(InvoiceStatus.PAID)), default = Value(InvoiceStatus.PARTIALLY_PAID)),
+            amounts_need_to_pay = Case(When(amounts_need_to_pay__lte = amount, then = Value(0)), default = F('amounts_need_to_pay') - amount),
+        )
+        if updated == 0:
+            return None
+
+        invoice.refresh_from_db(fields = ['invoice_status', 'amounts_need_to_pay'])
+        payment = Transaction.objects.create(
+            Student_ID_transaction = payer.id,
+            invoice_reference_transaction = invoice.reference_number,
+            transaction_amount = amount,
+            student_account = payer,
+            invoice = invoice,
+        )
+        post_payment(payment, payer)
+        # the update skips the model signals, so what the family owes is recomputed and the pages showing the invoice are invalidated here
+        invoice_student_id = invoice.student_account_id
+        if invoice_student_id is None and str(invoice.student_ID).isdigit():
+            invoice_student_id = int(invoice.student_ID)
+        if invoice_student_id is not None:
+            refresh_outstanding([invoice_student_id])
+            bump_student_version(invoice_student_id)
+    return payment
+
+"""
+@params: payer: Student UserAccount model object paying, amount: int, amount paid,
+         references: list of the reference numbers of the invoices to pay, every open invoice of the family when None
+@return type: List of Transaction model objects, one per invoice paid towards, empty when there was no open invoice to pay
+
+@Description: Spreads one payment over the open invoices of the family of the payer, oldest invoice first. Each invoice is paid off
+              in turn until the amount runs out, the last one paid towards may be left partially paid. An amount larger than all the
+              invoices owe is recorded in full on the last invoice, as a single payment larger than its invoice is. The family account
+              is written first to take the write lock, then the invoices are read with select_for_update, so they stay locked until
+              the payment commits, and are updated with one bulk update, the transactions are inserted with one bulk insert and the
+              ledger is posted once
+"""
+def pay_invoices(payer, amount, references = None):
+    with transaction.atomic():
+        UserAccount.objects.filter(id = family_id_of(payer)).update(balance = F('balance'))
+        invoices = Invoice.objects.select_for_update().filter(
+            student_account__in = family_member_ids(payer),
+            invoice_status__in = PAYABLE_INVOICE_STATUSES,
+            amounts_need_to_pay__gt = 0,
+        )
+        if references is not None:
+            invoices = invoices.filter(reference_number__in = references)
+
+        paid_invoices = []
+        payments = []
+        remaining = amount
+        for invoice in invoices.order_by('id'):
+            if remaining == 0:
+                break
+            paid = min(remaining, invoice.amounts_need_to_pay)
+            remaining -= paid
+            invoice.amounts_need_to_pay -= paid
+            invoice.invoice_status = InvoiceStatus.PAID if invoice.amounts_need_to_pay == 0 else InvoiceStatus.PARTIALLY_PAID
+            paid_invoices.append(invoice)
+            payments.append(Transaction(
+                Student_ID_transaction = payer.id,
+                invoice_reference_transaction = invoice.reference_number,
+                transaction_amount = paid,
+                student_account = payer,
+                invoice = invoice,
+            ))
+        if len(payments) == 0:
+            return []
+        payments[-1].transaction_amount += remaining
+
+        Invoice.objects.bulk_update(paid_invoices, ['invoice_status', 'amounts_need_to_pay'])
+        Transaction.objects.bulk_create(payments)
+        post_payments(payments, payer)
+        # the bulk operations skip the model signals, so what the family owes is recomputed and the pages showing the payer and
+        # the invoices are invalidated here
+        refresh_outstanding([invoice.student_account_id for invoice in paid_invoices])
+        for student_id in {payer.id} | {invoice.student_account_id for invoice in paid_invoices}:
+            bump_student_version(student_id)
+    return payments
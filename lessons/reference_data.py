@@ -0,0 +1,78 @@
+from collections import namedtuple
+
+from django.conf import settings
+
+from .models import UserAccount, UserRole, Term
+from .fragment_cache import fragment_cache, current_versions, version_changed, caching_allowed
+from .term_calendar import TERMS_VERSION_KEY
+
+"""
+Shared cache of the reference data every student page reads: the admin students are told to contact, the teachers
+they can choose from and whether any term dates were added. They are loaded together with three queries and kept in the
+cache named by FRAGMENT_CACHE, so every worker sharing that cache reuses them, under a version that lessons.signals replaces
+whenever an admin, director or teacher account is written and under the term version the term calendar replaces whenever
+a term is written. The versions and the data are read with one cache read. As with the fragment cache, the data is loaded
+per call instead of cached while a write is uncommitted.
+"""
+
+#Key of the version of the reference data, and the key the data is stored under together with the version it was loaded at
+REFERENCE_VERSION_KEY = 'reference:version'
+REFERENCE_DATA_KEY = 'reference:data'
+
+#The admin to contact (None when there is no admin), the teachers in the order they were created and whether there are terms
+ReferenceData = namedtuple('ReferenceData', ['admin', 'teachers', 'terms_exist'])
+
+#Keys of the versions the reference data is loaded at
+REFERENCE_VERSION_KEYS = [REFERENCE_VERSION_KEY, TERMS_VERSION_KEY]
+
+def load_reference_data():
+    return ReferenceData(
+        UserAccount.objects.filter(role = UserRole.ADMIN).first(),
+        tuple(UserAccount.objects.filter(role = UserRole.TEACHER).order_by('id')),
+        Term.objects.exists(),
+    )
+
+"""
+@return type: ReferenceData
+
+@Description: Returns the reference data from the cache, loading and storing it when an account or a term it depends on changed since
+"""
+def reference_data():
+    if not caching_allowed():
+        return load_reference_data()
+
+    cache = fragment_cache()
+    cached = cache.get_many(REFERENCE_VERSION_KEYS + [REFERENCE_DATA_KEY])
+    if REFERENCE_DATA_KEY in cached:
+        loaded_at, data = cached.pop(REFERENCE_DATA_KEY)
+        if loaded_at == cached:
+            return data
+
+    # the versions are read before loading, so an account or a term written while loading leaves the stored data out of date
+    loaded_at = current_versions(REFERENCE_VERSION_KEYS)
+    data = load_reference_data()
+    cache.set(REFERENCE_DATA_KEY, (loaded_at, data), settings.FRAGMENT_CACHE_TIMEOUT)
+    return data
+
+# Invalidates the cached reference data, called whenever an admin, director or teacher account is written
+def invalidate_reference_data():
+    version_changed(REFERENCE_VERSION_KEY)
+
+# Returns the first ADMIN UserAccount model object, None when there is none
+def admin_contact():
+    return reference_data().admin
+
+# Returns the teacher UserAccount model objects in the order they were created
+def teachers():
+    return reference_data().teachers
+
+# Returns the teacher UserAccount model object with the id, None when there is no such teacher
+def teacher_with_id(teacher_id):
+    for teacher in teachers():
+        if str(teacher.id) == str(teacher_id):
+            return teacher
+    return None
+
+# Returns whether the admin has added any term dates yet
+def terms_exist():
+    return reference_data().terms_exist
@@ -0,0 +1,382 @@
+import datetime
+import random
+
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from faker import Faker
+
+from .models import (UserAccount, UserRole, Gender, Lesson, LessonType, LessonDuration, LessonStatus, Invoice, InvoiceStatus,
+    Transaction, Term, LedgerEntry, LedgerEntryType, InvoiceSequence, end_of_lesson)
+from .term_calendar import term_calendar, UNLABELLED
+from .fragment_cache import invalidate_all_fragments
+from .reference_data import invalidate_reference_data
+from .outstanding_balances import invalidate_outstanding_balances, refresh_outstanding
+
+"""
+Bulk, deterministic seeding of production sized datasets, used by `python3 manage.py seed --scale N --seed S` and the benchmarks.
+The whole dataset is planned in memory from a random.Random(seed) first, then written table by table with executemany in
+batches inside one transaction, with primary keys assigned up front so no row has to be read back. Every seeded account
+shares one password hash computed once (SEED_PASSWORD), and term labels, invoice references, invoice counters and family
+balances are derived from the plan instead of being queried. The same seed always produces the same rows on an empty database
+"""
+
+#Password of every seeded account
+SEED_PASSWORD = 'Password123'
+
+BATCH_SIZE = 5000
+
+#Number of distinct first and last names seeded accounts are named from
+NAME_POOL_SIZE = 500
+
+#Date every seeded account joined and every opening ledger entry was posted, fixed so seeding is repeatable
+SEED_DATE = datetime.datetime(2022, 8, 1, tzinfo = timezone.utc)
+
+#Choices the plan draws from, read once instead of once per row
+GENDERS = Gender.values
+LESSON_TYPES = LessonType.values
+LESSON_DURATIONS = LessonDuration.values
+
+#Term dates shared by every seeding mode
+TERM_DATES = [
+    (1, datetime.date(2022, 9,1), datetime.date(2022, 10,21)),
+    (2, datetime.date(2022, 10,31), datetime.date(2022, 12,16)),
+    (3, datetime.date(2023, 1,3), datetime.date(2023, 2,10)),
+    (4, datetime.date(2023, 2,20), datetime.date(2023, 3,31)),
+    (5, datetime.date(2023, 4,17), datetime.date(2023, 5,26)),
+    (6, datetime.date(2023, 6,5), datetime.date(2023, 7,21)),
+]
+
+#Accounts every seeded database has, to log in with
+FIXED_ACCOUNTS = [
+    ('Petra', 'Pickles', 'petra.pickles@example.org', UserRole.ADMIN, Gender.FEMALE),
+    ('Marty', 'Major', 'marty.major@example.org', UserRole.DIRECTOR, Gender.PNOT),
+    ('John', 'Doe', 'john.doe@example.org', UserRole.STUDENT, Gender.MALE),
+]
+
+# Creates the terms of TERM_DATES that do not exist yet
+def seed_terms():
+    existing = set(Term.objects.values_list('term_number', flat=True))
+    for term_number, start_date, end_date in TERM_DATES:
+        if term_number not in existing:
+            Term.objects.create(term_number = term_number, start_date = start_date, end_date = end_date)
+
+# Returns the first primary key after every existing row of the model
+def next_id(model):
+    return (model.objects.aggregate(highest = Max('pk'))['highest'] or 0) + 1
+
+"""
+@params: model: Model class, columns: attribute names of the values in each row, rows: list of tuples, batch_size: rows per executemany
+@return type: None
+
+@Description: Inserts the rows with executemany, without building model objects. Concrete fields missing from columns take
+              their default, evaluated once, and date fields are converted for the database. Primary keys must be part of the rows,
+              the sequences of the models are reset afterwards with reset_sequences
+"""
+def insert_rows(model, columns, rows, batch_size = BATCH_SIZE):
+    connection = connections[DEFAULT_DB_ALIAS]
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    defaults = [(field.column, field.get_default()) for attname, field in fields.items() if attname not in columns]
+    column_names = [fields[column].column for column in columns] + [column for column, default in defaults]
+    default_values = [default for column, default in defaults]
+
+    converters = []
+    for index, column in enumerate(columns):
+        field = fields[column]
+        if isinstance(field, (models.DateField, models.DateTimeField)):
+            converters.append((index, field))
+
+    quote_name = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote_name(model._meta.db_table),
+        ', '.join(quote_name(column_name) for column_name in column_names),
+        ', '.join(['%s'] * len(column_names)),
+    )
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = []
+            for row in rows[start:start + batch_size]:
+                row = list(row)
+                for index, field in converters:
+                    row[index] = field.get_db_prep_save(row[index], connection)
+                batch.append(row + default_values)
+            cursor.executemany(sql, batch)
+
+# Moves the primary key sequences of the models past the rows inserted with explicit keys
+def reset_sequences(*model_classes):
+    connection = connections[DEFAULT_DB_ALIAS]
+    with connection.cursor() as cursor:
+        for statement in connection.ops.sequence_reset_sql(no_style(), model_classes):
+            cursor.execute(statement)
+
+"""
+Plan of one seeded student: its name, the index of its parent in the plan (None for a parent) and its lessons.
+Each lesson is a tuple of (type, duration, lesson_date_time, request_date, status, teacher index, invoice plan or None),
+an invoice plan being (fees, status, amount left to pay, amount paid)
+"""
+class StudentPlan:
+    def __init__(self, first_name, last_name, email, gender, parent_index):
+        self.first_name = first_name
+        self.last_name = last_name
+        self.email = email
+        self.gender = gender
+        self.parent_index = parent_index
+        self.lessons = []
+        self.balance = 0
+        self.outstanding = 0
+
+class ScaleSeeder:
+    def __init__(self, families, seed = 0, batch_size = BATCH_SIZE):
+        self.families = families
+        self.seed = seed
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+
+        faker = Faker()
+        faker.seed_instance(seed)
+        self.first_names = [faker.first_name() for _ in range(NAME_POOL_SIZE)]
+        self.last_names = [faker.last_name() for _ in range(NAME_POOL_SIZE)]
+
+        self.password = make_password(SEED_PASSWORD, salt = f'msmsseed{seed}')
+        self.teacher_count = max(5, families // 25)
+        self.students = []
+        self.email_number = 0
+
+    def next_email(self, first_name, last_name):
+        self.email_number += 1
+        return f'{first_name.lower()}.{last_name.lower()}.{self.email_number}@example.org'
+
+    def plan_student(self, last_name, parent_index):
+        first_name = self.random.choice(self.first_names)
+        student = StudentPlan(first_name, last_name, self.next_email(first_name, last_name), self.random.choice(GENDERS), parent_index)
+        self.students.append(student)
+        return len(self.students) - 1
+
+    # Plans the lessons of the student, at most one lesson per hour so the lesson unique constraint always holds
+    def plan_lessons(self, student):
+        lesson_times = set()
+        for _ in range(self.random.randint(0, 3)):
+            term_number, start_date, end_date = self.random.choice(TERM_DATES)
+            lesson_date = start_date + datetime.timedelta(days = self.random.randrange((end_date - start_date).days))
+            lesson_date_time = datetime.datetime.combine(lesson_date, datetime.time(self.random.randint(9, 17)), tzinfo = timezone.utc)
+            if lesson_date_time in lesson_times:
+                continue
+            lesson_times.add(lesson_date_time)
+
+            duration = self.random.choice(LESSON_DURATIONS)
+            # booked lessons are three times as likely as pending ones, as in the default seeding
+            status = self.random.choice([LessonStatus.UNFULFILLED, LessonStatus.FULLFILLED, LessonStatus.FULLFILLED, LessonStatus.FULLFILLED])
+            invoice = self.plan_invoice(duration) if status == LessonStatus.FULLFILLED else None
+            request_date = lesson_date - datetime.timedelta(days = self.random.randint(7, 60))
+            student.lessons.append((self.random.choice(LESSON_TYPES), duration, lesson_date_time, request_date, status, self.random.randrange(self.teacher_count), invoice))
+
+    # Plans the invoice of a booked lesson and how much of it was paid, with the same odds as the default seeding
+    def plan_invoice(self, duration):
+        fees = int(Invoice.calculate_fees_amount(duration))
+        probability = self.random.randint(0, 12)
+        if probability == 3 or probability == 4:
+            return (fees, InvoiceStatus.UNPAID, fees, 0)
+        if probability == 5 or probability == 6:
+            amount_paid = self.random.randint(10, fees - 1)
+            return (fees, InvoiceStatus.PARTIALLY_PAID, fees - amount_paid, amount_paid)
+        if probability == 7 and self.random.randint(0, 3) == 2:
+            return (fees, InvoiceStatus.PAID, 0, self.random.randint(fees + 100, fees + 200))
+        return (fees, InvoiceStatus.PAID, 0, fees)
+
+    def plan(self):
+        for _ in range(self.families):
+            parent_index = self.plan_student(self.random.choice(self.last_names), None)
+            last_name = self.students[parent_index].last_name
+            for _ in range(self.random.randint(0, 2)):
+                self.plan_student(last_name, parent_index)
+
+        for student in self.students:
+            self.plan_lessons(student)
+            family = student if student.parent_index is None else self.students[student.parent_index]
+            for lesson in student.lessons:
+                invoice = lesson[6]
+                if invoice is not None:
+                    family.balance += invoice[3] - invoice[0]
+                    family.outstanding += invoice[2]
+
+    def account_row(self, role, first_name, last_name, email, gender, parent_of_user_id = None, balance = 0, outstanding = 0, is_parent = False):
+        account_id = self.next_account_id
+        self.next_account_id += 1
+        # the flags UserAccountManager gives an account of that role
+        return (account_id, self.password, role != UserRole.STUDENT, role == UserRole.DIRECTOR, True, first_name, last_name, email, gender, str(role), SEED_DATE, is_parent, parent_of_user_id, balance, outstanding)
+
+    def create_accounts(self):
+        self.next_account_id = next_id(UserAccount)
+        existing_emails = set(UserAccount.objects.filter(email__in = [account[2] for account in FIXED_ACCOUNTS]).values_list('email', flat=True))
+        rows = [self.account_row(role, first_name, last_name, email, str(gender)) for first_name, last_name, email, role, gender in FIXED_ACCOUNTS if email not in existing_emails]
+
+        self.teacher_ids = []
+        for _ in range(self.teacher_count):
+            first_name = self.random.choice(self.first_names)
+            last_name = self.random.choice(self.last_names)
+            rows.append(self.account_row(UserRole.TEACHER, first_name, last_name, self.next_email(first_name, last_name), self.random.choice(GENDERS)))
+            self.teacher_ids.append(rows[-1][0])
+
+        # parents are given lower ids than their children
+        has_children = {student.parent_index for student in self.students if student.parent_index is not None}
+        self.student_ids = {}
+        for index, student in enumerate(self.students):
+            if student.parent_index is None:
+                rows.append(self.account_row(UserRole.STUDENT, student.first_name, student.last_name, student.email, student.gender, balance = student.balance, outstanding = student.outstanding, is_parent = index in has_children))
+                self.student_ids[index] = rows[-1][0]
+        for index, student in enumerate(self.students):
+            if student.parent_index is not None:
+                rows.append(self.account_row(UserRole.STUDENT, student.first_name, student.last_name, student.email, student.gender, parent_of_user_id = self.student_ids[student.parent_index]))
+                self.student_ids[index] = rows[-1][0]
+
+        insert_rows(UserAccount, ('id', 'password', 'is_staff', 'is_superuser', 'is_active', 'first_name', 'last_name', 'email', 'gender', 'role', 'date_joined', 'is_parent', 'parent_of_user_id', 'balance', 'outstanding'), rows, self.batch_size)
+
+    def create_lessons(self):
+        calendar = term_calendar.snapshot()
+        lesson_id = next_id(Lesson)
+        rows = []
+        self.lesson_ids = []
+        for index, student in enumerate(self.students):
+            for lesson_type, duration, lesson_date_time, request_date, status, teacher_index, invoice in student.lessons:
+                term = calendar.label_for(lesson_date_time.date()) or UNLABELLED
+                rows.append((lesson_id, request_date, lesson_type, duration, lesson_date_time, end_of_lesson(lesson_date_time, duration), self.teacher_ids[teacher_index], self.student_ids[index], str(status), term))
+                self.lesson_ids.append(lesson_id)
+                lesson_id += 1
+        insert_rows(Lesson, ('lesson_id', 'request_date', 'type', 'duration', 'lesson_date_time', 'lesson_end_time', 'teacher_id_id', 'student_id_id', 'lesson_status', 'term'), rows, self.batch_size)
+
+    def create_invoices_and_transactions(self):
+        invoice_id = next_id(Invoice)
+        transaction_id = next_id(Transaction)
+        invoices = []
+        payments = []
+        sequences = []
+        lesson_ids = iter(self.lesson_ids)
+        for index, student in enumerate(self.students):
+            student_id = self.student_ids[index]
+            family_id = student_id if student.parent_index is None else self.student_ids[student.parent_index]
+            invoice_number = 0
+            for lesson in student.lessons:
+                lesson_id = next(lesson_ids)
+                if lesson[6] is None:
+                    continue
+                fees, status, amount_left, amount_paid = lesson[6]
+                reference_number = Invoice.generate_new_invoice_reference_number(str(student_id), invoice_number)
+                invoice_number += 1
+                invoices.append((invoice_id, reference_number, str(student_id), fees, str(status), amount_left, str(lesson_id), student_id, lesson_id))
+                if amount_paid > 0:
+                    payments.append((transaction_id, str(family_id), reference_number, amount_paid, family_id, invoice_id))
+                    transaction_id += 1
+                invoice_id += 1
+            if invoice_number > 0:
+                sequences.append((student_id, invoice_number))
+
+        insert_rows(Invoice, ('id', 'reference_number', 'student_ID', 'fees_amount', 'invoice_status', 'amounts_need_to_pay', 'lesson_ID', 'student_account_id', 'booked_lesson_id'), invoices, self.batch_size)
+        insert_rows(Transaction, ('id', 'Student_ID_transaction', 'invoice_reference_transaction', 'transaction_amount', 'student_account_id', 'invoice_id'), payments, self.batch_size)
+        insert_rows(InvoiceSequence, ('student_id', 'last_number'), sequences, self.batch_size)
+        self.invoice_count = len(invoices)
+        self.transaction_count = len(payments)
+
+    # Opens the ledger of every family with its seeded balance, as the ledger migration does for existing data
+    def open_ledgers(self):
+        entry_id = next_id(LedgerEntry)
+        rows = []
+        for index, student in enumerate(self.students):
+            if student.parent_index is None and student.balance != 0:
+                rows.append((entry_id, self.student_ids[index], self.student_ids[index], str(LedgerEntryType.ADJUSTMENT), student.balance, '', SEED_DATE))
+                entry_id += 1
+        insert_rows(LedgerEntry, ('id', 'family_id', 'student_id', 'entry_type', 'amount', 'invoice_reference', 'created_at'), rows, self.batch_size)
+
+    """
+    @return type: Dictionary of the number of rows seeded per model name
+
+    @Description: Plans and writes the whole dataset in one transaction
+    """
+    def run(self):
+        self.plan()
+        with transaction.atomic():
+            seed_terms()
+            self.create_accounts()
+            self.create_lessons()
+            self.create_invoices_and_transactions()
+            self.open_ledgers()
+            reset_sequences(UserAccount, Lesson, Invoice, Transaction, LedgerEntry)
+            # the rows are inserted without model signals, so the caches depending on them are invalidated here
+            invalidate_all_fragments()
+            invalidate_reference_data()
+            invalidate_outstanding_balances()
+
+        return {
+            'families': self.families,
+            'students': len(self.students),
+            'teachers': self.teacher_count,
+            'lessons': sum(len(student.lessons) for student in self.students),
+            'invoices': self.invoice_count,
+            'transactions': self.transaction_count,
+        }
+
+"""
+@params: queryset: QuerySet of the rows to delete
+@return type: int, number of rows deleted
+
+@Description: Deletes the rows of the queryset with one DELETE statement on its table, selecting them by primary key with the SQL
+              of the queryset as a subquery, or the whole table when the queryset is not filtered. No row is loaded, no delete
+              signal is sent and nothing is cascaded, so the caller deletes the referring rows first and invalidates the caches
+"""
+def delete_rows(queryset):
+    connection = connections[queryset.db]
+    quote_name = connection.ops.quote_name
+    table = quote_name(queryset.model._meta.db_table)
+
+    if not queryset.query.where:
+        sql, params = f'DELETE FROM {table}', ()
+    else:
+        select_sql, params = queryset.values('pk').query.sql_with_params()
+        sql = f'DELETE FROM {table} WHERE {quote_name(queryset.model._meta.pk.column)} IN ({select_sql})'
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+# Seeds a dataset of the given number of families, see ScaleSeeder
+def seed_at_scale(families, seed = 0, batch_size = BATCH_SIZE):
+    return ScaleSeeder(families, seed, batch_size).run()
+
+"""
+@params: protected_email: email of the account that is kept
+@return type: Dictionary of the number of rows removed per model name
+
+@Description: Empties the database the way deleting every account but the protected one, every invoice, transaction and term
+              one by one does, with one DELETE statement per table inside one transaction (see delete_rows). Rows are deleted in
+              dependency order (the rows referring to an account before the account) without loading them or sending delete signals,
+              so the term calendar, the cached fragments, the reference data and the outstanding balances are invalidated once at
+              the end instead of once per row
+"""
+def unseed_all(protected_email):
+    removed_users = UserAccount.objects.exclude(email = protected_email).values('id')
+    deletions = [
+        ('transactions', Transaction.objects.all()),
+        ('invoices', Invoice.objects.all()),
+        ('invoice sequences', InvoiceSequence.objects.filter(student_id__in = removed_users)),
+        ('ledger entries', LedgerEntry.objects.filter(Q(family_id__in = removed_users) | Q(student_id__in = removed_users))),
+        ('lessons', Lesson.objects.filter(Q(student_id__in = removed_users) | Q(teacher_id__in = removed_users))),
+        ('admin log entries', LogEntry.objects.filter(user_id__in = removed_users)),
+        ('group memberships', UserAccount.groups.through.objects.filter(useraccount_id__in = removed_users)),
+        ('user permissions', UserAccount.user_permissions.through.objects.filter(useraccount_id__in = removed_users)),
+        ('accounts', UserAccount.objects.exclude(email = protected_email)),
+        ('terms', Term.objects.all()),
+    ]
+
+    counts = {}
+    with transaction.atomic():
+        for name, queryset in deletions:
+            counts[name] = delete_rows(queryset)
+        refresh_outstanding()
+        term_calendar.term_changed()
+        invalidate_all_fragments()
+        invalidate_reference_data()
+        invalidate_outstanding_balances()
+    return counts
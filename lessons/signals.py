@@ -0,0 +1,101 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Term, UserAccount, UserRole, Lesson, Invoice, Transaction
+from .term_calendar import term_calendar, relabel_lessons
+from .fragment_cache import bump_student_version, invalidate_all_fragments
+from .reference_data import invalidate_reference_data
+from .outstanding_balances import invalidate_outstanding_balances, refresh_outstanding
+
+"""
+Model signal receivers, connected when the lessons app is ready (see LessonsConfig.ready)
+"""
+
+#Parent of an account that was not loaded from the database, so which family it was in is not known
+NOT_LOADED = object()
+
+# Any change to the term dates invalidates the cached term calendar and relabels the existing lessons
+@receiver(post_save, sender=Term)
+@receiver(post_delete, sender=Term)
+def invalidate_term_calendar(sender, **kwargs):
+    term_calendar.term_changed()
+    if not kwargs.get('raw', False):
+        relabel_lessons()
+
+# A new account takes over the invoices and transactions that already referred to its id before it existed,
+# for example rows loaded from a fixture ahead of the accounts. Only rows without a resolved student are looked at
+@receiver(post_save, sender=UserAccount)
+def adopt_student_references(sender, instance, created, **kwargs):
+    if created:
+        if Invoice.objects.filter(student_account__isnull = True, student_ID = str(instance.id)).update(student_account = instance) > 0:
+            refresh_outstanding([instance.id])
+        Transaction.objects.filter(student_account__isnull = True, Student_ID_transaction = str(instance.id)).update(student_account = instance)
+
+# Replaces the fragment version of the student the instance refers to, read from the foreign key column or from the legacy
+# string column when the foreign key is not set, so no account is loaded. Rows loaded from a fixture may refer to accounts
+# that are not loaded yet, so a raw save invalidates every family instead
+def invalidate_student_fragments(student_id, legacy_id = None, raw = False):
+    if raw:
+        invalidate_all_fragments()
+        return
+
+    if student_id is None and legacy_id is not None and str(legacy_id).isdigit():
+        student_id = int(legacy_id)
+    if student_id is not None:
+        bump_student_version(student_id)
+
+# Any change to the lessons, invoices or transactions of a student invalidates the fragments cached for the pages showing them
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_lesson_fragments(sender, instance, **kwargs):
+    invalidate_student_fragments(instance.student_id_id, raw = kwargs.get('raw', False))
+
+# A change to an invoice also changes what its family owes
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def invalidate_invoice_fragments(sender, instance, **kwargs):
+    invalidate_student_fragments(instance.student_account_id, instance.student_ID, kwargs.get('raw', False))
+    refresh_outstanding(None if kwargs.get('raw', False) else [instance.student_account_id])
+    invalidate_outstanding_balances()
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def invalidate_transaction_fragments(sender, instance, **kwargs):
+    invalidate_student_fragments(instance.student_account_id, instance.Student_ID_transaction, kwargs.get('raw', False))
+
+# A change to a student account invalidates the student and its parent, which lists it. Teachers and admins are shown on the pages
+# of every family and make up the reference data, so a change to one of them invalidates every family and the reference data.
+# A student account may move its invoices to another family and is shown on the outstanding balances, so these are invalidated too.
+# Logging in only writes last_login, which no page shows
+@receiver(post_save, sender=UserAccount)
+@receiver(post_delete, sender=UserAccount)
+def invalidate_account_fragments(sender, instance, **kwargs):
+    if kwargs.get('update_fields') == frozenset({'last_login'}):
+        return
+
+    if kwargs.get('raw', False) or instance.role != UserRole.STUDENT:
+        invalidate_all_fragments()
+        invalidate_reference_data()
+        return
+
+    bump_student_version(instance.id)
+    invalidate_outstanding_balances()
+    if instance.parent_of_user_id is not None:
+        bump_student_version(instance.parent_of_user_id)
+
+# What a family owes only changes with its members: a student moved to another family takes what its invoices owe from the family
+# it left (the parent it was loaded with, see UserAccount.from_db) to the family it joined, and a deleted student takes it away.
+# An account saved without being loaded may have moved, so its families are recomputed too. Accounts loaded from a fixture
+# may join families whose invoices are loaded already, so a raw save recomputes every family
+@receiver(post_save, sender=UserAccount)
+@receiver(post_delete, sender=UserAccount)
+def refresh_family_outstanding(sender, instance, **kwargs):
+    if kwargs.get('raw', False):
+        refresh_outstanding()
+    elif 'created' not in kwargs:
+        refresh_outstanding([instance.parent_of_user_id])
+    elif not kwargs['created']:
+        loaded_parent_id = getattr(instance, '_loaded_parent_of_user_id', NOT_LOADED)
+        if loaded_parent_id != instance.parent_of_user_id:
+            refresh_outstanding([instance.id, instance.parent_of_user_id, None if loaded_parent_id is NOT_LOADED else loaded_parent_id])
+    instance._loaded_parent_of_user_id = instance.parent_of_user_id
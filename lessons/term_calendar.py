@@ -0,0 +1,250 @@
+from bisect import bisect_right
+from collections import namedtuple
+from threading import Lock, local
+import datetime
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+"""
+Immutable snapshot of a single Term row, exposes the same attributes templates and views read from Term model objects
+"""
+TermRecord = namedtuple('TermRecord', ['pk', 'term_number', 'start_date', 'end_date'])
+
+ONE_DAY = datetime.timedelta(days=1)
+
+#Label of lessons that do not fall in or near any term, the Lesson.term default
+UNLABELLED = 'N/A'
+
+"""
+@params: term: TermRecord
+@return type: date
+
+@Description: Returns the date after which a lesson in the term is considered close to the end of the term
+              Computed exactly as Lesson.save used to compute it so existing labels do not change
+"""
+def close_to_end_of_term(term):
+    start = term.start_date
+    end = term.end_date
+    mid_term_date = start + (end - start)/2
+    return end-(end - mid_term_date)/6
+
+"""
+@params: terms: list of TermRecord in primary key order
+@return type: tuple of (list of dates, list of labels)
+
+@Description: Flattens the per term label rules into disjoint date segments. Each term contributes up to two half open windows:
+              [start, close_to_end] labelled 'Term : n' and either [close_to_end, next_start) labelled 'Term : n+1(Close to next term)'
+              or [close_to_end, end) labelled 'Term : n(Close to next term but no next term)'.
+              Where windows overlap the window of the earlier term (and the first window of a term) wins, matching the old loop that broke on the first match.
+              Segment i covers [bounds[i], bounds[i+1]) and is labelled labels[i], None when no window covers it
+"""
+def build_segments(terms):
+    by_number = {}
+    for term in terms:
+        by_number.setdefault(term.term_number, term)
+
+    windows = []
+    for priority, term in enumerate(terms):
+        if term.start_date is None or term.end_date is None:
+            continue
+
+        close_end = close_to_end_of_term(term)
+        next_term = by_number.get(term.term_number + 1)
+
+        windows.append((term.start_date, close_end + ONE_DAY, (priority, 0), f'Term : {term.term_number}'))
+
+        if next_term is not None:
+            windows.append((close_end, next_term.start_date, (priority, 1), f'Term : {term.term_number + 1}(Close to next term)'))
+        else:
+            windows.append((close_end, term.end_date, (priority, 1), f'Term : {term.term_number}(Close to next term but no next term)'))
+
+    windows = [window for window in windows if window[0] < window[1]]
+
+    bounds = sorted({window[0] for window in windows} | {window[1] for window in windows})
+    labels = []
+    for segment_start in bounds[:-1]:
+        covering = [window for window in windows if window[0] <= segment_start < window[1]]
+        labels.append(min(covering, key=lambda window: window[2])[3] if covering else None)
+
+    return bounds, labels
+
+"""
+Sorted, read only view of every Term row, built from a single query
+"""
+class TermCalendarSnapshot:
+    def __init__(self, terms):
+        self.terms = tuple(terms)
+        self.by_number = {}
+        for term in self.terms:
+            self.by_number.setdefault(term.term_number, term)
+        self.ordered = tuple(sorted(self.terms, key=lambda term: term.term_number))
+        self.bounds, self.labels = build_segments(self.terms)
+
+    def label_for(self, date):
+        index = bisect_right(self.bounds, date) - 1
+        if 0 <= index < len(self.labels):
+            return self.labels[index]
+        return None
+
+    """
+    @return type: list of (date or None, date or None, String)
+
+    @Description: Returns the label windows covering the whole timeline, adjacent segments with the same label are merged.
+                  Dates outside every term window are labelled 'N/A', None bounds are open ended
+    """
+    def windows(self):
+        if len(self.bounds) == 0:
+            return [(None, None, UNLABELLED)]
+
+        windows = [(None, self.bounds[0], UNLABELLED)]
+        for index, label in enumerate(self.labels):
+            windows.append((self.bounds[index], self.bounds[index + 1], label or UNLABELLED))
+        windows.append((self.bounds[-1], None, UNLABELLED))
+
+        merged = [windows[0]]
+        for start, end, label in windows[1:]:
+            if merged[-1][2] == label:
+                merged[-1] = (merged[-1][0], end, label)
+            else:
+                merged.append((start, end, label))
+        return merged
+
+"""
+Cache of the term calendar.
+The snapshot is loaded once with one query and kept by each process together with the term version it was loaded at. The version
+lives in the cache named by FRAGMENT_CACHE, shared by every worker, and is replaced whenever a Term row is saved or deleted (see
+lessons.signals), so a worker reuses its snapshot only while no worker wrote to the terms since. Checking it costs one cache read,
+so it is checked at most once every TERM_CALENDAR_CHECK_SECONDS: a term written by another worker shows up within that delay,
+one written by the worker itself drops its snapshot at once.
+While a Term write is still uncommitted inside an atomic block the calendar is rebuilt per call instead of cached by the thread
+that wrote, so a rolled back write can never leave a stale snapshot behind. The version is replaced again once the write commits.
+Writes that skip model signals (queryset update/delete, bulk_create, raw SQL) must call invalidate() themselves
+"""
+
+#Key of the version of the term calendar in the shared cache
+TERMS_VERSION_KEY = 'terms:version'
+
+class TermCalendar:
+    def __init__(self):
+        self._lock = Lock()
+        self._snapshot = None
+        self._state = local()
+
+    def _forget(self):
+        with self._lock:
+            self._snapshot = None
+
+    # Drops the snapshot of every worker, now and again once the surrounding transaction commits
+    def invalidate(self):
+        from .fragment_cache import version_changed
+        self._forget()
+        version_changed(TERMS_VERSION_KEY)
+        if connection.in_atomic_block:
+            transaction.on_commit(self._forget)
+
+    def term_changed(self):
+        if connection.in_atomic_block:
+            self._state.uncommitted_writes = True
+        self.invalidate()
+
+    def _load(self):
+        from .models import Term
+        rows = Term.objects.order_by('pk').values_list('pk', 'term_number', 'start_date', 'end_date')
+        return TermCalendarSnapshot(TermRecord(*row) for row in rows)
+
+    def snapshot(self):
+        from .fragment_cache import current_versions
+
+        if getattr(self._state, 'uncommitted_writes', False):
+            if connection.in_atomic_block:
+                return self._load()
+            self._state.uncommitted_writes = False
+
+        cached = self._snapshot
+        now = time.monotonic()
+        if cached is not None and now - cached[2] < settings.TERM_CALENDAR_CHECK_SECONDS:
+            return cached[1]
+
+        # the version is read before loading, so a term written while loading leaves the kept snapshot out of date
+        version = current_versions([TERMS_VERSION_KEY])[TERMS_VERSION_KEY]
+        if cached is not None and cached[0] == version:
+            with self._lock:
+                if self._snapshot is cached:
+                    self._snapshot = (version, cached[1], now)
+            return cached[1]
+
+        snapshot = self._load()
+        with self._lock:
+            self._snapshot = (version, snapshot, now)
+        return snapshot
+
+    """
+    @params: date: date of the lesson
+    @return type: String or None
+
+    @Description: Returns the term label for the lesson date, None when the date does not fall in or near any term
+    """
+    def label_for(self, date):
+        return self.snapshot().label_for(date)
+
+    def count(self):
+        return len(self.snapshot().terms)
+
+    def exists(self):
+        return self.count() != 0
+
+    def get(self, term_number):
+        return self.snapshot().by_number.get(int(term_number))
+
+    def all(self):
+        return self.snapshot().ordered
+
+    """
+    @return type: tuple of (date, date) or None
+
+    @Description: Returns the start date of the lowest numbered term and the end date of the highest numbered term
+    """
+    def bookable_range(self):
+        ordered = self.snapshot().ordered
+        if len(ordered) == 0:
+            return None
+        return ordered[0].start_date, ordered[-1].end_date
+
+
+term_calendar = TermCalendar()
+
+"""
+@params: date: date
+@return type: aware datetime
+
+@Description: Returns midnight UTC of the date, lesson dates are taken in UTC so this is where a lesson date starts
+"""
+def start_of_day(date):
+    return datetime.datetime.combine(date, datetime.time.min, tzinfo=timezone.utc)
+
+"""
+@params: snapshot: TermCalendarSnapshot to label against, defaults to the current term calendar
+@return type: int, number of lessons whose term label changed
+
+@Description: Recomputes Lesson.term for every lesson with one set based UPDATE per label window instead of saving lessons one by one.
+              Only rows whose label actually changes are written. Lessons outside every term window are labelled 'N/A'
+"""
+def relabel_lessons(snapshot=None):
+    from .models import Lesson
+
+    if snapshot is None:
+        snapshot = term_calendar.snapshot()
+
+    updated = 0
+    with transaction.atomic():
+        for start, end, label in snapshot.windows():
+            lessons = Lesson.objects.all()
+            if start is not None:
+                lessons = lessons.filter(lesson_date_time__gte = start_of_day(start))
+            if end is not None:
+                lessons = lessons.filter(lesson_date_time__lt = start_of_day(end))
+            updated += lessons.exclude(term = label).update(term = label)
+    return updated
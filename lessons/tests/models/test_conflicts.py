@@ -0,0 +1,195 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from lessons.conflicts import find_conflicts, find_queue_conflicts, pending_lessons, QUEUE_CHUNK_SIZE
+from lessons.models import UserAccount, Gender, Lesson, LessonType, LessonDuration, LessonStatus, LONGEST_LESSON
+import datetime
+
+class LessonConflictsTestCase(TestCase):
+    """Unit tests for the double booking detection of lessons/conflicts.py"""
+
+    def setUp(self):
+        self.teacher = UserAccount.objects.create_teacher(
+            first_name = 'Barbare',
+            last_name = 'Dutch',
+            email = 'barbdutch@example.org',
+            password = 'Password123',
+            gender = Gender.FEMALE,
+        )
+        self.other_teacher = UserAccount.objects.create_teacher(
+            first_name = 'Amane',
+            last_name = 'Hill',
+            email = 'amanehill@example.org',
+            password = 'Password123',
+            gender = Gender.FEMALE,
+        )
+        self.student = UserAccount.objects.create_student(
+            first_name = 'John',
+            last_name = 'Doe',
+            email = 'johndoe@example.org',
+            password = 'Password123',
+            gender = Gender.MALE,
+        )
+        self.other_student = UserAccount.objects.create_student(
+            first_name = 'Jane',
+            last_name = 'Doe',
+            email = 'janedoe@example.org',
+            password = 'Password123',
+            gender = Gender.FEMALE,
+        )
+
+        self.booked_lesson = self.create_lesson(self.teacher, self.student, 10, 0, LessonDuration.HOUR, LessonStatus.FULLFILLED)
+
+    def at(self, hour, minute):
+        return datetime.datetime(2022, 11, 21, hour, minute, tzinfo = timezone.utc)
+
+    def create_lesson(self, teacher, student, hour, minute, duration, status):
+        return Lesson.objects.create(
+            type = LessonType.INSTRUMENT,
+            duration = duration,
+            lesson_date_time = self.at(hour, minute),
+            teacher_id = teacher,
+            student_id = student,
+            lesson_status = status,
+        )
+
+    def test_end_time_is_stored_on_save(self):
+        self.assertEqual(self.booked_lesson.lesson_end_time, self.at(11, 0))
+
+        self.booked_lesson.duration = LessonDuration.THIRTY
+        self.booked_lesson.lesson_date_time = self.at(14, 15)
+        self.booked_lesson.save()
+        self.booked_lesson.refresh_from_db()
+        self.assertEqual(self.booked_lesson.lesson_end_time, self.at(14, 45))
+
+    def test_end_time_is_stored_on_bulk_create(self):
+        lesson = Lesson(
+            type = LessonType.THEORY,
+            duration = LessonDuration.FOURTY_FIVE,
+            lesson_date_time = self.at(16, 0),
+            teacher_id = self.teacher,
+            student_id = self.student,
+        )
+        Lesson.objects.bulk_create([lesson])
+        self.assertEqual(Lesson.objects.get(lesson_date_time = self.at(16, 0)).lesson_end_time, self.at(16, 45))
+
+    def test_overlapping_lesson_of_the_teacher_is_a_conflict(self):
+        conflicts = find_conflicts(self.teacher.id, self.other_student.id, self.at(10, 30), LessonDuration.THIRTY)
+        self.assertEqual(conflicts, [self.booked_lesson])
+
+    def test_overlapping_lesson_of_the_student_is_a_conflict(self):
+        conflicts = find_conflicts(self.other_teacher.id, self.student.id, self.at(9, 30), LessonDuration.HOUR)
+        self.assertEqual(conflicts, [self.booked_lesson])
+
+    def test_lesson_containing_another_is_a_conflict(self):
+        short_lesson = self.create_lesson(self.other_teacher, self.other_student, 12, 15, LessonDuration.THIRTY, LessonStatus.UNFULFILLED)
+        conflicts = find_conflicts(self.other_teacher.id, self.student.id, self.at(12, 0), LessonDuration.HOUR)
+        self.assertEqual(conflicts, [short_lesson])
+
+    def test_back_to_back_lessons_do_not_conflict(self):
+        self.assertEqual(find_conflicts(self.teacher.id, self.student.id, self.at(11, 0), LessonDuration.HOUR), [])
+        self.assertEqual(find_conflicts(self.teacher.id, self.student.id, self.at(9, 30), LessonDuration.THIRTY), [])
+
+    def test_lessons_of_other_teachers_and_students_do_not_conflict(self):
+        self.assertEqual(find_conflicts(self.other_teacher.id, self.other_student.id, self.at(10, 0), LessonDuration.HOUR), [])
+
+    def test_saved_lessons_do_not_conflict(self):
+        self.booked_lesson.lesson_status = LessonStatus.SAVED
+        self.booked_lesson.save()
+        self.assertEqual(find_conflicts(self.teacher.id, self.student.id, self.at(10, 0), LessonDuration.HOUR), [])
+
+    def test_pending_lessons_conflict(self):
+        self.booked_lesson.lesson_status = LessonStatus.UNFULFILLED
+        self.booked_lesson.save()
+        self.assertEqual(find_conflicts(self.teacher.id, self.student.id, self.at(10, 0), LessonDuration.HOUR), [self.booked_lesson])
+
+    def test_edited_lesson_does_not_conflict_with_itself(self):
+        conflicts = find_conflicts(self.teacher.id, self.student.id, self.at(10, 15), LessonDuration.HOUR, exclude_lesson_id = self.booked_lesson.lesson_id)
+        self.assertEqual(conflicts, [])
+
+    def test_conflicts_are_found_with_one_query(self):
+        self.create_lesson(self.other_teacher, self.student, 11, 0, LessonDuration.THIRTY, LessonStatus.UNFULFILLED)
+        with self.assertNumQueries(1):
+            conflicts = find_conflicts(self.teacher.id, self.student.id, self.at(10, 45), LessonDuration.THIRTY)
+        self.assertEqual(len(conflicts), 2)
+
+    def test_conflicts_query_ranges_over_the_start_of_the_lessons(self):
+        with CaptureQueriesContext(connection) as queries:
+            find_conflicts(self.teacher.id, self.student.id, self.at(10, 45), LessonDuration.THIRTY)
+        sql = queries.captured_queries[0]['sql']
+        self.assertIn('"lessons_lesson"."lesson_date_time" >', sql)
+        self.assertIn('"lessons_lesson"."lesson_date_time" <', sql)
+
+    def test_pending_queue_conflicts(self):
+        teacher_clash = self.create_lesson(self.teacher, self.other_student, 10, 30, LessonDuration.THIRTY, LessonStatus.UNFULFILLED)
+        student_clash = self.create_lesson(self.other_teacher, self.student, 10, 45, LessonDuration.HOUR, LessonStatus.UNFULFILLED)
+        self.create_lesson(self.teacher, self.other_student, 11, 0, LessonDuration.THIRTY, LessonStatus.UNFULFILLED)
+        self.create_lesson(self.other_teacher, self.other_student, 13, 0, LessonDuration.HOUR, LessonStatus.SAVED)
+
+        queue = list(pending_lessons())
+        with CaptureQueriesContext(connection) as queries:
+            queue_conflicts = find_queue_conflicts(queue)
+        # the booked and pending lessons around each lesson of the queue
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertIn('"lessons_lesson"."lesson_date_time" >', queries.captured_queries[0]['sql'])
+        self.assertIn('"lessons_lesson"."lesson_date_time" <', queries.captured_queries[0]['sql'])
+
+        self.assertEqual([queue_conflict.lesson for queue_conflict in queue_conflicts], [teacher_clash, student_clash])
+        self.assertEqual(queue_conflicts[0].conflicts, [self.booked_lesson])
+        self.assertEqual(queue_conflicts[1].conflicts, [self.booked_lesson])
+
+    def test_pending_lessons_overlapping_each_other_are_both_reported(self):
+        first = self.create_lesson(self.other_teacher, self.other_student, 14, 0, LessonDuration.HOUR, LessonStatus.UNFULFILLED)
+        second = self.create_lesson(self.other_teacher, self.other_student, 14, 30, LessonDuration.THIRTY, LessonStatus.UNFULFILLED)
+
+        queue_conflicts = find_queue_conflicts(pending_lessons())
+
+        self.assertEqual([(queue_conflict.lesson, queue_conflict.conflicts) for queue_conflict in queue_conflicts], [(first, [second]), (second, [first])])
+
+    def test_only_the_windows_of_the_queue_are_read(self):
+        pending = self.create_lesson(self.teacher, self.other_student, 10, 30, LessonDuration.THIRTY, LessonStatus.UNFULFILLED)
+        later = self.create_lesson(self.teacher, self.student, 16, 0, LessonDuration.THIRTY, LessonStatus.FULLFILLED)
+
+        with CaptureQueriesContext(connection) as queries:
+            queue_conflicts = find_queue_conflicts([pending])
+        self.assertEqual([queue_conflict.lesson for queue_conflict in queue_conflicts], [pending])
+        self.assertEqual(queue_conflicts[0].conflicts, [self.booked_lesson])
+
+        sql = queries.captured_queries[0]['sql']
+        self.assertIn(f"> '{(pending.lesson_date_time - LONGEST_LESSON).strftime('%Y-%m-%d %H:%M:%S')}'", sql)
+        self.assertIn(f"< '{pending.lesson_end_time.strftime('%Y-%m-%d %H:%M:%S')}'", sql)
+        self.assertNotIn(later.lesson_end_time.strftime('%Y-%m-%d %H:%M:%S'), sql)
+
+    def test_large_queues_are_looked_up_in_chunks(self):
+        queue = [
+            Lesson.objects.create(
+                type = LessonType.INSTRUMENT,
+                duration = LessonDuration.THIRTY,
+                lesson_date_time = self.at(8, 0) + datetime.timedelta(days = day),
+                teacher_id = self.other_teacher,
+                student_id = self.other_student,
+                lesson_status = LessonStatus.SAVED,
+            )
+            for day in range(QUEUE_CHUNK_SIZE + 1)
+        ]
+        with self.assertNumQueries(2):
+            queue_conflicts = find_queue_conflicts(queue)
+        self.assertEqual(queue_conflicts, [])
+
+    def test_empty_pending_queue_has_no_conflicts(self):
+        self.assertEqual(find_queue_conflicts(pending_lessons()), [])
+        self.assertEqual(find_queue_conflicts([]), [])
+
+    def test_given_queue_is_validated_against_booked_and_pending_lessons(self):
+        saved = self.create_lesson(self.teacher, self.other_student, 10, 15, LessonDuration.THIRTY, LessonStatus.SAVED)
+        free = self.create_lesson(self.other_teacher, self.other_student, 15, 0, LessonDuration.THIRTY, LessonStatus.SAVED)
+        pending = self.create_lesson(self.other_teacher, self.student, 15, 15, LessonDuration.THIRTY, LessonStatus.UNFULFILLED)
+
+        with self.assertNumQueries(1):
+            queue_conflicts = find_queue_conflicts([saved, free])
+
+        self.assertEqual(queue_conflicts[0].lesson, saved)
+        self.assertEqual(queue_conflicts[0].conflicts, [self.booked_lesson])
+        self.assertEqual(queue_conflicts[1].lesson, free)
+        self.assertEqual(queue_conflicts[1].conflicts, [pending])
@@ -0,0 +1,83 @@
+from django.test import TestCase
+from django.urls import reverse
+from lessons.models import UserAccount, Lesson, Gender, LessonType, LessonDuration, LessonStatus
+from lessons.family import root_of, children_of, family_of, family_ids_of
+from lessons.helper import get_student_and_child_objects
+from django.utils import timezone
+import datetime
+
+class FamilyGraphTestCase(TestCase):
+    """Tests of the family graph of student accounts"""
+
+    def setUp(self):
+        self.admin = UserAccount.objects.create_admin(
+            first_name='Petra',
+            last_name='Pickles',
+            email= 'petra.pickles@example.org',
+            password='Password123',
+            gender = Gender.FEMALE,
+        )
+        self.teacher = UserAccount.objects.create_teacher(
+            first_name='Bob',
+            last_name='Jacobs',
+            email='bobby@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+        self.parent = UserAccount.objects.create_student(
+            first_name='John',
+            last_name='Doe',
+            email='johndoe@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+        self.child = self.create_child('acedoe@example.org')
+
+    def create_child(self, email):
+        return UserAccount.objects.create_child_student(
+            first_name = 'Ace',
+            last_name = 'Doe',
+            email = email,
+            password = 'Password123',
+            gender = Gender.MALE,
+            parent_of_user = self.parent,
+        )
+
+    def create_lesson(self, student):
+        return Lesson.objects.create(
+            type = LessonType.INSTRUMENT,
+            duration = LessonDuration.THIRTY,
+            lesson_date_time = datetime.datetime(2022, 11, 20, 10, 0, 0, tzinfo=timezone.utc),
+            teacher_id = self.teacher,
+            student_id = student,
+            lesson_status = LessonStatus.UNFULFILLED,
+        )
+
+    def test_root_of_child_is_parent(self):
+        self.assertEqual(root_of(self.child), self.parent)
+        self.assertEqual(root_of(self.parent), self.parent)
+
+    def test_family_of_child_and_parent_is_the_same(self):
+        second_child = self.create_child('tomdoe@example.org')
+        self.assertEqual(family_of(self.parent), [self.parent, self.child, second_child])
+        self.assertEqual(family_ids_of(self.child), [self.parent.id, self.child.id, second_child.id])
+
+    def test_children_are_memoized(self):
+        self.assertEqual(children_of(self.parent), [self.child])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_student_and_child_objects(self.parent), [self.parent, self.child])
+
+    def test_new_child_is_seen_by_parent(self):
+        self.assertEqual(len(children_of(self.parent)), 1)
+        second_child = self.create_child('tomdoe@example.org')
+        self.assertEqual(children_of(self.parent), [self.child, second_child])
+
+    def test_student_without_children(self):
+        self.assertEqual(children_of(self.child), [])
+        self.assertEqual(family_of(self.teacher), [self.teacher])
+
+    def test_confirming_child_lesson_redirects_to_parent(self):
+        lesson = self.create_lesson(self.child)
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.get(reverse('admin_confirm_booking', kwargs={'lesson_id': lesson.lesson_id}))
+        self.assertRedirects(response, reverse('student_requests', kwargs={'student_id': self.parent.id}), status_code=302, target_status_code=200)
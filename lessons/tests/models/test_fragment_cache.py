@@ -0,0 +1,249 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from lessons.models import UserAccount, Lesson, LessonType, LessonDuration, LessonStatus, Invoice, Transaction
+from lessons.fragment_cache import fragment_cache, family_fragment, bump_student_version, invalidate_all_fragments
+from lessons.ledger import post_invoice
+from msms.test_runner import TEST_KEY_PREFIX
+import datetime
+import tempfile
+import os
+
+class FragmentCacheTestCase(TestCase):
+    """Tests of the fragment cache inside a transaction, where uncommitted writes must never be cached"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json']
+
+    def setUp(self):
+        fragment_cache().clear()
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return self.builds
+
+    def test_fragments_are_kept_in_a_cache_shared_by_the_workers(self):
+        self.assertNotIsInstance(fragment_cache(), LocMemCache)
+
+    def test_tests_keep_their_fragments_apart_from_the_site(self):
+        self.assertEqual(fragment_cache().key_prefix, TEST_KEY_PREFIX)
+        self.assertTrue(os.path.basename(fragment_cache()._dir).startswith('msms-fragments-'))
+        self.assertEqual(fragment_cache()._max_entries, settings.FRAGMENT_CACHE_MAX_ENTRIES)
+
+    def test_fragments_are_rebuilt_while_a_write_is_uncommitted(self):
+        bump_student_version(self.student.id)
+        self.assertEqual(family_fragment(self.student, 'test', self.build), 1)
+        self.assertEqual(family_fragment(self.student, 'test', self.build), 2)
+
+
+class FragmentCachingTestCase(TransactionTestCase):
+    """Tests that the student feed and balance pages are served from the fragment cache and invalidated by writes to the family"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json']
+
+    def setUp(self):
+        fragment_cache().clear()
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.child = UserAccount.objects.get(email='bobbylee@example.org')
+        self.other_student = UserAccount.objects.get(email='janedoe@example.org')
+        self.teacher = UserAccount.objects.get(email='barbdutch@example.org')
+        self.builds = 0
+
+    def tearDown(self):
+        fragment_cache().clear()
+
+    def build(self):
+        self.builds += 1
+        return self.builds
+
+    def create_lesson(self, student, status):
+        return Lesson.objects.create(
+            type = LessonType.INSTRUMENT,
+            duration = LessonDuration.HOUR,
+            lesson_date_time = datetime.datetime(2022, 11, 20, 15, 0, tzinfo = timezone.utc),
+            teacher_id = self.teacher,
+            student_id = student,
+            request_date = datetime.date(2022, 10, 15),
+            lesson_status = status,
+        )
+
+    def create_invoice(self, student, reference_number):
+        invoice = Invoice.objects.create(reference_number = reference_number, student_ID = str(student.id), fees_amount = 20, amounts_need_to_pay = 20, lesson_ID = '1')
+        post_invoice(invoice, student)
+        return invoice
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_fragment_is_built_once_per_version(self):
+        self.assertEqual(family_fragment(self.student, 'test', self.build), 1)
+        self.assertEqual(family_fragment(self.student, 'test', self.build), 1)
+        self.assertEqual(family_fragment(self.child, 'test', self.build), 2)
+
+        bump_student_version(self.student.id)
+        self.assertEqual(family_fragment(self.student, 'test', self.build), 3)
+        self.assertEqual(family_fragment(self.child, 'test', self.build), 2)
+
+    def test_a_change_to_a_child_invalidates_its_parent(self):
+        family_fragment(self.student, 'test', self.build)
+        family_fragment(self.child, 'test', self.build)
+        bump_student_version(self.child.id)
+        self.assertEqual(family_fragment(self.student, 'test', self.build), 3)
+        self.assertEqual(family_fragment(self.child, 'test', self.build), 4)
+
+    def test_a_new_child_invalidates_its_parent(self):
+        family_fragment(self.student, 'test', self.build)
+        UserAccount.objects.create_child_student(
+            first_name = 'New',
+            last_name = 'Child',
+            email = 'new.child@example.org',
+            password = 'Password123',
+            parent_of_user = self.student,
+        )
+        self.assertEqual(family_fragment(self.student, 'test', self.build), 2)
+
+    def test_a_hit_makes_no_queries(self):
+        family_fragment(self.student, 'test', self.build)
+        student = UserAccount.objects.get(id = self.student.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(family_fragment(student, 'test', self.build), 1)
+
+    def test_families_are_invalidated_independently(self):
+        family_fragment(self.student, 'test', self.build)
+        family_fragment(self.other_student, 'test', self.build)
+        bump_student_version(self.other_student.id)
+        self.assertEqual(family_fragment(self.student, 'test', self.build), 1)
+        self.assertEqual(family_fragment(self.other_student, 'test', self.build), 3)
+
+        invalidate_all_fragments()
+        self.assertEqual(family_fragment(self.student, 'test', self.build), 4)
+
+    def test_rolled_back_write_is_never_cached(self):
+        family_fragment(self.student, 'test', self.build)
+        with transaction.atomic():
+            self.create_lesson(self.child, LessonStatus.FULLFILLED)
+            self.assertEqual(family_fragment(self.student, 'test', self.build), 2)
+            self.assertEqual(family_fragment(self.student, 'test', self.build), 3)
+            transaction.set_rollback(True)
+        self.assertEqual(family_fragment(self.student, 'test', self.build), 4)
+        self.assertEqual(family_fragment(self.student, 'test', self.build), 4)
+
+    def test_repeat_student_feed_is_served_from_the_cache(self):
+        self.create_lesson(self.child, LessonStatus.FULLFILLED)
+        self.client.login(email=self.student.email, password='Password123')
+        first_count, first_response = self.count_queries(reverse('student_feed'))
+        second_count, second_response = self.count_queries(reverse('student_feed'))
+
+        self.assertLess(second_count, first_count)
+        self.assertEqual(second_response.context['fullfilled_lessons'], first_response.context['fullfilled_lessons'])
+        self.assertEqual(len(second_response.context['fullfilled_lessons']), 1)
+
+    def test_student_feed_shows_lessons_written_after_it_was_cached(self):
+        self.client.login(email=self.student.email, password='Password123')
+        self.client.get(reverse('student_feed'))
+
+        lesson = self.create_lesson(self.child, LessonStatus.UNFULFILLED)
+        response = self.client.get(reverse('student_feed'))
+        self.assertEqual(len(response.context['unfulfilled_requests']), 1)
+
+        lesson.lesson_status = LessonStatus.FULLFILLED
+        lesson.save()
+        response = self.client.get(reverse('student_feed'))
+        self.assertEqual(len(response.context['unfulfilled_requests']), 0)
+        self.assertEqual(len(response.context['fullfilled_lessons']), 1)
+
+        lesson.delete()
+        response = self.client.get(reverse('student_feed'))
+        self.assertEqual(len(response.context['fullfilled_lessons']), 0)
+
+    def test_student_feed_shows_lessons_requested_with_one_update(self):
+        self.create_lesson(self.child, LessonStatus.SAVED)
+        self.client.login(email=self.student.email, password='Password123')
+        self.client.get(reverse('student_feed'))
+        self.client.post(reverse('save_lessons'))
+
+        response = self.client.get(reverse('student_feed'))
+        self.assertEqual(len(response.context['unfulfilled_requests']), 1)
+
+    def test_student_feed_shows_renamed_teachers(self):
+        self.create_lesson(self.student, LessonStatus.FULLFILLED)
+        self.client.login(email=self.student.email, password='Password123')
+        self.client.get(reverse('student_feed'))
+
+        self.teacher.last_name = 'Renamed'
+        self.teacher.save()
+        response = self.client.get(reverse('student_feed'))
+        self.assertTrue(response.context['fullfilled_lessons'][0].teacher.endswith('Renamed'))
+
+    def test_logging_in_keeps_the_cached_fragments(self):
+        family_fragment(self.student, 'test', self.build)
+        self.client.login(email=self.student.email, password='Password123')
+        self.assertEqual(family_fragment(self.student, 'test', self.build), 1)
+
+    def test_repeat_balance_is_served_from_the_cache(self):
+        self.create_invoice(self.child, f'{self.child.id}-001')
+        self.client.login(email=self.student.email, password='Password123')
+        first_count, first_response = self.count_queries(reverse('balance'))
+        second_count, second_response = self.count_queries(reverse('balance'))
+
+        self.assertLess(second_count, first_count)
+        self.assertEqual(second_response.context['child_invoices'], first_response.context['child_invoices'])
+        self.assertEqual(list(second_response.context['Balance']), [-20])
+
+    def test_balance_shows_invoices_and_payments_written_after_it_was_cached(self):
+        self.client.login(email=self.student.email, password='Password123')
+        self.client.get(reverse('balance'))
+
+        invoice = self.create_invoice(self.child, f'{self.child.id}-001')
+        response = self.client.get(reverse('balance'))
+        self.assertEqual(len(response.context['child_invoices']), 1)
+        self.assertEqual(list(response.context['Balance']), [-20])
+
+        self.client.post(reverse('pay_for_invoice'), {'invocie_reference': invoice.reference_number, 'amounts_pay': 20})
+        response = self.client.get(reverse('balance'))
+        self.assertEqual(list(response.context['Balance']), [0])
+        self.assertEqual(len(response.context['Transaction']), Transaction.objects.filter(student_account = self.student).count())
+        self.assertEqual(len(response.context['Transaction']), 1)
+
+
+#Caches of the file based tests, the fragments go through files the way they would between several workers
+FILE_BASED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'fragments': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': os.path.join(tempfile.gettempdir(), 'msms-test-fragments')},
+}
+
+@override_settings(CACHES = FILE_BASED_CACHES, FRAGMENT_CACHE = 'fragments')
+class FileBasedFragmentCachingTestCase(TransactionTestCase):
+    """Tests the fragment cache on a file based cache, as shared by several workers"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json']
+
+    def setUp(self):
+        caches['fragments'].clear()
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.builds = 0
+
+    def tearDown(self):
+        caches['fragments'].clear()
+
+    def build(self):
+        self.builds += 1
+        return self.builds
+
+    def test_fragments_are_shared_through_the_files(self):
+        self.assertEqual(family_fragment(self.student, 'test', self.build), 1)
+        self.assertEqual(family_fragment(self.student, 'test', self.build), 1)
+        self.assertGreater(len(caches['fragments']._list_cache_files()), 0)
+
+        self.student.first_name = 'Johnny'
+        self.student.save()
+        self.assertEqual(family_fragment(self.student, 'test', self.build), 2)
@@ -0,0 +1,109 @@
+from django.test import TestCase
+from django.apps import apps
+from lessons.models import UserAccount, Lesson, Gender, LessonType, LessonDuration, LessonStatus, Invoice, InvoiceStatus, Transaction
+from lessons.views import update_invoice_when_delete
+from django.utils import timezone
+import datetime
+import importlib
+
+backfill = importlib.import_module('lessons.migrations.0005_backfill_invoice_transaction_foreign_keys')
+
+class InvoiceForeignKeysTestCase(TestCase):
+    """Tests of the foreign keys resolved from the string references of invoices and transactions"""
+
+    def setUp(self):
+        self.teacher = UserAccount.objects.create_teacher(
+            first_name='Bob',
+            last_name='Jacobs',
+            email='bobby@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+        self.student = UserAccount.objects.create_student(
+            first_name='John',
+            last_name='Doe',
+            email='johndoe@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+        self.lesson = Lesson.objects.create(
+            type = LessonType.INSTRUMENT,
+            duration = LessonDuration.THIRTY,
+            lesson_date_time = datetime.datetime(2022, 11, 20, 10, 0, 0, tzinfo=timezone.utc),
+            teacher_id = self.teacher,
+            student_id = self.student,
+            lesson_status = LessonStatus.FULLFILLED,
+        )
+        self.invoice = Invoice.objects.create(
+            reference_number = f'{self.student.id}-001',
+            student_ID = str(self.student.id),
+            fees_amount = 15,
+            invoice_status = InvoiceStatus.UNPAID,
+            amounts_need_to_pay = 15,
+            lesson_ID = str(self.lesson.lesson_id),
+        )
+        self.transaction = Transaction.objects.create(
+            Student_ID_transaction = str(self.student.id),
+            invoice_reference_transaction = self.invoice.reference_number,
+            transaction_amount = 10,
+        )
+
+    def test_foreign_keys_are_resolved_on_save(self):
+        self.assertEqual(self.invoice.student_account, self.student)
+        self.assertEqual(self.invoice.booked_lesson, self.lesson)
+        self.assertEqual(self.transaction.student_account, self.student)
+        self.assertEqual(self.transaction.invoice, self.invoice)
+
+    def test_unknown_references_are_left_empty(self):
+        invoice = Invoice.objects.create(reference_number = '999-001', student_ID = '999', fees_amount = 15, lesson_ID = '')
+        self.assertEqual(invoice.student_account, None)
+        self.assertEqual(invoice.booked_lesson, None)
+
+    def test_changing_student_id_moves_foreign_key(self):
+        other_student = UserAccount.objects.create_student(
+            first_name='Jane',
+            last_name='Doe',
+            email='janedoe@example.org',
+            password='Password123',
+            gender = Gender.FEMALE,
+        )
+        self.invoice.student_ID = str(other_student.id)
+        self.invoice.save()
+        self.assertEqual(Invoice.objects.get(id = self.invoice.id).student_account, other_student)
+
+    def test_resaving_unchanged_invoice_makes_no_lookups(self):
+        self.invoice.amounts_need_to_pay = 5
+        # the UPDATE of the invoice and the UPDATE of what its family owes
+        with self.assertNumQueries(2):
+            self.invoice.save()
+
+    def test_account_adopts_references_made_before_it_existed(self):
+        invoice = Invoice.objects.create(reference_number = '50-001', student_ID = '50', fees_amount = 15)
+        student = UserAccount.objects.create_student(
+            id = 50,
+            first_name='Jane',
+            last_name='Doe',
+            email='janedoe@example.org',
+            password='Password123',
+            gender = Gender.FEMALE,
+        )
+        self.assertEqual(Invoice.objects.get(id = invoice.id).student_account, student)
+
+    def test_deleted_lesson_invoice_is_found_through_foreign_key(self):
+        update_invoice_when_delete(self.lesson)
+        invoice = Invoice.objects.get(id = self.invoice.id)
+        self.assertEqual(invoice.invoice_status, InvoiceStatus.DELETED)
+        self.assertEqual(invoice.booked_lesson, None)
+
+    def test_backfill_migration_fills_foreign_keys(self):
+        Invoice.objects.update(student_account = None, booked_lesson = None)
+        Transaction.objects.update(student_account = None, invoice = None)
+        backfill.backfill_invoices(apps, None)
+        backfill.backfill_transactions(apps, None)
+
+        invoice = Invoice.objects.get(id = self.invoice.id)
+        transaction = Transaction.objects.get(id = self.transaction.id)
+        self.assertEqual(invoice.student_account, self.student)
+        self.assertEqual(invoice.booked_lesson, self.lesson)
+        self.assertEqual(transaction.student_account, self.student)
+        self.assertEqual(transaction.invoice, invoice)
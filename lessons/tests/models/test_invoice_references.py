@@ -0,0 +1,77 @@
+from django.test import TestCase
+from lessons.models import UserAccount, Lesson, Gender, LessonType, LessonDuration, LessonStatus, Invoice, InvoiceStatus, InvoiceSequence
+from lessons.invoice_references import allocate_invoice_reference, allocate_invoice_references
+from lessons.views import create_new_invoice
+from django.utils import timezone
+import datetime
+
+class InvoiceReferencesTestCase(TestCase):
+    """Tests of the invoice reference allocator"""
+
+    def setUp(self):
+        self.teacher = UserAccount.objects.create_teacher(
+            first_name='Bob',
+            last_name='Jacobs',
+            email='bobby@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+        self.student = UserAccount.objects.create_student(
+            first_name='John',
+            last_name='Doe',
+            email='johndoe@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+
+    def create_invoice(self, reference_number):
+        return Invoice.objects.create(
+            reference_number = reference_number,
+            student_ID = str(self.student.id),
+            fees_amount = 15,
+            invoice_status = InvoiceStatus.UNPAID,
+            amounts_need_to_pay = 15,
+        )
+
+    def create_lesson(self, day):
+        return Lesson.objects.create(
+            type = LessonType.INSTRUMENT,
+            duration = LessonDuration.THIRTY,
+            lesson_date_time = datetime.datetime(2022, 11, day, 10, 0, 0, tzinfo=timezone.utc),
+            teacher_id = self.teacher,
+            student_id = self.student,
+            lesson_status = LessonStatus.FULLFILLED,
+        )
+
+    def test_references_are_consecutive(self):
+        student_id = str(self.student.id)
+        self.assertEqual(allocate_invoice_reference(self.student.id), student_id + '-001')
+        self.assertEqual(allocate_invoice_reference(self.student.id), student_id + '-002')
+        self.assertEqual(InvoiceSequence.objects.get(student = self.student).last_number, 2)
+
+    def test_bulk_allocation_reserves_a_block(self):
+        student_id = str(self.student.id)
+        references = allocate_invoice_references(self.student.id, 3)
+        self.assertEqual(references, [student_id + '-001', student_id + '-002', student_id + '-003'])
+        self.assertEqual(allocate_invoice_reference(self.student.id), student_id + '-004')
+        self.assertEqual(allocate_invoice_references(self.student.id, 0), [])
+
+    def test_counter_starts_after_existing_invoices(self):
+        student_id = str(self.student.id)
+        self.create_invoice(student_id + '-001')
+        self.create_invoice(student_id + '-007')
+        self.assertEqual(allocate_invoice_reference(self.student.id), student_id + '-008')
+
+    def test_allocation_does_not_count_invoices(self):
+        allocate_invoice_reference(self.student.id)
+        for number in range(2, 30):
+            self.create_invoice(f'{self.student.id}-9{number:02d}')
+        # one UPDATE of the counter and one read of it inside a savepoint, whatever the number of invoices
+        with self.assertNumQueries(4):
+            allocate_invoice_reference(self.student.id)
+
+    def test_create_new_invoice_uses_counter(self):
+        create_new_invoice(self.student.id, self.create_lesson(20))
+        create_new_invoice(self.student.id, self.create_lesson(21))
+        references = list(Invoice.objects.filter(student_ID = str(self.student.id)).order_by('id').values_list('reference_number', flat=True))
+        self.assertEqual(references, [f'{self.student.id}-001', f'{self.student.id}-002'])
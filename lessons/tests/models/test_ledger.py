@@ -0,0 +1,134 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from lessons.models import UserAccount, Lesson, Gender, LessonType, LessonDuration, LessonStatus, Invoice, InvoiceStatus, Transaction, LedgerEntry, LedgerEntryType
+from lessons.ledger import family_id_of, post_payment, post_invoices, reconcile_family_balance, compute_family_balance
+from lessons.views import create_new_invoice, update_invoice, update_invoice_when_delete
+from django.utils import timezone
+import datetime
+
+class LedgerTestCase(TestCase):
+    """Tests of the balance ledger"""
+
+    def setUp(self):
+        self.teacher = UserAccount.objects.create_teacher(
+            first_name='Bob',
+            last_name='Jacobs',
+            email='bobby@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+        self.parent = UserAccount.objects.create_student(
+            first_name='John',
+            last_name='Doe',
+            email='johndoe@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+        self.child = UserAccount.objects.create_child_student(
+            first_name = 'Ace',
+            last_name = 'Doe',
+            email = 'acedoe@example.org',
+            password = 'Password123',
+            gender = Gender.MALE,
+            parent_of_user = self.parent,
+        )
+        self.child_lesson = Lesson.objects.create(
+            type = LessonType.INSTRUMENT,
+            duration = LessonDuration.THIRTY,
+            lesson_date_time = datetime.datetime(2022, 11, 20, 10, 0, 0, tzinfo=timezone.utc),
+            teacher_id = self.teacher,
+            student_id = self.child,
+            lesson_status = LessonStatus.FULLFILLED,
+        )
+
+    def balance_of(self, user):
+        return UserAccount.objects.get(id = user.id).balance
+
+    def ledger_total(self, user):
+        return sum(LedgerEntry.objects.filter(family = user).values_list('amount', flat=True))
+
+    def test_family_of_child_is_parent(self):
+        self.assertEqual(family_id_of(self.child), self.parent.id)
+        self.assertEqual(family_id_of(str(self.child.id)), self.parent.id)
+        self.assertEqual(family_id_of(self.parent), self.parent.id)
+
+    def test_invoice_for_child_is_charged_to_parent(self):
+        create_new_invoice(self.child.id, self.child_lesson)
+        self.assertEqual(self.balance_of(self.parent), -15)
+        self.assertEqual(self.balance_of(self.child), 0)
+        entry = LedgerEntry.objects.get(family = self.parent)
+        self.assertEqual(entry.entry_type, LedgerEntryType.INVOICE)
+        self.assertEqual(entry.student, self.child)
+
+    def test_invoice_changes_are_posted_as_adjustments(self):
+        create_new_invoice(self.child.id, self.child_lesson)
+        self.child_lesson.duration = LessonDuration.HOUR
+        self.child_lesson.save()
+        update_invoice(self.child_lesson)
+        self.assertEqual(self.balance_of(self.parent), -20)
+
+        update_invoice_when_delete(self.child_lesson)
+        self.assertEqual(self.balance_of(self.parent), 0)
+        self.assertEqual(LedgerEntry.objects.filter(family = self.parent, entry_type = LedgerEntryType.ADJUSTMENT).count(), 2)
+        self.assertEqual(self.ledger_total(self.parent), 0)
+
+    def test_payment_is_credited_to_family(self):
+        create_new_invoice(self.child.id, self.child_lesson)
+        payment = Transaction.objects.create(Student_ID_transaction = str(self.parent.id), invoice_reference_transaction = f'{self.child.id}-001', transaction_amount = 10)
+        post_payment(payment, self.parent)
+        self.assertEqual(self.balance_of(self.parent), -5)
+        self.assertEqual(self.ledger_total(self.parent), -5)
+
+    def test_reconcile_posts_the_difference(self):
+        Invoice.objects.create(reference_number = f'{self.child.id}-001', student_ID = str(self.child.id), fees_amount = 40, amounts_need_to_pay = 40, lesson_ID = str(self.child_lesson.lesson_id), invoice_status = InvoiceStatus.UNPAID)
+        Transaction.objects.create(Student_ID_transaction = str(self.parent.id), invoice_reference_transaction = f'{self.child.id}-001', transaction_amount = 15)
+        self.assertEqual(reconcile_family_balance(self.parent), -25)
+        self.assertEqual(self.balance_of(self.parent), -25)
+        self.assertEqual(self.ledger_total(self.parent), -25)
+        reconcile_family_balance(self.parent)
+        self.assertEqual(LedgerEntry.objects.filter(family = self.parent).count(), 1)
+
+    def test_reconcile_counts_payments_recorded_on_a_child(self):
+        create_new_invoice(self.child.id, self.child_lesson)
+        payment = Transaction.objects.create(Student_ID_transaction = str(self.child.id), invoice_reference_transaction = f'{self.child.id}-001', transaction_amount = 10, student_account = self.child)
+        post_payment(payment, self.child)
+        self.assertEqual(self.balance_of(self.parent), -5)
+        self.assertEqual(compute_family_balance(self.parent), -5)
+        self.assertEqual(reconcile_family_balance(self.parent), -5)
+        self.assertFalse(LedgerEntry.objects.filter(family = self.parent, entry_type = LedgerEntryType.ADJUSTMENT).exists())
+        self.assertEqual(self.ledger_total(self.parent), -5)
+
+    def test_balance_page_does_not_write(self):
+        create_new_invoice(self.child.id, self.child_lesson)
+        self.client.login(email = self.parent.email, password = 'Password123')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('balance'))
+        self.assertEqual(response.status_code, 200)
+        writes = [query['sql'] for query in queries.captured_queries if query['sql'].startswith(('UPDATE "lessons_useraccount"', 'INSERT'))]
+        self.assertEqual(writes, [])
+        self.assertContains(response, 'Your balance: £-15')
+
+    def test_pay_for_invoice_posts_payment(self):
+        create_new_invoice(self.child.id, self.child_lesson)
+        self.client.login(email = self.parent.email, password = 'Password123')
+        self.client.post(reverse('pay_for_invoice'), {'invocie_reference': f'{self.child.id}-001', 'amounts_pay': 15})
+        self.assertEqual(self.balance_of(self.parent), 0)
+        self.assertEqual(LedgerEntry.objects.filter(family = self.parent, entry_type = LedgerEntryType.PAYMENT).count(), 1)
+
+    def test_post_invoices_moves_each_family_balance_once(self):
+        invoices = [
+            Invoice.objects.create(reference_number = f'{student.id}-00{number}', student_ID = str(student.id), fees_amount = fees, amounts_need_to_pay = fees, lesson_ID = '', student_account = student)
+            for number, (student, fees) in enumerate([(self.parent, 20), (self.child, 15), (self.child, 18)], start = 1)
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            fees_by_family = post_invoices(invoices)
+
+        self.assertEqual(fees_by_family, {self.parent.id: 53})
+        self.assertEqual(self.balance_of(self.parent), -53)
+        self.assertEqual(self.ledger_total(self.parent), -53)
+        self.assertEqual(LedgerEntry.objects.filter(family = self.parent, entry_type = LedgerEntryType.INVOICE).count(), 3)
+        balance_updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE "lessons_useraccount"')]
+        self.assertEqual(len(balance_updates), 1)
@@ -0,0 +1,68 @@
+from django.test import TestCase
+from django.utils import timezone
+from lessons.models import UserAccount, Lesson, LessonType, LessonDuration, LessonStatus, Invoice
+from lessons.ownership import student_owns_lesson, student_owns_invoice
+import datetime
+
+class OwnershipTestCase(TestCase):
+    """Tests of the checks deciding whether a student may touch a lesson or an invoice"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json']
+
+    def setUp(self):
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.child = UserAccount.objects.get(email='bobbylee@example.org')
+        self.other_student = UserAccount.objects.get(email='janedoe@example.org')
+        self.teacher = UserAccount.objects.get(email='barbdutch@example.org')
+
+    def create_lesson(self, student, status, day = 20):
+        return Lesson.objects.create(
+            type = LessonType.INSTRUMENT,
+            duration = LessonDuration.HOUR,
+            lesson_date_time = datetime.datetime(2022, 11, day, 15, 0, tzinfo = timezone.utc),
+            teacher_id = self.teacher,
+            student_id = student,
+            lesson_status = status,
+        )
+
+    def create_invoice(self, student, reference_number):
+        return Invoice.objects.create(reference_number = reference_number, student_ID = str(student.id), fees_amount = 20, amounts_need_to_pay = 20, lesson_ID = '1')
+
+    def test_student_owns_their_lessons_and_those_of_their_children(self):
+        own_lesson = self.create_lesson(self.student, LessonStatus.UNFULFILLED)
+        child_lesson = self.create_lesson(self.child, LessonStatus.SAVED)
+        self.assertTrue(student_owns_lesson(self.student, own_lesson))
+        self.assertTrue(student_owns_lesson(self.student, child_lesson))
+        self.assertTrue(student_owns_lesson(self.student, child_lesson.lesson_id, LessonStatus.SAVED))
+        self.assertTrue(student_owns_lesson(self.child, child_lesson))
+
+    def test_child_does_not_own_the_lessons_of_its_parent(self):
+        own_lesson = self.create_lesson(self.student, LessonStatus.UNFULFILLED)
+        self.assertFalse(student_owns_lesson(self.child, own_lesson))
+
+    def test_student_does_not_own_the_lessons_of_another_family(self):
+        other_lesson = self.create_lesson(self.other_student, LessonStatus.UNFULFILLED)
+        self.assertFalse(student_owns_lesson(self.student, other_lesson))
+        self.assertFalse(student_owns_lesson(self.student, other_lesson, LessonStatus.UNFULFILLED))
+
+    def test_lesson_with_another_status_is_not_owned(self):
+        saved_lesson = self.create_lesson(self.child, LessonStatus.SAVED)
+        self.assertFalse(student_owns_lesson(self.student, saved_lesson, LessonStatus.UNFULFILLED))
+        self.assertFalse(student_owns_lesson(self.student, saved_lesson, LessonStatus.FULLFILLED))
+
+    def test_lesson_check_is_one_query_however_many_lessons_the_family_has(self):
+        for day in range(1, 21):
+            self.create_lesson(self.child, LessonStatus.UNFULFILLED, day)
+        lesson = self.create_lesson(self.child, LessonStatus.UNFULFILLED, 21)
+        with self.assertNumQueries(1):
+            self.assertTrue(student_owns_lesson(self.student, lesson, LessonStatus.UNFULFILLED))
+
+    def test_student_owns_their_invoices_and_those_of_their_children(self):
+        own_invoice = self.create_invoice(self.student, f'{self.student.id}-001')
+        child_invoice = self.create_invoice(self.child, f'{self.child.id}-001')
+        other_invoice = self.create_invoice(self.other_student, f'{self.other_student.id}-001')
+        with self.assertNumQueries(1):
+            self.assertTrue(student_owns_invoice(self.student, own_invoice))
+        self.assertTrue(student_owns_invoice(self.student, child_invoice))
+        self.assertFalse(student_owns_invoice(self.student, other_invoice))
+        self.assertFalse(student_owns_invoice(self.child, own_invoice))
@@ -0,0 +1,249 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from lessons.models import UserAccount, Invoice, InvoiceStatus, Transaction, LedgerEntry, LedgerEntryType
+from lessons.ledger import post_invoice, compute_family_balance
+from lessons.payments import pay_invoice, pay_invoices
+import threading
+
+class PayInvoiceTestCase(TestCase):
+    """Tests of paying an invoice with a conditional update"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json']
+
+    def setUp(self):
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.child = UserAccount.objects.get(email='bobbylee@example.org')
+        self.invoice = Invoice.objects.create(reference_number = f'{self.child.id}-001', student_ID = str(self.child.id), fees_amount = 50, amounts_need_to_pay = 50, lesson_ID = '1')
+        post_invoice(self.invoice, self.child)
+
+    def balance_of(self, user):
+        return UserAccount.objects.get(id = user.id).balance
+
+    def test_partial_payment(self):
+        payment = pay_invoice(self.student, self.invoice, 20)
+        self.assertEqual(payment.transaction_amount, 20)
+        self.assertEqual(payment.invoice, self.invoice)
+        self.assertEqual(self.invoice.invoice_status, InvoiceStatus.PARTIALLY_PAID)
+        self.assertEqual(self.invoice.amounts_need_to_pay, 30)
+        self.assertEqual(Invoice.objects.get(id = self.invoice.id).amounts_need_to_pay, 30)
+        self.assertEqual(self.balance_of(self.student), -30)
+
+    def test_payments_paying_off_the_invoice(self):
+        pay_invoice(self.student, self.invoice, 20)
+        pay_invoice(self.student, self.invoice, 40)
+        invoice = Invoice.objects.get(id = self.invoice.id)
+        self.assertEqual(invoice.invoice_status, InvoiceStatus.PAID)
+        self.assertEqual(invoice.amounts_need_to_pay, 0)
+        self.assertEqual(self.balance_of(self.student), 10)
+        self.assertEqual(LedgerEntry.objects.filter(family = self.student, entry_type = LedgerEntryType.PAYMENT).count(), 2)
+
+    def test_paid_invoice_is_not_paid_again(self):
+        pay_invoice(self.student, self.invoice, 50)
+        stale_invoice = Invoice.objects.get(id = self.invoice.id)
+        stale_invoice.invoice_status = InvoiceStatus.UNPAID
+        self.assertIsNone(pay_invoice(self.student, stale_invoice, 10))
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(self.balance_of(self.student), 0)
+
+    def test_deleted_invoice_is_not_paid(self):
+        Invoice.objects.filter(id = self.invoice.id).update(invoice_status = InvoiceStatus.DELETED)
+        self.assertIsNone(pay_invoice(self.student, self.invoice, 10))
+        self.assertEqual(Transaction.objects.count(), 0)
+
+    def test_failed_payment_leaves_the_invoice_unchanged(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                pay_invoice(self.student, self.invoice, 20)
+                raise ValueError
+        invoice = Invoice.objects.get(id = self.invoice.id)
+        self.assertEqual(invoice.invoice_status, InvoiceStatus.UNPAID)
+        self.assertEqual(invoice.amounts_need_to_pay, 50)
+        self.assertEqual(Transaction.objects.count(), 0)
+        self.assertEqual(self.balance_of(self.student), -50)
+
+    def test_payment_makes_the_same_queries_however_much_is_paid(self):
+        with self.assertNumQueries(10):
+            pay_invoice(self.student, self.invoice, 20)
+        with self.assertNumQueries(10):
+            pay_invoice(self.student, self.invoice, 30)
+
+
+class PayInvoicesTestCase(TestCase):
+    """Tests of spreading one payment over several invoices of a family"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json']
+
+    def setUp(self):
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.child = UserAccount.objects.get(email='bobbylee@example.org')
+        self.other_student = UserAccount.objects.get(email='janedoe@example.org')
+        self.invoices = [
+            self.create_invoice(self.student, 1, 20),
+            self.create_invoice(self.child, 1, 15),
+            self.create_invoice(self.student, 2, 30),
+        ]
+        self.other_invoice = self.create_invoice(self.other_student, 1, 40)
+
+    def create_invoice(self, student, number, fees_amount):
+        invoice = Invoice.objects.create(reference_number = f'{student.id}-00{number}', student_ID = str(student.id), fees_amount = fees_amount, amounts_need_to_pay = fees_amount, lesson_ID = '1')
+        post_invoice(invoice, student)
+        return invoice
+
+    def remaining(self):
+        return [(invoice.invoice_status, invoice.amounts_need_to_pay) for invoice in Invoice.objects.filter(id__in = [invoice.id for invoice in self.invoices]).order_by('id')]
+
+    def test_oldest_invoices_are_paid_first(self):
+        payments = pay_invoices(self.student, 40)
+        self.assertEqual([(payment.invoice_reference_transaction, payment.transaction_amount) for payment in payments],
+            [(self.invoices[0].reference_number, 20), (self.invoices[1].reference_number, 15), (self.invoices[2].reference_number, 5)])
+        self.assertEqual(self.remaining(), [(InvoiceStatus.PAID, 0), (InvoiceStatus.PAID, 0), (InvoiceStatus.PARTIALLY_PAID, 25)])
+        self.assertEqual(Transaction.objects.filter(student_account = self.student).count(), 3)
+        self.assertEqual(UserAccount.objects.get(id = self.student.id).balance, -25)
+        self.assertEqual(compute_family_balance(self.student), -25)
+        self.assertEqual(Invoice.objects.get(id = self.other_invoice.id).amounts_need_to_pay, 40)
+
+    def test_selected_invoices_are_paid(self):
+        payments = pay_invoices(self.student, 40, [self.invoices[2].reference_number, self.invoices[1].reference_number, self.other_invoice.reference_number])
+        self.assertEqual([payment.transaction_amount for payment in payments], [15, 25])
+        self.assertEqual(self.remaining(), [(InvoiceStatus.UNPAID, 20), (InvoiceStatus.PAID, 0), (InvoiceStatus.PARTIALLY_PAID, 5)])
+        self.assertEqual(Invoice.objects.get(id = self.other_invoice.id).amounts_need_to_pay, 40)
+
+    def test_amount_larger_than_the_invoices_is_recorded_on_the_last_invoice(self):
+        payments = pay_invoices(self.student, 100)
+        self.assertEqual([payment.transaction_amount for payment in payments], [20, 15, 65])
+        self.assertEqual(self.remaining(), [(InvoiceStatus.PAID, 0)] * 3)
+        self.assertEqual(UserAccount.objects.get(id = self.student.id).balance, 35)
+
+    def test_paid_and_deleted_invoices_are_skipped(self):
+        pay_invoice(self.student, self.invoices[0], 20)
+        Invoice.objects.filter(id = self.invoices[1].id).update(invoice_status = InvoiceStatus.DELETED)
+        payments = pay_invoices(self.student, 10)
+        self.assertEqual([payment.invoice for payment in payments], [self.invoices[2]])
+        self.assertEqual(pay_invoices(self.other_student, 10, [self.invoices[2].reference_number]), [])
+
+    def test_ledger_is_posted_once(self):
+        pay_invoices(self.student, 40)
+        entries = LedgerEntry.objects.filter(family = self.student, entry_type = LedgerEntryType.PAYMENT)
+        self.assertEqual(sorted(entry.amount for entry in entries), [5, 15, 20])
+
+    def test_queries_do_not_grow_with_the_number_of_invoices(self):
+        for number in range(3, 9):
+            self.create_invoice(self.child, number, 10)
+        with self.assertNumQueries(11):
+            payments = pay_invoices(self.student, 1000)
+        self.assertEqual(len(payments), 9)
+
+
+class ConcurrentPaymentTestCase(TransactionTestCase):
+    """Stress test firing payments at one invoice from several threads at once"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json']
+
+    THREADS = 8
+    PAYMENTS_PER_THREAD = 10
+
+    def setUp(self):
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.child = UserAccount.objects.get(email='bobbylee@example.org')
+
+    def create_invoice(self, fees_amount):
+        invoice = Invoice.objects.create(reference_number = f'{self.child.id}-001', student_ID = str(self.child.id), fees_amount = fees_amount, amounts_need_to_pay = fees_amount, lesson_ID = '1')
+        post_invoice(invoice, self.child)
+        return invoice
+
+    # Every thread waits for the others and then pays its payments of amount one after the other, on its own connection
+    def pay_concurrently(self, invoice, amount):
+        start = threading.Barrier(self.THREADS)
+
+        def pay():
+            try:
+                start.wait()
+                return [pay_invoice(self.student, Invoice.objects.get(id = invoice.id), amount) for _ in range(self.PAYMENTS_PER_THREAD)]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers = self.THREADS) as executor:
+            results = [future.result() for future in [executor.submit(pay) for _ in range(self.THREADS)]]
+        return [payment for payments in results for payment in payments]
+
+    def test_concurrent_partial_payments_add_up(self):
+        payments_count = self.THREADS * self.PAYMENTS_PER_THREAD
+        invoice = self.create_invoice(payments_count * 5 + 3)
+        payments = self.pay_concurrently(invoice, 5)
+
+        self.assertNotIn(None, payments)
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.invoice_status, InvoiceStatus.PARTIALLY_PAID)
+        self.assertEqual(invoice.amounts_need_to_pay, 3)
+        self.assertEqual(Transaction.objects.filter(invoice = invoice).count(), payments_count)
+        self.assertEqual(UserAccount.objects.get(id = self.student.id).balance, -3)
+        self.assertEqual(compute_family_balance(self.student), -3)
+
+    def test_concurrent_payments_never_overpay_the_invoice(self):
+        invoice = self.create_invoice(100)
+        payments = self.pay_concurrently(invoice, 7)
+
+        recorded = [payment for payment in payments if payment is not None]
+        self.assertEqual(len(recorded), 15)
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.invoice_status, InvoiceStatus.PAID)
+        self.assertEqual(invoice.amounts_need_to_pay, 0)
+        self.assertEqual(Transaction.objects.filter(invoice = invoice).aggregate(total = Sum('transaction_amount'))['total'], 105)
+        self.assertEqual(UserAccount.objects.get(id = self.student.id).balance, 5)
+        self.assertEqual(compute_family_balance(self.student), 5)
+
+
+class ConcurrentBatchPaymentTestCase(TransactionTestCase):
+    """Stress test firing batch payments at the invoices of one family from several threads at once"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json']
+
+    THREADS = 8
+    PAYMENTS_PER_THREAD = 5
+
+    def setUp(self):
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.child = UserAccount.objects.get(email='bobbylee@example.org')
+        self.invoices = []
+        for number, student in enumerate([self.student, self.child, self.child, self.student], start = 1):
+            invoice = Invoice.objects.create(reference_number = f'{student.id}-{number:03}', student_ID = str(student.id), fees_amount = 50, amounts_need_to_pay = 50,
+                lesson_ID = str(number), student_account = student)
+            post_invoice(invoice, student)
+            self.invoices.append(invoice)
+
+    # Every thread waits for the others and then pays its batch payments of amount one after the other, on its own connection
+    def pay_concurrently(self, payer, amount):
+        start = threading.Barrier(self.THREADS)
+
+        def pay():
+            try:
+                start.wait()
+                return [pay_invoices(payer, amount) for _ in range(self.PAYMENTS_PER_THREAD)]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers = self.THREADS) as executor:
+            results = [future.result() for future in [executor.submit(pay) for _ in range(self.THREADS)]]
+        return [payments for thread_payments in results for payments in thread_payments]
+
+    def test_concurrent_batch_payments_add_up(self):
+        batches = self.pay_concurrently(self.student, 3)
+
+        self.assertEqual(len(batches), self.THREADS * self.PAYMENTS_PER_THREAD)
+        self.assertEqual(Transaction.objects.aggregate(total = Sum('transaction_amount'))['total'], 120)
+        self.assertEqual(sorted(Invoice.objects.values_list('amounts_need_to_pay', flat = True)), [0, 0, 30, 50])
+        self.assertEqual(UserAccount.objects.get(id = self.student.id).balance, -80)
+        self.assertEqual(UserAccount.objects.get(id = self.student.id).outstanding, 80)
+        self.assertEqual(compute_family_balance(self.student), -80)
+
+    def test_concurrent_batch_payments_never_overpay_the_invoices(self):
+        batches = self.pay_concurrently(self.student, 7)
+
+        paid = [payments for payments in batches if len(payments) > 0]
+        self.assertEqual(sum(payment.transaction_amount for payments in paid for payment in payments), 203)
+        self.assertEqual(len(paid), 29)
+        self.assertEqual(set(Invoice.objects.values_list('invoice_status', flat = True)), {InvoiceStatus.PAID})
+        self.assertEqual(UserAccount.objects.get(id = self.student.id).balance, 3)
+        self.assertEqual(compute_family_balance(self.student), 3)
@@ -0,0 +1,91 @@
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from lessons.models import UserAccount, UserRole, Gender, Term
+from lessons.forms import RequestForm, TeacherChoiceField
+from lessons.reference_data import reference_data, admin_contact, teachers, terms_exist
+from lessons.term_calendar import term_calendar
+from lessons.fragment_cache import fragment_cache
+import datetime
+
+#Fragments of the SQL of the reference lookups, none of them may run on a student page once the caches are warm
+REFERENCE_QUERIES = (f'"role" = \'{UserRole.ADMIN.value}\'', f'"role" = \'{UserRole.TEACHER.value}\'', '"lessons_term"')
+
+class ReferenceDataTestCase(TransactionTestCase):
+    """Tests that the admin contact, the teacher choices and the term dates are cached and invalidated by writes"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json']
+
+    def setUp(self):
+        fragment_cache().clear()
+        term_calendar.invalidate()
+        Term.objects.create(term_number = 1, start_date = datetime.date(2022, 9, 1), end_date = datetime.date(2022, 10, 21))
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.admin = UserAccount.objects.get(email='bobby@example.org')
+
+    def tearDown(self):
+        fragment_cache().clear()
+        term_calendar.invalidate()
+
+    def reference_queries(self, function):
+        with CaptureQueriesContext(connection) as queries:
+            function()
+        return [query['sql'] for query in queries if any(fragment in query['sql'] for fragment in REFERENCE_QUERIES)]
+
+    def test_reference_data_is_loaded_once(self):
+        reference_data()
+        self.assertEqual(self.reference_queries(reference_data), [])
+        self.assertEqual(admin_contact(), self.admin)
+        self.assertEqual(list(teachers()), list(UserAccount.objects.filter(role = UserRole.TEACHER).order_by('id')))
+        self.assertTrue(terms_exist())
+
+    def test_term_writes_are_seen_by_terms_exist(self):
+        self.assertTrue(terms_exist())
+        Term.objects.all().delete()
+        self.assertFalse(terms_exist())
+        self.assertEqual(self.reference_queries(terms_exist), [])
+        Term.objects.create(term_number = 1, start_date = datetime.date(2022, 9, 1), end_date = datetime.date(2022, 10, 21))
+        self.assertTrue(terms_exist())
+
+    def test_student_pages_make_no_reference_queries(self):
+        self.client.login(email=self.student.email, password='Password123')
+        for url_name in ['student_feed', 'requests_page']:
+            self.client.get(reverse(url_name))
+            self.assertEqual(self.reference_queries(lambda: self.client.get(reverse(url_name))), [], url_name)
+
+    def test_new_teacher_is_offered(self):
+        self.client.login(email=self.student.email, password='Password123')
+        self.client.get(reverse('requests_page'))
+        teacher = UserAccount.objects.create_teacher(
+            first_name = 'New',
+            last_name = 'Teacher',
+            email = 'new.teacher@example.org',
+            password = 'Password123',
+            gender = Gender.FEMALE,
+        )
+
+        response = self.client.get(reverse('requests_page'))
+        self.assertContains(response, f'<option value="{teacher.id}">New Teacher</option>')
+
+    def test_admin_contact_follows_the_admins(self):
+        self.client.login(email=self.student.email, password='Password123')
+        response = self.client.get(reverse('student_feed'))
+        self.assertEqual(response.context['admin_email'], f'To Further Edit Bookings Contact {self.admin.email}')
+
+        self.admin.delete()
+        response = self.client.get(reverse('student_feed'))
+        self.assertEqual(response.context['admin_email'], 'No Admins Available To Contact')
+
+    def test_teacher_choice_is_validated_without_a_query(self):
+        teacher = teachers()[0]
+        field = TeacherChoiceField(empty_label = None)
+        with self.assertNumQueries(0):
+            self.assertEqual(field.clean(str(teacher.id)), teacher)
+            self.assertEqual(field.clean(teacher), teacher)
+            self.assertEqual(len(list(field.choices)), len(teachers()))
+
+    def test_unknown_teacher_is_rejected(self):
+        form = RequestForm(data = {'teachers': self.student.id})
+        self.assertFalse(form.is_valid())
+        self.assertIn('teachers', form.errors)
@@ -0,0 +1,106 @@
+from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from lessons.models import UserAccount, Lesson, Gender, LessonType, LessonDuration, LessonStatus, Term
+from lessons.term_calendar import relabel_lessons
+from django.utils import timezone
+from io import StringIO
+import datetime
+
+class RelabelLessonsTestCase(TestCase):
+    """Tests that lesson term labels follow changes to the terms"""
+
+    def setUp(self):
+        self.teacher = UserAccount.objects.create_teacher(
+            first_name='Bob',
+            last_name='Jacobs',
+            email='bobby@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+        self.student = UserAccount.objects.create_student(
+            first_name='John',
+            last_name='Doe',
+            email='johndoe@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+
+        self.term1 = Term.objects.create(term_number=1, start_date = datetime.date(2022, 9,1), end_date = datetime.date(2022, 10,21))
+        self.term2 = Term.objects.create(term_number=2, start_date = datetime.date(2022, 10,31), end_date = datetime.date(2022, 12,16))
+
+        self.september_lesson = self.create_lesson(datetime.datetime(2022, 9, 20, 10, 0, 0, tzinfo=timezone.utc))
+        self.november_lesson = self.create_lesson(datetime.datetime(2022, 11, 20, 10, 0, 0, tzinfo=timezone.utc))
+
+    def create_lesson(self, lesson_date_time):
+        return Lesson.objects.create(
+            type = LessonType.INSTRUMENT,
+            duration = LessonDuration.THIRTY,
+            lesson_date_time = lesson_date_time,
+            teacher_id = self.teacher,
+            student_id = self.student,
+            lesson_status = LessonStatus.FULLFILLED,
+        )
+
+    def term_of(self, lesson):
+        return Lesson.objects.get(lesson_id = lesson.lesson_id).term
+
+    def test_lessons_are_labelled_on_save(self):
+        self.assertEqual(self.term_of(self.september_lesson), 'Term : 1')
+        self.assertEqual(self.term_of(self.november_lesson), 'Term : 2')
+
+    def test_creating_a_term_relabels_existing_lessons(self):
+        january_lesson = self.create_lesson(datetime.datetime(2023, 1, 10, 10, 0, 0, tzinfo=timezone.utc))
+        self.assertEqual(self.term_of(january_lesson), 'N/A')
+
+        Term.objects.create(term_number=3, start_date = datetime.date(2023, 1,3), end_date = datetime.date(2023, 2,10))
+        self.assertEqual(self.term_of(january_lesson), 'Term : 3')
+
+    def test_updating_a_term_relabels_existing_lessons(self):
+        self.term2.term_number = 4
+        self.term2.save()
+        self.assertEqual(self.term_of(self.november_lesson), 'Term : 4')
+        self.assertEqual(self.term_of(self.september_lesson), 'Term : 1')
+
+    def test_deleting_a_term_relabels_existing_lessons(self):
+        self.term2.delete()
+        self.assertEqual(self.term_of(self.november_lesson), 'N/A')
+        self.assertEqual(self.term_of(self.september_lesson), 'Term : 1')
+
+    def test_saving_a_lesson_moved_out_of_every_term_agrees_with_relabel(self):
+        self.november_lesson.lesson_date_time = datetime.datetime(2023, 3, 1, 10, 0, 0, tzinfo=timezone.utc)
+        self.november_lesson.save()
+        self.assertEqual(self.term_of(self.november_lesson), 'N/A')
+        self.assertEqual(relabel_lessons(), 0)
+
+    def test_relabel_uses_one_update_per_window(self):
+        Lesson.objects.update(term = 'N/A')
+        with CaptureQueriesContext(connection) as queries:
+            updated = relabel_lessons()
+        updates = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        # before term 1, term 1, close to term 2, term 2, close to the end of term 2, after term 2
+        self.assertEqual(len(updates), 6)
+        self.assertEqual(updated, 2)
+        self.assertEqual(relabel_lessons(), 0)
+
+    def test_bulk_create_labels_lessons(self):
+        lessons = Lesson.objects.bulk_create([
+            Lesson(
+                type = LessonType.THEORY,
+                duration = LessonDuration.HOUR,
+                lesson_date_time = datetime.datetime(2022, 11, day, 10, 0, 0, tzinfo=timezone.utc),
+                teacher_id = self.teacher,
+                student_id = self.student,
+            )
+            for day in range(1, 4)
+        ])
+        self.assertEqual([lesson.term for lesson in lessons], ['Term : 2'] * 3)
+        self.assertEqual(Lesson.objects.filter(term = 'Term : 2').count(), 4)
+
+    def test_relabel_terms_command(self):
+        Lesson.objects.update(term = 'N/A')
+        output = StringIO()
+        call_command('relabel_terms', stdout = output)
+        self.assertIn('Relabelled 2 lessons', output.getvalue())
+        self.assertEqual(self.term_of(self.november_lesson), 'Term : 2')
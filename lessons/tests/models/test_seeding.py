@@ -0,0 +1,161 @@
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from lessons.models import UserAccount, UserRole, Lesson, Invoice, Transaction, Term, InvoiceSequence, LedgerEntry
+from lessons.ledger import compute_family_balance
+from lessons.outstanding_balances import refresh_outstanding, outstanding_page
+from lessons.reference_data import teachers, terms_exist
+from lessons.fragment_cache import fragment_cache
+from lessons.invoice_references import allocate_invoice_reference
+from lessons.seeding import seed_at_scale, unseed_all, SEED_PASSWORD
+from lessons.term_calendar import term_calendar
+from io import StringIO
+
+class ScaleSeedingTestCase(TestCase):
+    """Tests of the bulk, deterministic seeding mode"""
+
+    def snapshot(self):
+        accounts = list(UserAccount.objects.order_by('id').values_list('email', 'first_name', 'last_name', 'gender', 'role', 'balance', 'parent_of_user__email'))
+        lessons = list(Lesson.objects.order_by('lesson_id').values_list('student_id__email', 'teacher_id__email', 'type', 'duration', 'lesson_date_time', 'request_date', 'lesson_status', 'term'))
+        invoices = list(Invoice.objects.order_by('id').values_list('student_account__email', 'fees_amount', 'invoice_status', 'amounts_need_to_pay'))
+        transactions = list(Transaction.objects.order_by('id').values_list('student_account__email', 'transaction_amount'))
+        return accounts, lessons, invoices, transactions
+
+    def reset(self):
+        for model in (Transaction, Invoice, LedgerEntry, InvoiceSequence, Lesson, UserAccount, Term):
+            model.objects.all().delete()
+
+    def test_seed_creates_families_teachers_and_terms(self):
+        counts = seed_at_scale(20, seed = 3)
+        self.assertEqual(counts['families'], 20)
+        self.assertEqual(UserAccount.objects.filter(role = UserRole.STUDENT, parent_of_user__isnull = True).count(), 20 + 1)
+        self.assertEqual(UserAccount.objects.filter(role = UserRole.STUDENT).count(), counts['students'] + 1)
+        self.assertEqual(UserAccount.objects.filter(role = UserRole.TEACHER).count(), counts['teachers'])
+        self.assertEqual(Lesson.objects.count(), counts['lessons'])
+        self.assertEqual(Invoice.objects.count(), counts['invoices'])
+        self.assertEqual(Transaction.objects.count(), counts['transactions'])
+        self.assertEqual(Term.objects.count(), 6)
+        self.assertTrue(UserAccount.objects.filter(email = 'petra.pickles@example.org', role = UserRole.ADMIN).exists())
+
+    def test_same_seed_gives_the_same_data(self):
+        seed_at_scale(15, seed = 7)
+        first = self.snapshot()
+        self.reset()
+        seed_at_scale(15, seed = 7)
+        self.assertEqual(self.snapshot(), first)
+
+    def test_different_seeds_give_different_data(self):
+        seed_at_scale(15, seed = 7)
+        first = self.snapshot()
+        self.reset()
+        seed_at_scale(15, seed = 8)
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_seeded_rows_are_consistent(self):
+        seed_at_scale(25, seed = 1)
+        for family in UserAccount.objects.filter(role = UserRole.STUDENT, parent_of_user__isnull = True):
+            self.assertEqual(family.balance, compute_family_balance(family))
+        seeded_outstanding = list(UserAccount.objects.order_by('id').values_list('id', 'outstanding'))
+        refresh_outstanding()
+        self.assertEqual(list(UserAccount.objects.order_by('id').values_list('id', 'outstanding')), seeded_outstanding)
+        self.assertFalse(Invoice.objects.filter(student_account__isnull = True).exists())
+        self.assertFalse(Invoice.objects.filter(booked_lesson__isnull = True).exists())
+        self.assertFalse(Transaction.objects.filter(invoice__isnull = True).exists())
+        self.assertFalse(Lesson.objects.filter(term = 'N/A').exists())
+        self.assertTrue(UserAccount.objects.order_by('-id').first().check_password(SEED_PASSWORD))
+
+    def test_rows_created_after_seeding_get_new_ids_and_references(self):
+        seed_at_scale(10, seed = 2)
+        invoice = Invoice.objects.order_by('-id').first()
+        last_number = InvoiceSequence.objects.get(student_id = invoice.student_account_id).last_number
+        self.assertEqual(invoice.reference_number, Invoice.generate_new_invoice_reference_number(invoice.student_ID, last_number - 1))
+        self.assertEqual(allocate_invoice_reference(invoice.student_account_id), Invoice.generate_new_invoice_reference_number(invoice.student_ID, last_number))
+
+        highest_id = UserAccount.objects.order_by('-id').values_list('id', flat=True).first()
+        student = UserAccount.objects.create_student(first_name='Jane', last_name='Doe', email='janedoe@example.org', password='Password123', gender='F')
+        self.assertEqual(student.id, highest_id + 1)
+
+    def test_seed_command_with_scale(self):
+        output = StringIO()
+        call_command('seed', scale = 5, seed = 4, stdout = output)
+        self.assertIn('5 families', output.getvalue())
+        self.assertEqual(UserAccount.objects.filter(role = UserRole.STUDENT, parent_of_user__isnull = True).count(), 5 + 1)
+
+class FastUnseedTestCase(TestCase):
+    """Tests of the set based reset of the unseed command"""
+
+    def setUp(self):
+        self.admin = UserAccount.objects.create_admin(
+            first_name='Admin',
+            last_name='Account',
+            email='admin@example.org',
+            password='Password123',
+            gender='M',
+        )
+        seed_at_scale(10, seed = 5)
+
+    def remaining(self):
+        return (
+            list(UserAccount.objects.values_list('email', flat=True)),
+            Lesson.objects.count(), Invoice.objects.count(), Transaction.objects.count(), Term.objects.count(),
+            LedgerEntry.objects.count(), InvoiceSequence.objects.count(),
+        )
+
+    def test_fast_unseed_keeps_only_the_protected_account(self):
+        output = StringIO()
+        call_command('unseed', fast = True, stdout = output)
+        self.assertEqual(self.remaining(), (['admin@example.org'], 0, 0, 0, 0, 0, 0))
+        self.assertIn('rows removed in', output.getvalue())
+
+    def test_fast_unseed_reports_the_rows_removed(self):
+        accounts = UserAccount.objects.count()
+        lessons = Lesson.objects.count()
+        counts = unseed_all('admin@example.org')
+        self.assertEqual(counts['accounts'], accounts - 1)
+        self.assertEqual(counts['lessons'], lessons)
+        self.assertEqual(counts['terms'], 6)
+
+    def test_fast_unseed_leaves_the_same_rows_as_unseed(self):
+        call_command('unseed')
+        slow = self.remaining()
+        self.assertEqual(slow[0], ['admin@example.org'])
+
+        seed_at_scale(10, seed = 5)
+        unseed_all('admin@example.org')
+        self.assertEqual(self.remaining(), slow)
+
+    def test_term_calendar_is_invalidated(self):
+        unseed_all('admin@example.org')
+        self.assertEqual(term_calendar.snapshot().ordered, ())
+
+
+class FastUnseedCachingTestCase(TransactionTestCase):
+    """Tests that the set based reset invalidates the caches its deletes skip the signals of"""
+
+    def setUp(self):
+        fragment_cache().clear()
+        term_calendar.invalidate()
+        self.admin = UserAccount.objects.create_admin(
+            first_name='Admin',
+            last_name='Account',
+            email='admin@example.org',
+            password='Password123',
+            gender='M',
+        )
+        seed_at_scale(10, seed = 5)
+
+    def tearDown(self):
+        fragment_cache().clear()
+        term_calendar.invalidate()
+
+    def test_cached_data_is_invalidated(self):
+        self.assertGreater(len(teachers()), 0)
+        self.assertTrue(terms_exist())
+        self.assertEqual(len(term_calendar.all()), 6)
+        self.assertGreater(len(outstanding_page(1)), 0)
+
+        unseed_all('admin@example.org')
+        self.assertEqual(teachers(), ())
+        self.assertFalse(terms_exist())
+        self.assertEqual(term_calendar.all(), ())
+        self.assertEqual(len(outstanding_page(1)), 0)
+        self.assertEqual(UserAccount.objects.get(id = self.admin.id).outstanding, 0)
@@ -0,0 +1,182 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.db import connection, transaction
+from django.core.exceptions import ObjectDoesNotExist
+from lessons.models import UserAccount, Lesson, Gender, LessonType, LessonDuration, LessonStatus, Term
+from lessons.term_calendar import term_calendar, TermCalendar
+from lessons.helper import check_valid_date
+from django.utils import timezone
+import datetime
+
+"""Label computed with the per term loop Lesson.save used before the term calendar, kept as the reference behaviour"""
+def reference_term_label(lesson_date):
+    label = None
+    for eachterm in Term.objects.all().order_by('pk'):
+        start = eachterm.start_date
+        end = eachterm.end_date
+        mid_term_date = start + (end - start)/2
+        close_to_end_of_term = end-(end - mid_term_date)/6
+
+        try:
+            next_term = Term.objects.get(term_number = eachterm.term_number + 1)
+        except ObjectDoesNotExist:
+            next_term = None
+
+        if(eachterm.start_date <= lesson_date <= close_to_end_of_term):
+            return 'Term : ' + str(eachterm.term_number)
+        elif (next_term != None and close_to_end_of_term <= lesson_date < next_term.start_date):
+            return 'Term : ' + str(eachterm.term_number + 1) + '(Close to next term)'
+        elif(next_term == None and close_to_end_of_term <= lesson_date < end):
+            return 'Term : ' + str(eachterm.term_number) + '(Close to next term but no next term)'
+    return label
+
+class ForcedRollback(Exception):
+    pass
+
+class TermCalendarTestCase(TestCase):
+    """Unit tests for the term calendar"""
+
+    def setUp(self):
+        Term.objects.create(term_number=1, start_date = datetime.date(2022, 9,1), end_date = datetime.date(2022, 10,21))
+        Term.objects.create(term_number=2, start_date = datetime.date(2022, 10,31), end_date = datetime.date(2022, 12,16))
+        Term.objects.create(term_number=4, start_date = datetime.date(2023, 2,20), end_date = datetime.date(2023, 3,31))
+        Term.objects.create(term_number=3, start_date = datetime.date(2023, 1,3), end_date = datetime.date(2023, 2,10))
+        Term.objects.create(term_number=5, start_date = datetime.date(2023, 4,17), end_date = datetime.date(2023, 5,26))
+
+    def test_labels_match_reference_for_every_day_of_the_year(self):
+        day = datetime.date(2022, 8, 1)
+        while day <= datetime.date(2023, 8, 1):
+            self.assertEqual(term_calendar.label_for(day), reference_term_label(day), day)
+            day += datetime.timedelta(days=1)
+
+    def test_labels_match_reference_for_overlapping_terms(self):
+        Term.objects.create(term_number=6, start_date = datetime.date(2023, 5,1), end_date = datetime.date(2023, 7,21))
+        day = datetime.date(2023, 3, 1)
+        while day <= datetime.date(2023, 8, 1):
+            self.assertEqual(term_calendar.label_for(day), reference_term_label(day), day)
+            day += datetime.timedelta(days=1)
+
+    def test_lookups_by_term_number(self):
+        self.assertEqual(term_calendar.count(), 5)
+        self.assertEqual(term_calendar.get(3).start_date, datetime.date(2023, 1,3))
+        self.assertEqual(term_calendar.get('4').end_date, datetime.date(2023, 3,31))
+        self.assertEqual(term_calendar.get(6), None)
+        self.assertEqual([term.term_number for term in term_calendar.all()], [1, 2, 3, 4, 5])
+        self.assertEqual(term_calendar.bookable_range(), (datetime.date(2022, 9,1), datetime.date(2023, 5,26)))
+
+    def test_calendar_sees_term_changes(self):
+        term = Term.objects.get(term_number=5)
+        term.end_date = datetime.date(2023, 6,30)
+        term.save()
+        self.assertEqual(term_calendar.get(5).end_date, datetime.date(2023, 6,30))
+
+        term.delete()
+        self.assertEqual(term_calendar.get(5), None)
+        self.assertEqual(term_calendar.count(), 4)
+
+    def test_check_valid_date_without_terms(self):
+        Term.objects.all().delete()
+        self.assertFalse(check_valid_date(datetime.date(2023, 1, 10)))
+
+
+class TermCalendarCachingTestCase(TransactionTestCase):
+    """Tests that the term calendar is cached between saves and invalidated by writes to terms"""
+
+    def setUp(self):
+        term_calendar.invalidate()
+        Term.objects.create(term_number=1, start_date = datetime.date(2022, 9,1), end_date = datetime.date(2022, 10,21))
+        Term.objects.create(term_number=2, start_date = datetime.date(2022, 10,31), end_date = datetime.date(2022, 12,16))
+
+        self.teacher = UserAccount.objects.create_teacher(
+            first_name='Bob',
+            last_name='Jacobs',
+            email='bobby@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+        self.student = UserAccount.objects.create_student(
+            first_name='John',
+            last_name='Doe',
+            email='johndoe@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+
+    def tearDown(self):
+        term_calendar.invalidate()
+
+    def create_lesson(self, day):
+        return Lesson.objects.create(
+            type = LessonType.INSTRUMENT,
+            duration = LessonDuration.THIRTY,
+            lesson_date_time = datetime.datetime(2022, 10, day, 10, 0, 0, tzinfo=timezone.utc),
+            teacher_id = self.teacher,
+            student_id = self.student,
+            lesson_status = LessonStatus.SAVED,
+        )
+
+    def test_saving_lessons_makes_no_term_queries_once_loaded(self):
+        self.create_lesson(3)
+        # one INSERT per lesson and nothing else
+        with self.assertNumQueries(3):
+            for day in range(4, 7):
+                lesson = self.create_lesson(day)
+        self.assertEqual(lesson.term, 'Term : 1')
+
+    def test_term_save_invalidates_calendar(self):
+        self.assertEqual(self.create_lesson(5).term, 'Term : 1')
+        Term.objects.filter(term_number=1).delete()
+        Term.objects.create(term_number=1, start_date = datetime.date(2022, 9,1), end_date = datetime.date(2022, 9,30))
+        self.assertEqual(self.create_lesson(6).term, 'Term : 2(Close to next term)')
+
+    def test_rolled_back_term_write_is_not_cached(self):
+        self.assertEqual(term_calendar.count(), 2)
+        try:
+            with transaction.atomic():
+                Term.objects.create(term_number=3, start_date = datetime.date(2023, 1,3), end_date = datetime.date(2023, 2,10))
+                self.assertEqual(term_calendar.count(), 3)
+                raise ForcedRollback()
+        except ForcedRollback:
+            pass
+        self.assertEqual(term_calendar.count(), 2)
+
+    @override_settings(TERM_CALENDAR_CHECK_SECONDS = 0)
+    def test_term_write_invalidates_the_calendar_of_other_workers(self):
+        other_worker = TermCalendar()
+        self.assertEqual(other_worker.count(), 2)
+        with self.assertNumQueries(0):
+            other_worker.count()
+
+        # the signals only reach the calendar of the process saving the term
+        Term.objects.create(term_number=3, start_date = datetime.date(2023, 1,3), end_date = datetime.date(2023, 2,10))
+        self.assertEqual(other_worker.count(), 3)
+        Term.objects.filter(term_number=3).update(end_date = datetime.date(2023, 2,17))
+        term_calendar.invalidate()
+        self.assertEqual(other_worker.get(3).end_date, datetime.date(2023, 2,17))
+
+    @override_settings(TERM_CALENDAR_CHECK_SECONDS = 60)
+    def test_other_workers_check_the_terms_version_once_per_period(self):
+        other_worker = TermCalendar()
+        self.assertEqual(other_worker.count(), 2)
+        Term.objects.create(term_number=3, start_date = datetime.date(2023, 1,3), end_date = datetime.date(2023, 2,10))
+        self.assertEqual(term_calendar.count(), 3)
+        self.assertEqual(other_worker.count(), 2)
+
+        with override_settings(TERM_CALENDAR_CHECK_SECONDS = 0):
+            self.assertEqual(other_worker.count(), 3)
+
+    def test_uncommitted_term_writes_only_bypass_the_calendar_of_their_thread(self):
+        calendar = TermCalendar()
+
+        def snapshots_from_another_thread():
+            try:
+                return calendar.snapshot() is calendar.snapshot()
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            calendar.term_changed()
+            self.assertIsNot(calendar.snapshot(), calendar.snapshot())
+            with ThreadPoolExecutor(max_workers = 1) as executor:
+                self.assertTrue(executor.submit(snapshots_from_another_thread).result())
+        self.assertIs(calendar.snapshot(), calendar.snapshot())
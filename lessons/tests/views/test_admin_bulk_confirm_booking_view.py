@@ -0,0 +1,213 @@
+from django.contrib import messages
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from lessons.models import UserAccount, Lesson, LessonType, LessonDuration, LessonStatus, Invoice, InvoiceStatus, LedgerEntry, LedgerEntryType, Term
+from lessons.invoice_references import allocate_invoice_reference
+import datetime
+
+class AdminBulkConfirmBookingTestCase(TestCase):
+    """Tests of the view booking many pending lessons at once"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json']
+
+    def setUp(self):
+        self.url = reverse('admin_bulk_confirm_booking')
+        self.admin = UserAccount.objects.get(email='bobby@example.org')
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.child = UserAccount.objects.get(email='bobbylee@example.org')
+        self.other_student = UserAccount.objects.get(email='janedoe@example.org')
+        self.teacher = UserAccount.objects.get(email='barbdutch@example.org')
+
+        Term.objects.create(term_number = 1, start_date = datetime.date(2022, 9, 1), end_date = datetime.date(2022, 10, 21))
+        Term.objects.create(term_number = 2, start_date = datetime.date(2022, 10, 31), end_date = datetime.date(2022, 12, 16))
+
+        self.student_lesson = self.create_lesson(self.student, datetime.date(2022, 9, 5), LessonDuration.HOUR)
+        self.child_lesson = self.create_lesson(self.child, datetime.date(2022, 9, 6), LessonDuration.THIRTY)
+        self.second_term_lesson = self.create_lesson(self.child, datetime.date(2022, 11, 7), LessonDuration.FOURTY_FIVE)
+        self.other_lesson = self.create_lesson(self.other_student, datetime.date(2022, 9, 7), LessonDuration.THIRTY)
+
+    def create_lesson(self, student, lesson_date, duration, status = LessonStatus.UNFULFILLED, hour = 10):
+        return Lesson.objects.create(
+            type = LessonType.INSTRUMENT,
+            duration = duration,
+            lesson_date_time = datetime.datetime.combine(lesson_date, datetime.time(hour), tzinfo = timezone.utc),
+            teacher_id = self.teacher,
+            student_id = student,
+            lesson_status = status,
+        )
+
+    def balance_of(self, user):
+        return UserAccount.objects.get(id = user.id).balance
+
+    def status_of(self, lesson):
+        return Lesson.objects.get(lesson_id = lesson.lesson_id).lesson_status
+
+    def test_bulk_confirm_booking_url(self):
+        self.assertEqual(self.url, '/admin_bulk_confirm_booking')
+
+    def test_book_selected_lessons(self):
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.post(self.url, {'lesson_ids': [self.student_lesson.lesson_id, self.child_lesson.lesson_id]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'admin_bulk_booking_summary.html')
+        messages_list = list(response.context['messages'])
+        self.assertEqual(str(messages_list[0]), 'Successfully booked 2 lessons in 2 selected lessons!')
+        self.assertEqual(messages_list[0].level, messages.SUCCESS)
+
+        self.assertEqual(self.status_of(self.student_lesson), LessonStatus.FULLFILLED)
+        self.assertEqual(self.status_of(self.child_lesson), LessonStatus.FULLFILLED)
+        self.assertEqual(self.status_of(self.second_term_lesson), LessonStatus.UNFULFILLED)
+        self.assertEqual(self.status_of(self.other_lesson), LessonStatus.UNFULFILLED)
+
+        student_invoice = Invoice.objects.get(booked_lesson = self.student_lesson)
+        self.assertEqual(student_invoice.reference_number, f'{self.student.id}-001')
+        self.assertEqual(student_invoice.student_account, self.student)
+        self.assertEqual(student_invoice.fees_amount, 20)
+        self.assertEqual(student_invoice.amounts_need_to_pay, 20)
+        self.assertEqual(student_invoice.invoice_status, InvoiceStatus.UNPAID)
+        self.assertEqual(student_invoice.lesson_ID, str(self.student_lesson.lesson_id))
+        child_invoice = Invoice.objects.get(booked_lesson = self.child_lesson)
+        self.assertEqual(child_invoice.reference_number, f'{self.child.id}-001')
+        self.assertEqual(child_invoice.fees_amount, 15)
+
+        self.assertEqual(self.balance_of(self.student), -35)
+        self.assertEqual(self.balance_of(self.child), 0)
+        self.assertEqual(LedgerEntry.objects.filter(family = self.student, entry_type = LedgerEntryType.INVOICE).count(), 2)
+
+        summary = response.context['summary']
+        self.assertEqual([booked.lesson for booked in summary.booked], [self.student_lesson, self.child_lesson])
+        self.assertEqual(len(summary.families), 1)
+        self.assertEqual(summary.families[0].family, self.student)
+        self.assertEqual(summary.families[0].lessons, 2)
+        self.assertEqual(summary.families[0].fees, 35)
+        self.assertEqual(summary.families[0].balance, -35)
+        self.assertEqual(summary.total_fees(), 35)
+
+    def test_book_all_pending_lessons_of_a_family(self):
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.post(self.url, {'family': self.child.id, 'lesson_ids': [self.other_lesson.lesson_id]})
+
+        messages_list = list(response.context['messages'])
+        self.assertEqual(str(messages_list[0]), 'Successfully booked 3 lessons in the family of John Doe!')
+        self.assertEqual(self.status_of(self.second_term_lesson), LessonStatus.FULLFILLED)
+        self.assertEqual(self.status_of(self.other_lesson), LessonStatus.UNFULFILLED)
+        self.assertEqual(list(Invoice.objects.filter(student_account = self.child).order_by('reference_number').values_list('reference_number', flat=True)), [f'{self.child.id}-001', f'{self.child.id}-002'])
+        self.assertEqual(self.balance_of(self.student), -53)
+
+    def test_book_all_pending_lessons_of_a_term(self):
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.post(self.url, {'term': 1})
+
+        messages_list = list(response.context['messages'])
+        self.assertEqual(str(messages_list[0]), 'Successfully booked 3 lessons in term 1!')
+        self.assertEqual(self.status_of(self.second_term_lesson), LessonStatus.UNFULFILLED)
+        self.assertEqual(self.balance_of(self.student), -35)
+        self.assertEqual(self.balance_of(self.other_student), -15)
+        self.assertEqual(len(response.context['summary'].families), 2)
+
+    def test_lessons_that_are_not_pending_are_left_alone(self):
+        saved_lesson = self.create_lesson(self.student, datetime.date(2022, 9, 12), LessonDuration.HOUR, LessonStatus.SAVED)
+        self.client.login(email=self.admin.email, password='Password123')
+        self.client.post(self.url, {'lesson_ids': [self.student_lesson.lesson_id]})
+        response = self.client.post(self.url, {'lesson_ids': [self.student_lesson.lesson_id, saved_lesson.lesson_id]})
+
+        messages_list = list(response.context['messages'])
+        self.assertEqual(str(messages_list[0]), 'There are no pending lessons to book in 2 selected lessons')
+        self.assertEqual(messages_list[0].level, messages.INFO)
+        self.assertEqual(self.status_of(saved_lesson), LessonStatus.SAVED)
+        self.assertEqual(Invoice.objects.filter(booked_lesson = self.student_lesson).count(), 1)
+        self.assertEqual(self.balance_of(self.student), -20)
+
+    def test_references_continue_from_the_invoices_already_issued(self):
+        allocate_invoice_reference(self.student.id)
+        self.client.login(email=self.admin.email, password='Password123')
+        self.client.post(self.url, {'lesson_ids': [self.student_lesson.lesson_id]})
+        self.assertEqual(Invoice.objects.get(booked_lesson = self.student_lesson).reference_number, f'{self.student.id}-002')
+
+    def test_queries_do_not_grow_with_the_number_of_lessons(self):
+        for day in range(12, 22):
+            self.create_lesson(self.student, datetime.date(2022, 9, day), LessonDuration.HOUR)
+            self.create_lesson(self.child, datetime.date(2022, 9, day), LessonDuration.THIRTY, hour = 14)
+        self.client.login(email=self.admin.email, password='Password123')
+        self.client.get(reverse('admin_feed'))
+
+        with self.assertNumQueries(31):
+            response = self.client.post(self.url, {'family': self.student.id})
+
+        self.assertEqual(len(response.context['summary'].booked), 23)
+        self.assertEqual(self.balance_of(self.student), -(11 * 20 + 11 * 15 + 18))
+
+    def test_overlapping_lessons_are_left_pending(self):
+        booked = self.create_lesson(self.other_student, datetime.date(2022, 9, 5), LessonDuration.THIRTY, LessonStatus.FULLFILLED)
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.post(self.url, {'lesson_ids': [self.student_lesson.lesson_id, self.child_lesson.lesson_id]})
+
+        messages_list = list(response.context['messages'])
+        self.assertEqual(str(messages_list[0]), 'Successfully booked 1 lessons in 2 selected lessons!')
+        self.assertEqual(str(messages_list[1]), '1 lessons in 2 selected lessons overlap another lesson and were left pending!')
+        self.assertEqual(messages_list[1].level, messages.WARNING)
+
+        self.assertEqual(self.status_of(self.student_lesson), LessonStatus.UNFULFILLED)
+        self.assertEqual(self.status_of(self.child_lesson), LessonStatus.FULLFILLED)
+        self.assertFalse(Invoice.objects.filter(booked_lesson = self.student_lesson).exists())
+        self.assertEqual(self.balance_of(self.student), -15)
+
+        summary = response.context['summary']
+        self.assertEqual([booked_lesson.lesson for booked_lesson in summary.booked], [self.child_lesson])
+        self.assertEqual([(queue_conflict.lesson, queue_conflict.conflicts) for queue_conflict in summary.skipped], [(self.student_lesson, [booked])])
+        self.assertContains(response, reverse('admin_update_request_page', args=[self.student_lesson.lesson_id]))
+
+    def test_pending_lessons_overlapping_each_other_are_both_left_pending(self):
+        clash = self.create_lesson(self.other_student, datetime.date(2022, 9, 5), LessonDuration.THIRTY)
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.post(self.url, {'lesson_ids': [self.student_lesson.lesson_id, clash.lesson_id]})
+
+        messages_list = list(response.context['messages'])
+        self.assertEqual(len(messages_list), 1)
+        self.assertEqual(str(messages_list[0]), '2 lessons in 2 selected lessons overlap another lesson and were left pending!')
+        self.assertEqual(self.status_of(self.student_lesson), LessonStatus.UNFULFILLED)
+        self.assertEqual(self.status_of(clash), LessonStatus.UNFULFILLED)
+        self.assertEqual(Invoice.objects.count(), 0)
+        self.assertEqual(len(response.context['summary'].skipped), 2)
+
+    def test_nothing_selected(self):
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.post(self.url, {}, follow = True)
+        self.assertRedirects(response, reverse('admin_feed'), status_code=302, target_status_code=200)
+        messages_list = list(response.context['messages'])
+        self.assertEqual(str(messages_list[0]), 'Select the lessons to book first!')
+        self.assertEqual(Invoice.objects.count(), 0)
+
+    def test_unknown_family(self):
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.post(self.url, {'family': self.teacher.id}, follow = True)
+        self.assertRedirects(response, reverse('admin_feed'), status_code=302, target_status_code=200)
+        messages_list = list(response.context['messages'])
+        self.assertEqual(str(messages_list[0]), 'Student does not exist!')
+
+    def test_unknown_term(self):
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.post(self.url, {'term': 5}, follow = True)
+        self.assertRedirects(response, reverse('term_management'), status_code=302, target_status_code=200)
+        messages_list = list(response.context['messages'])
+        self.assertEqual(str(messages_list[0]), 'Term does not exist!')
+        self.assertEqual(Invoice.objects.count(), 0)
+
+    def test_get_request_redirects_to_admin_feed(self):
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('admin_feed'), status_code=302, fetch_redirect_response=False)
+
+    def test_student_cannot_book(self):
+        self.client.login(email=self.student.email, password='Password123')
+        response = self.client.post(self.url, {'family': self.student.id})
+        self.assertRedirects(response, reverse('home'), status_code=302, fetch_redirect_response=False)
+        self.assertEqual(self.status_of(self.student_lesson), LessonStatus.UNFULFILLED)
+
+    def test_student_requests_page_offers_the_pending_lessons(self):
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.get(reverse('student_requests', args=[self.student.id]))
+        self.assertContains(response, f'name="lesson_ids" value="{self.student_lesson.lesson_id}"')
+        self.assertContains(response, f'name="family" value="{self.student.id}"')
@@ -204,3 +204,33 @@ class DirectorRoleChangesTestCase(TestCase):
 
         messages_list = list(response.context['messages'])
         self.assertEqual(messages_list[0].level, messages.ERROR)
+
+    def test_cant_update_lesson_to_overlap_a_lesson_of_the_teacher(self):
+        other_student = UserAccount.objects.create_student(
+            first_name='John',
+            last_name='Doe',
+            email='johndoe@example.org',
+            password='Password123',
+            gender = 'M',
+        )
+        Lesson.objects.create(
+            type = LessonType.THEORY,
+            duration = LessonDuration.THIRTY,
+            lesson_date_time = datetime.datetime(2022, 4, 1, 0, 30, 0, 0).replace(tzinfo=timezone.utc),
+            teacher_id = self.teacher,
+            student_id = other_student,
+            lesson_status = LessonStatus.FULLFILLED,
+        )
+
+        self.client.login(email=self.admin.email, password="Password123")
+        self.update_lesson_url = reverse('admin_update_request', args=[self.lesson.lesson_id])
+        response = self.client.post(self.update_lesson_url,self.form_input ,follow = True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'admin_update_request.html')
+        messages_list = list(response.context['messages'])
+        self.assertEqual(str(messages_list[0]), 'The selected teacher already has a lesson from 2022-04-01 00:30 to 01:00, please choose another time')
+        self.assertEqual(messages_list[0].level, messages.ERROR)
+
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.lesson.duration, LessonDuration.THIRTY)
@@ -0,0 +1,144 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from lessons.models import UserAccount, Lesson, LessonType, LessonDuration, LessonStatus
+import datetime
+
+class AdminFeedViewTestCase(TestCase):
+    """Tests of the admin feed shell and of the sections it loads a page at a time"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json']
+
+    def setUp(self):
+        self.url = reverse('admin_feed')
+        self.admin = UserAccount.objects.get(email='bobby@example.org')
+        self.director = UserAccount.objects.get(email='jsmith@example.org')
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.child = UserAccount.objects.get(email='bobbylee@example.org')
+        self.teacher = UserAccount.objects.get(email='barbdutch@example.org')
+
+    def create_lessons(self, number, status):
+        first_day = Lesson.objects.count()
+        return [Lesson.objects.create(
+            type = LessonType.INSTRUMENT,
+            duration = LessonDuration.HOUR,
+            lesson_date_time = datetime.datetime(2022, 11, 1, 15, 0, tzinfo = timezone.utc) + datetime.timedelta(days = first_day + day),
+            teacher_id = self.teacher,
+            student_id = self.child,
+            lesson_status = status,
+        ) for day in range(number)]
+
+    def section_url(self, section):
+        return reverse('admin_feed_section', args=[section])
+
+    def test_admin_feed_section_url(self):
+        self.assertEqual(self.section_url('students'), '/admin_feed/students')
+
+    def test_admin_feed_is_an_empty_shell(self):
+        self.create_lessons(3, LessonStatus.UNFULFILLED)
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'admin_feed.html')
+        for section in ['students', 'parents', 'pending', 'booked']:
+            self.assertContains(response, f'data-section-url="{self.section_url(section)}"')
+        self.assertNotContains(response, self.student.email)
+
+    def test_admin_feed_queries_do_not_grow_with_the_school(self):
+        self.client.login(email=self.admin.email, password='Password123')
+        self.client.get(self.url)
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+        self.create_lessons(10, LessonStatus.FULLFILLED)
+        UserAccount.objects.create_student(first_name = 'New', last_name = 'Student', email = 'new.student@example.org', password = 'Password123')
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+    def test_students_section(self):
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.get(self.section_url('students'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'partials/admin_feed_accounts.html')
+        self.assertNotIn(self.admin, response.context['rows'])
+        self.assertIn(self.child, response.context['rows'])
+        self.assertContains(response, reverse('student_requests', args=[self.child.id]))
+
+    def test_parents_section(self):
+        self.client.login(email=self.director.email, password='Password123')
+        response = self.client.get(self.section_url('parents'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['rows']), [self.student])
+
+    def test_lesson_sections(self):
+        pending = self.create_lessons(2, LessonStatus.UNFULFILLED)
+        self.create_lessons(1, LessonStatus.SAVED)
+        self.client.login(email=self.admin.email, password='Password123')
+
+        response = self.client.get(self.section_url('pending'))
+        self.assertTemplateUsed(response, 'partials/admin_feed_lessons.html')
+        self.assertEqual(list(response.context['rows']), pending)
+        self.assertContains(response, str(self.teacher))
+
+        response = self.client.get(self.section_url('booked'))
+        self.assertEqual(list(response.context['rows']), [])
+        self.assertContains(response, 'There are currently no items here')
+
+    @override_settings(HISTORY_PAGE_SIZE = 3)
+    def test_sections_are_read_a_page_at_a_time(self):
+        booked = self.create_lessons(7, LessonStatus.FULLFILLED)
+        self.client.login(email=self.admin.email, password='Password123')
+
+        response = self.client.get(self.section_url('booked'))
+        self.assertEqual(list(response.context['rows']), booked[:3])
+        page = response.context['page']
+        self.assertFalse(page.has_previous)
+        self.assertTrue(page.has_next)
+        self.assertContains(response, f'href="{self.section_url("booked")}?after={booked[2].lesson_id}"')
+
+        response = self.client.get(self.section_url('booked'), {'after': booked[5].lesson_id})
+        self.assertEqual(list(response.context['rows']), booked[6:])
+        self.assertFalse(response.context['page'].has_next)
+
+        response = self.client.get(self.section_url('booked'), {'before': booked[3].lesson_id})
+        self.assertEqual(list(response.context['rows']), booked[:3])
+
+        response = self.client.get(self.section_url('booked'), {'page_size': 5})
+        self.assertEqual(len(response.context['rows']), 5)
+
+    def test_section_queries_do_not_grow_with_the_page(self):
+        self.create_lessons(2, LessonStatus.FULLFILLED)
+        self.client.login(email=self.admin.email, password='Password123')
+        self.client.get(self.section_url('booked'))
+        with self.assertNumQueries(3):
+            self.client.get(self.section_url('booked'))
+
+        self.create_lessons(20, LessonStatus.FULLFILLED)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.section_url('booked'))
+        self.assertEqual(len(response.context['rows']), 22)
+
+    def test_rows_are_loaded_with_only_the_shown_columns(self):
+        self.create_lessons(1, LessonStatus.UNFULFILLED)
+        self.client.login(email=self.admin.email, password='Password123')
+        lesson = self.client.get(self.section_url('pending')).context['rows'][0]
+        self.assertIn('lesson_end_time', lesson.get_deferred_fields())
+        self.assertIn('password', lesson.teacher_id.get_deferred_fields())
+        account = self.client.get(self.section_url('students')).context['rows'][0]
+        self.assertIn('password', account.get_deferred_fields())
+
+    def test_invalid_page_returns_the_first_page(self):
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.get(self.section_url('students'), {'after': 'abc'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page'].has_previous)
+
+    def test_unknown_section(self):
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.get(self.section_url('teachers'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_student_cannot_read_a_section(self):
+        self.client.login(email=self.student.email, password='Password123')
+        response = self.client.get(self.section_url('students'))
+        self.assertRedirects(response, reverse('home'), status_code=302, fetch_redirect_response=False)
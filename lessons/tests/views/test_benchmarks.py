@@ -0,0 +1,53 @@
+from django.test import TestCase
+from django.urls import URLPattern
+from msms.urls import urlpatterns
+from lessons.models import UserAccount, Lesson, Invoice, Transaction, Term
+from lessons.benchmarks.routes import ROUTES
+from lessons.benchmarks.runner import benchmark_routes, compare_reports
+from lessons.seeding import seed_at_scale
+
+class BenchmarkSuiteTestCase(TestCase):
+    """Tests of the per route benchmark suite"""
+
+    def report(self, **route_results):
+        return {'scales': {'1000': {'routes': route_results}}}
+
+    def result(self, wall_ms, queries, sql_ms):
+        return {'wall_ms': wall_ms, 'queries': queries, 'sql_ms': sql_ms}
+
+    def test_every_url_has_a_benchmark_route(self):
+        url_names = {pattern.name for pattern in urlpatterns if isinstance(pattern, URLPattern)}
+        url_names.add('admin:index')
+        self.assertEqual({route.url_name for route in ROUTES}, url_names)
+
+    def test_benchmark_requests_every_route_and_leaves_the_data_unchanged(self):
+        seed_at_scale(8, seed = 1)
+        counts_before = [model.objects.count() for model in (UserAccount, Lesson, Invoice, Transaction, Term)]
+
+        results = benchmark_routes(repeat = 1)
+
+        self.assertEqual(set(results), {route.url_name for route in ROUTES})
+        for url_name, result in results.items():
+            self.assertLess(result['status'], 400, url_name)
+            self.assertGreater(result['wall_ms'], 0)
+            self.assertGreaterEqual(result['sql_ms'], 0)
+        self.assertGreater(results['student_feed']['queries'], 0)
+        self.assertEqual([model.objects.count() for model in (UserAccount, Lesson, Invoice, Transaction, Term)], counts_before)
+
+    def test_more_queries_is_a_regression(self):
+        regressions = compare_reports(self.report(balance = self.result(10, 8, 1)), self.report(balance = self.result(10, 7, 1)))
+        self.assertEqual([(regression.url_name, regression.metric) for regression in regressions], [('balance', 'queries')])
+
+    def test_slower_routes_are_regressions(self):
+        regressions = compare_reports(self.report(balance = self.result(20, 7, 8)), self.report(balance = self.result(10, 7, 1)), tolerance = 0.25)
+        self.assertEqual([regression.metric for regression in regressions], ['wall_ms', 'sql_ms'])
+
+    def test_small_differences_are_not_regressions(self):
+        regressions = compare_reports(self.report(balance = self.result(1.5, 7, 0.5)), self.report(balance = self.result(1, 7, 0.2)), tolerance = 0.25)
+        self.assertEqual(regressions, [])
+        regressions = compare_reports(self.report(balance = self.result(110, 7, 1)), self.report(balance = self.result(100, 7, 1)), tolerance = 0.25)
+        self.assertEqual(regressions, [])
+
+    def test_routes_and_scales_missing_from_the_baseline_are_skipped(self):
+        baseline = {'scales': {'10000': {'routes': {'balance': self.result(1, 1, 1)}}}}
+        self.assertEqual(compare_reports(self.report(balance = self.result(100, 70, 10)), baseline), [])
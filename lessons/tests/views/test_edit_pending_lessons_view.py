@@ -486,3 +486,40 @@ class StudentFeedEditLessonTestCase(TestCase):
         self.assertEqual(updated_lesson.duration, LessonDuration.HOUR)
         self.assertEqual(updated_lesson.teacher_id,self.teacher3)
         self.assertEqual(updated_lesson.lesson_date_time,datetime.datetime(2022, 9, 17, 16, 00, 00, tzinfo=timezone.utc))
+
+    def test_cant_edit_lesson_to_overlap_a_lesson_of_the_teacher(self):
+        self.create_forms()
+        Lesson.objects.create(
+            type = LessonType.THEORY,
+            duration = LessonDuration.THIRTY,
+            lesson_date_time = datetime.datetime(2022, 9, 21, 16, 15, 00, tzinfo=timezone.utc),
+            teacher_id = self.teacher2,
+            student_id = self.other_student,
+            request_date = datetime.date(2022, 10, 15),
+            lesson_status = LessonStatus.FULLFILLED,
+        )
+        self.client.login(email=self.student.email, password="Password123")
+        self.change_lessons_status_to_unfulfilled()
+
+        response = self.client.post(self.edit_url,self.form_input, follow = True)
+
+        self.assertTemplateUsed(response, 'edit_request.html')
+        messages_list = list(response.context['messages'])
+        self.assertEqual(str(messages_list[0]), 'The selected teacher already has a lesson from 2022-09-21 16:15 to 16:45, please choose another time')
+        self.assertEqual(messages_list[0].level, messages.ERROR)
+
+        actual_lesson = Lesson.objects.get(lesson_id = self.lesson.lesson_id)
+        self.assertEqual(actual_lesson.lesson_date_time, self.lesson.lesson_date_time)
+        self.assertEqual(actual_lesson.teacher_id, self.lesson.teacher_id)
+
+    def test_edit_lesson_does_not_conflict_with_itself(self):
+        self.create_forms()
+        self.client.login(email=self.student.email, password="Password123")
+        self.change_lessons_status_to_unfulfilled()
+
+        self.form_input['lesson_date_time'] = self.lesson.lesson_date_time
+        self.form_input['teachers'] = self.lesson.teacher_id.id
+        response = self.client.post(self.edit_url,self.form_input, follow = True)
+
+        messages_list = list(response.context['messages'])
+        self.assertEqual(str(messages_list[0]), 'Succesfully edited lesson')
@@ -0,0 +1,119 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.core.management import call_command
+from django.http import StreamingHttpResponse
+from lessons.models import Invoice, InvoiceStatus, UserAccount, Gender, Transaction, Lesson, LessonType, LessonDuration, LessonStatus
+from lessons.tests.helpers import reverse_with_next
+from django.utils import timezone
+from io import StringIO
+import datetime
+import json
+
+class ExportHistoryViewTestCase(TestCase):
+    """Tests of the streaming exports of invoices, transactions and lessons"""
+
+    def setUp(self):
+        self.admin = UserAccount.objects.create_admin(
+            first_name='Jane',
+            last_name='Doe',
+            email='janedoe@example.org',
+            password='Password123',
+            gender = 'F',
+        )
+        self.teacher = UserAccount.objects.create_teacher(
+            first_name='Bob',
+            last_name='Jacobs',
+            email='bobby@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+        self.student = UserAccount.objects.create_student(
+            first_name='John',
+            last_name='Doe',
+            email='johndoe@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+        self.other_student = UserAccount.objects.create_student(
+            first_name='Jack',
+            last_name='Doe',
+            email='jackdoe@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+        self.create_booking(self.student, 1, datetime.datetime(2022, 11, 1, 10, 0, 0, tzinfo=timezone.utc))
+        self.create_booking(self.student, 2, datetime.datetime(2022, 12, 1, 10, 0, 0, tzinfo=timezone.utc))
+        self.create_booking(self.other_student, 1, datetime.datetime(2022, 11, 15, 10, 0, 0, tzinfo=timezone.utc))
+        self.url = reverse('export_history', kwargs={'export_name': 'invoices'})
+
+    def create_booking(self, student, number, lesson_date_time):
+        lesson = Lesson.objects.create(
+            type = LessonType.INSTRUMENT,
+            duration = LessonDuration.THIRTY,
+            lesson_date_time = lesson_date_time,
+            teacher_id = self.teacher,
+            student_id = student,
+            lesson_status = LessonStatus.FULLFILLED,
+        )
+        reference_number = f'{student.id}-{number:03d}'
+        Invoice.objects.create(
+            reference_number = reference_number,
+            student_ID = str(student.id),
+            fees_amount = 15,
+            invoice_status = InvoiceStatus.PAID,
+            amounts_need_to_pay = 0,
+            lesson_ID = str(lesson.lesson_id),
+        )
+        Transaction.objects.create(
+            Student_ID_transaction = str(student.id),
+            invoice_reference_transaction = reference_number,
+            transaction_amount = 15,
+        )
+
+    def export(self, export_name, **query):
+        self.client.login(username=self.admin.email, password='Password123')
+        return self.client.get(reverse('export_history', kwargs={'export_name': export_name}), query)
+
+    def content_lines(self, response):
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_export_is_streamed_as_csv(self):
+        response = self.export('invoices')
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="invoices.csv"')
+        lines = self.content_lines(response)
+        self.assertEqual(lines[0], 'reference_number,student_ID,fees_amount,invoice_status,amounts_need_to_pay,lesson_ID')
+        self.assertEqual(len(lines), 4)
+
+    def test_export_filtered_by_date_range_and_student(self):
+        lines = self.content_lines(self.export('transactions', start_date = '2022-11-01', end_date = '2022-11-30', student = self.student.id))
+        self.assertEqual(lines[1:], [f'{self.student.id},{self.student.id}-001,15'])
+
+    def test_export_of_lessons_as_json_lines(self):
+        lines = self.content_lines(self.export('lessons', format = 'jsonl', end_date = '2022-11-01'))
+        self.assertEqual(len(lines), 1)
+        lesson = json.loads(lines[0])
+        self.assertEqual(lesson['student_id'], self.student.id)
+        self.assertEqual(lesson['lesson_date_time'], '2022-11-01T10:00:00+00:00')
+
+    def test_unknown_export(self):
+        self.assertEqual(self.export('teachers').status_code, 404)
+
+    def test_invalid_filters_redirect(self):
+        response = self.export('invoices', start_date = '2022-12-01', end_date = '2022-11-01')
+        self.assertRedirects(response, reverse('admin_feed'), status_code=302, target_status_code=200)
+
+    def test_export_when_log_in_as_student(self):
+        self.client.login(username=self.student.email, password='Password123')
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('home'), status_code=302, fetch_redirect_response=False)
+
+    def test_export_without_being_logged_in(self):
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse_with_next('home', self.url), status_code=302, fetch_redirect_response=False)
+
+    def test_export_command(self):
+        output = StringIO()
+        call_command('export_history', 'invoices', '--student', str(self.other_student.id), stdout=output)
+        self.assertEqual(output.getvalue().splitlines()[1:], [f'{self.other_student.id}-001,{self.other_student.id},15,PAID,0,' + str(Lesson.objects.get(student_id = self.other_student).lesson_id)])
@@ -0,0 +1,97 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.test.utils import override_settings
+from lessons.models import Invoice, InvoiceStatus, UserAccount, Gender, Transaction
+
+@override_settings(HISTORY_PAGE_SIZE = 3, HISTORY_MAX_PAGE_SIZE = 5)
+class HistoryPaginationTestCase(TestCase):
+    """Tests of the filters and keyset pagination of the invoice and transaction history pages"""
+
+    def setUp(self):
+        self.admin = UserAccount.objects.create_admin(
+            first_name='Jane',
+            last_name='Doe',
+            email='janedoe@example.org',
+            password='Password123',
+            gender = 'F',
+        )
+        self.student = UserAccount.objects.create_student(
+            first_name='John',
+            last_name='Doe',
+            email='johndoe@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+        self.other_student = UserAccount.objects.create_student(
+            first_name='Jack',
+            last_name='Doe',
+            email='jackdoe@example.org',
+            password='Password123',
+            gender = Gender.MALE,
+        )
+        for number in range(1, 8):
+            student = self.student if number % 2 == 1 else self.other_student
+            reference_number = f'{student.id}-{number:03d}'
+            Invoice.objects.create(
+                reference_number = reference_number,
+                student_ID = str(student.id),
+                fees_amount = number * 10,
+                invoice_status = InvoiceStatus.PAID if number <= 4 else InvoiceStatus.UNPAID,
+                amounts_need_to_pay = 0,
+            )
+            Transaction.objects.create(
+                Student_ID_transaction = str(student.id),
+                invoice_reference_transaction = reference_number,
+                transaction_amount = number,
+            )
+        self.client.login(username=self.admin.email, password='Password123')
+
+    def get_invoices(self, **query):
+        return self.client.get(reverse('invoices_history'), query)
+
+    def test_first_page_is_limited_to_page_size(self):
+        response = self.get_invoices()
+        page = response.context['page']
+        self.assertEqual([invoice.fees_amount for invoice in page], [10, 20, 30])
+        self.assertFalse(page.has_previous)
+        self.assertTrue(page.has_next)
+
+    def test_next_and_previous_pages_follow_cursors(self):
+        first_page = self.get_invoices().context['page']
+        second_page = self.get_invoices(after = first_page.next_cursor).context['page']
+        self.assertEqual([invoice.fees_amount for invoice in second_page], [40, 50, 60])
+        self.assertTrue(second_page.has_previous)
+
+        previous_page = self.get_invoices(before = second_page.previous_cursor).context['page']
+        self.assertEqual([invoice.fees_amount for invoice in previous_page], [10, 20, 30])
+        self.assertFalse(previous_page.has_previous)
+        self.assertTrue(previous_page.has_next)
+
+        last_page = self.get_invoices(after = second_page.next_cursor).context['page']
+        self.assertEqual([invoice.fees_amount for invoice in last_page], [70])
+        self.assertFalse(last_page.has_next)
+
+    def test_page_size_is_capped(self):
+        page = self.get_invoices(page_size = 1000).context['page']
+        self.assertEqual(len(page), 5)
+
+    def test_invoice_filters(self):
+        page = self.get_invoices(status = InvoiceStatus.UNPAID, student = self.student.id, min_amount = 60, page_size = 5).context['page']
+        self.assertEqual([invoice.fees_amount for invoice in page], [70])
+
+    def test_invalid_filters_are_ignored(self):
+        response = self.get_invoices(min_amount = 50, max_amount = 10)
+        self.assertEqual(len(response.context['page']), 3)
+        self.assertContains(response, 'Invalid filters!')
+
+    def test_transaction_total_is_of_all_matching_transactions(self):
+        response = self.client.get(reverse('transaction_history'), {'student': self.student.id})
+        self.assertEqual(response.context['total'], 1 + 3 + 5 + 7)
+        self.assertEqual(len(response.context['page']), 3)
+
+        response = self.client.get(reverse('transaction_history'), {'status': InvoiceStatus.PAID, 'max_amount': 3})
+        self.assertEqual(response.context['total'], 1 + 2 + 3)
+
+    def test_next_link_keeps_filters(self):
+        response = self.get_invoices(student = self.student.id, page_size = 2)
+        self.assertEqual(response.context['next_query'], f'student={self.student.id}&page_size=2&after={response.context["page"].next_cursor}')
@@ -0,0 +1,103 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from lessons.models import UserAccount
+from lessons.tests.helpers import reverse_with_next
+from msms.metrics import metrics_registry, Histogram, UNRESOLVED
+import json
+
+class RequestMetricsTestCase(TestCase):
+    """Tests of the request metrics middleware and of the metrics view"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json']
+
+    def setUp(self):
+        metrics_registry.clear()
+        self.url = reverse('metrics')
+        self.admin = UserAccount.objects.get(email='bobby@example.org')
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.director = UserAccount.objects.get(email='jsmith@example.org')
+        self.teacher = UserAccount.objects.get(email='barbdutch@example.org')
+
+    def histogram(self, view_name, metric_name):
+        return metrics_registry._histograms[view_name][metric_name]
+
+    def test_metrics_url(self):
+        self.assertEqual(self.url, '/metrics')
+
+    def test_requests_are_recorded_by_url_name(self):
+        self.client.login(email=self.student.email, password='Password123')
+        self.client.get(reverse('student_feed'))
+        self.client.get(reverse('student_feed'))
+
+        self.assertEqual(self.histogram('student_feed', 'msms_request_duration_seconds').count, 2)
+        self.assertGreater(self.histogram('student_feed', 'msms_request_queries').sum, 0)
+        self.assertGreater(self.histogram('student_feed', 'msms_request_sql_seconds').sum, 0)
+        self.assertGreater(self.histogram('student_feed', 'msms_response_size_bytes').sum, 0)
+
+    def test_unresolved_requests_share_one_label(self):
+        self.client.get('/no/such/page')
+        self.assertEqual(self.histogram(UNRESOLVED, 'msms_request_duration_seconds').count, 1)
+
+    def test_streamed_responses_have_no_size(self):
+        self.client.login(email=self.admin.email, password='Password123')
+        self.client.get(reverse('export_history', args=['invoices']))
+        self.assertEqual(self.histogram('export_history', 'msms_request_duration_seconds').count, 1)
+        self.assertEqual(self.histogram('export_history', 'msms_response_size_bytes').count, 0)
+
+    def test_metrics_are_served_to_staff_in_prometheus_format(self):
+        self.client.get(reverse('home'))
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        content = response.content.decode()
+        self.assertIn('# TYPE msms_request_duration_seconds histogram', content)
+        self.assertIn('msms_request_duration_seconds_bucket{view="home",le="+Inf"} 1', content)
+        self.assertIn('msms_request_queries_count{view="home"} 1', content)
+        self.assertIn('# TYPE msms_response_size_bytes histogram', content)
+
+    def test_metrics_are_forbidden_to_students(self):
+        self.client.login(email=self.student.email, password='Password123')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+
+    def test_metrics_are_forbidden_to_teachers(self):
+        self.assertTrue(self.teacher.is_staff)
+        self.client.login(email=self.teacher.email, password='Password123')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+
+    def test_metrics_are_served_to_directors(self):
+        self.client.login(email=self.director.email, password='Password123')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_metrics_redirect_when_not_logged_in(self):
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse_with_next('home', self.url), status_code=302, target_status_code=200)
+
+    @override_settings(SLOW_REQUEST_MS = 0)
+    def test_slow_requests_are_logged_as_json(self):
+        with self.assertLogs('msms.metrics', level='WARNING') as logs:
+            self.client.get(reverse('home'))
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['event'], 'slow_request')
+        self.assertEqual(line['view'], 'home')
+        self.assertEqual(line['status'], 200)
+        self.assertEqual(line['user_id'], None)
+        self.assertIn('duration_ms', line)
+        self.assertIn('sql_ms', line)
+
+    def test_fast_requests_are_not_logged(self):
+        with self.assertNoLogs('msms.metrics', level='WARNING'):
+            self.client.get(reverse('home'))
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram((1, 5, 10))
+        for value in (0, 1, 3, 7, 50):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [(1, 2), (5, 3), (10, 4), ('+Inf', 5)])
+        self.assertEqual(histogram.sum, 61)
+        self.assertEqual(histogram.count, 5)
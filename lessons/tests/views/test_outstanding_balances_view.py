@@ -0,0 +1,198 @@
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from lessons.models import UserAccount, Lesson, LessonType, LessonDuration, LessonStatus, Invoice, InvoiceStatus
+from lessons.ledger import post_invoice
+from lessons.payments import pay_invoice, pay_invoices
+from lessons.outstanding_balances import load_outstanding_page, refresh_outstanding, OUTSTANDING_PAGE_SIZE, REFRESH_CHUNK_SIZE
+from lessons.fragment_cache import fragment_cache
+import datetime
+
+class OutstandingBalancesTestCase(TestCase):
+    """Tests of the outstanding balances computed for the admins"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json']
+
+    def setUp(self):
+        self.url = reverse('outstanding_balances')
+        self.admin = UserAccount.objects.get(email='bobby@example.org')
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.child = UserAccount.objects.get(email='bobbylee@example.org')
+        self.other_student = UserAccount.objects.get(email='janedoe@example.org')
+        self.teacher = UserAccount.objects.get(email='barbdutch@example.org')
+
+    def create_invoice(self, student, number, fees_amount, lesson = None):
+        invoice = Invoice.objects.create(reference_number = f'{student.id}-{number:03}', student_ID = str(student.id), fees_amount = fees_amount,
+            amounts_need_to_pay = fees_amount, lesson_ID = str(lesson.lesson_id) if lesson else '')
+        post_invoice(invoice, student)
+        return invoice
+
+    def create_lesson(self, student, day):
+        return Lesson.objects.create(
+            type = LessonType.INSTRUMENT,
+            duration = LessonDuration.HOUR,
+            lesson_date_time = datetime.datetime(2022, 11, day, 15, 0, tzinfo = timezone.utc),
+            teacher_id = self.teacher,
+            student_id = student,
+            lesson_status = LessonStatus.FULLFILLED,
+        )
+
+    def test_outstanding_balances_url(self):
+        self.assertEqual(self.url, '/outstanding_balances')
+
+    def test_families_are_ranked_by_what_they_owe(self):
+        later_lesson = self.create_lesson(self.student, 20)
+        earlier_lesson = self.create_lesson(self.child, 10)
+        self.create_invoice(self.student, 1, 20, later_lesson)
+        self.create_invoice(self.child, 1, 15, earlier_lesson)
+        paid_invoice = self.create_invoice(self.child, 2, 30)
+        pay_invoice(self.student, paid_invoice, 30)
+        self.create_invoice(self.other_student, 1, 25)
+
+        page = load_outstanding_page(1)
+        self.assertEqual([(row.family, row.outstanding, row.open_invoices) for row in page], [(self.student, 35, 2), (self.other_student, 25, 1)])
+        self.assertEqual(page.families[0].oldest_unpaid, earlier_lesson.lesson_date_time)
+        self.assertIsNone(page.families[1].oldest_unpaid)
+        self.assertEqual(page.families[0].family.balance, -35)
+        self.assertFalse(page.has_previous)
+        self.assertFalse(page.has_next)
+
+    def outstanding_of(self, user):
+        return UserAccount.objects.get(id = user.id).outstanding
+
+    def test_outstanding_is_kept_on_the_family_account(self):
+        child_invoice = self.create_invoice(self.child, 1, 15)
+        invoice = self.create_invoice(self.student, 1, 20)
+        self.assertEqual((self.outstanding_of(self.student), self.outstanding_of(self.child)), (35, 0))
+        pay_invoice(self.student, child_invoice, 5)
+        self.assertEqual(self.outstanding_of(self.student), 30)
+        pay_invoices(self.student, 25)
+        self.assertEqual(self.outstanding_of(self.student), 5)
+
+        invoice.refresh_from_db()
+        invoice.invoice_status = InvoiceStatus.DELETED
+        invoice.save()
+        self.assertEqual(self.outstanding_of(self.student), 0)
+
+    def test_outstanding_follows_the_students_of_the_family(self):
+        self.create_invoice(self.child, 1, 15)
+        child = UserAccount.objects.get(id = self.child.id)
+        child.parent_of_user = self.other_student
+        child.save()
+        self.assertEqual((self.outstanding_of(self.student), self.outstanding_of(self.other_student)), (0, 15))
+
+        child.delete()
+        self.assertEqual(self.outstanding_of(self.other_student), 0)
+
+    def test_refresh_matches_the_kept_outstanding(self):
+        self.create_invoice(self.child, 1, 15)
+        self.create_invoice(self.other_student, 1, 25)
+        kept = list(UserAccount.objects.order_by('id').values_list('id', 'outstanding'))
+        UserAccount.objects.update(outstanding = 0)
+        refresh_outstanding()
+        self.assertEqual(list(UserAccount.objects.order_by('id').values_list('id', 'outstanding')), kept)
+
+    def test_refresh_of_many_students_is_chunked(self):
+        self.create_invoice(self.child, 1, 15)
+        UserAccount.objects.update(outstanding = 0)
+        student_ids = list(range(-2 * REFRESH_CHUNK_SIZE, 0)) + [self.child.id]
+        with self.assertNumQueries(3):
+            refresh_outstanding(student_ids)
+        self.assertEqual(self.outstanding_of(self.student), 15)
+
+    def test_partially_paid_invoices_count_what_is_left(self):
+        invoice = self.create_invoice(self.other_student, 1, 25)
+        pay_invoice(self.other_student, invoice, 10)
+        self.assertEqual([(row.outstanding, row.open_invoices) for row in load_outstanding_page(1)], [(15, 1)])
+
+    def test_families_are_paged(self):
+        for number in range(OUTSTANDING_PAGE_SIZE + 1):
+            student = UserAccount.objects.create_student(first_name = 'Student', last_name = str(number), email = f'student{number}@example.org', password = 'Password123')
+            self.create_invoice(student, 1, 10 + number)
+
+        first_page = load_outstanding_page(1)
+        self.assertEqual(len(first_page), OUTSTANDING_PAGE_SIZE)
+        self.assertEqual(first_page.families[0].outstanding, 10 + OUTSTANDING_PAGE_SIZE)
+        self.assertTrue(first_page.has_next)
+        second_page = load_outstanding_page(2)
+        self.assertEqual([row.outstanding for row in second_page], [10])
+        self.assertTrue(second_page.has_previous)
+        self.assertFalse(second_page.has_next)
+
+    def test_page_is_computed_with_two_queries(self):
+        for number in range(1, 6):
+            self.create_invoice(self.child, number, 10)
+            self.create_invoice(self.other_student, number, 10)
+        with self.assertNumQueries(2):
+            load_outstanding_page(1)
+
+    def test_admin_sees_the_outstanding_balances(self):
+        self.create_invoice(self.child, 1, 15)
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'admin_outstanding_balances.html')
+        self.assertContains(response, self.student.email)
+        self.assertContains(response, reverse('student_invoices_and_transactions', args=[self.student.id]))
+
+    def test_invalid_page_number_shows_the_first_page(self):
+        self.client.login(email=self.admin.email, password='Password123')
+        for page in ['abc', '0', '-3']:
+            response = self.client.get(self.url, {'page': page})
+            self.assertEqual(response.context['page'].number, 1)
+
+    def test_student_cannot_see_the_outstanding_balances(self):
+        self.client.login(email=self.student.email, password='Password123')
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('home'), status_code=302, fetch_redirect_response=False)
+
+
+class OutstandingBalancesCachingTestCase(TransactionTestCase):
+    """Tests that the outstanding balances are served from the cache until an invoice, a payment or an account is written"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json']
+
+    def setUp(self):
+        fragment_cache().clear()
+        self.url = reverse('outstanding_balances')
+        self.admin = UserAccount.objects.get(email='bobby@example.org')
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.child = UserAccount.objects.get(email='bobbylee@example.org')
+        self.other_student = UserAccount.objects.get(email='janedoe@example.org')
+        self.invoice = Invoice.objects.create(reference_number = f'{self.child.id}-001', student_ID = str(self.child.id), fees_amount = 50, amounts_need_to_pay = 50, lesson_ID = '')
+        post_invoice(self.invoice, self.child)
+        self.client.login(email=self.admin.email, password='Password123')
+
+    def tearDown(self):
+        fragment_cache().clear()
+
+    def outstanding(self):
+        return [(row.family.id, row.outstanding) for row in self.client.get(self.url).context['page']]
+
+    def test_repeat_page_makes_no_data_queries(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['page'].families[0].outstanding, 50)
+
+    def test_payments_invalidate_the_page(self):
+        self.assertEqual(self.outstanding(), [(self.student.id, 50)])
+        pay_invoice(self.student, self.invoice, 20)
+        self.assertEqual(self.outstanding(), [(self.student.id, 30)])
+        pay_invoices(self.student, 30)
+        self.assertEqual(self.outstanding(), [])
+
+    def test_invoice_writes_invalidate_the_page(self):
+        self.assertEqual(self.outstanding(), [(self.student.id, 50)])
+        other_invoice = Invoice.objects.create(reference_number = f'{self.other_student.id}-001', student_ID = str(self.other_student.id), fees_amount = 80, amounts_need_to_pay = 80, lesson_ID = '')
+        self.assertEqual(self.outstanding(), [(self.other_student.id, 80), (self.student.id, 50)])
+
+        other_invoice.invoice_status = InvoiceStatus.DELETED
+        other_invoice.save()
+        self.assertEqual(self.outstanding(), [(self.student.id, 50)])
+
+    def test_moving_a_child_to_another_family_invalidates_the_page(self):
+        self.assertEqual(self.outstanding(), [(self.student.id, 50)])
+        self.child.parent_of_user = self.other_student
+        self.child.save()
+        self.assertEqual(self.outstanding(), [(self.other_student.id, 50)])
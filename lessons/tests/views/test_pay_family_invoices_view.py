@@ -0,0 +1,79 @@
+from django.contrib import messages
+from django.test import TestCase
+from django.urls import reverse
+from lessons.models import UserAccount, Invoice, InvoiceStatus, Transaction
+from lessons.ledger import post_invoice
+from lessons.tests.helpers import reverse_with_next
+
+class PayFamilyInvoicesTestCase(TestCase):
+    """Tests of the view paying one amount towards several invoices of a family"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json']
+
+    def setUp(self):
+        self.url = reverse('pay_family_invoices')
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.child = UserAccount.objects.get(email='bobbylee@example.org')
+        self.admin = UserAccount.objects.get(email='bobby@example.org')
+        self.student_invoice = self.create_invoice(self.student, 20)
+        self.child_invoice = self.create_invoice(self.child, 15)
+
+    def create_invoice(self, student, fees_amount):
+        invoice = Invoice.objects.create(reference_number = f'{student.id}-001', student_ID = str(student.id), fees_amount = fees_amount, amounts_need_to_pay = fees_amount, lesson_ID = '1')
+        post_invoice(invoice, student)
+        return invoice
+
+    def last_message(self, response):
+        return list(messages.get_messages(response.wsgi_request))[-1]
+
+    def test_pay_family_invoices_url(self):
+        self.assertEqual(self.url, '/pay_family_invoices/')
+
+    def test_pay_oldest_invoices_first(self):
+        self.client.login(email=self.student.email, password='Password123')
+        response = self.client.post(self.url, {'amounts_pay': 30})
+        self.assertRedirects(response, reverse('balance'), status_code=302, target_status_code=200)
+        message = self.last_message(response)
+        self.assertEqual(str(message), 'Paid £30 towards 2 invoices!')
+        self.assertEqual(message.level, messages.SUCCESS)
+        self.assertEqual(Invoice.objects.get(id = self.student_invoice.id).invoice_status, InvoiceStatus.PAID)
+        self.assertEqual(Invoice.objects.get(id = self.child_invoice.id).amounts_need_to_pay, 5)
+        self.assertEqual(UserAccount.objects.get(id = self.student.id).balance, -5)
+
+    def test_pay_selected_invoices(self):
+        self.client.login(email=self.student.email, password='Password123')
+        response = self.client.post(self.url, {'amounts_pay': 30, 'invoice_references': f' {self.child_invoice.reference_number} , '})
+        self.assertEqual(str(self.last_message(response)), 'Paid £30 towards 1 invoices!')
+        self.assertEqual(Invoice.objects.get(id = self.student_invoice.id).invoice_status, InvoiceStatus.UNPAID)
+        self.assertEqual(Transaction.objects.get().transaction_amount, 30)
+
+    def test_nothing_to_pay(self):
+        self.client.login(email=self.student.email, password='Password123')
+        response = self.client.post(self.url, {'amounts_pay': 30, 'invoice_references': 'unknown'})
+        self.assertEqual(str(self.last_message(response)), 'There are no unpaid invoices to pay!')
+        self.assertEqual(Transaction.objects.count(), 0)
+
+    def test_invalid_amounts(self):
+        self.client.login(email=self.student.email, password='Password123')
+        for amount, error in [('', 'You cannot submit without enter a value!'), ('abc', 'You cannot submit without enter a value!'),
+                              (0, 'Transaction amount cannot be less than 1!'), (10001, 'Transaction amount cannot be larger than 10000!')]:
+            response = self.client.post(self.url, {'amounts_pay': amount})
+            message = self.last_message(response)
+            self.assertEqual(str(message), error)
+            self.assertEqual(message.level, messages.ERROR)
+        self.assertEqual(Transaction.objects.count(), 0)
+
+    def test_pay_family_invoices_without_logging_in(self):
+        response = self.client.post(self.url, {'amounts_pay': 30})
+        self.assertRedirects(response, reverse_with_next('home', self.url), status_code=302, fetch_redirect_response=False)
+
+    def test_admin_cannot_pay(self):
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.post(self.url, {'amounts_pay': 30})
+        self.assertRedirects(response, reverse('home'), status_code=302, fetch_redirect_response=False)
+        self.assertEqual(Transaction.objects.count(), 0)
+
+    def test_balance_page_offers_batch_payment(self):
+        self.client.login(email=self.student.email, password='Password123')
+        response = self.client.get(reverse('balance'))
+        self.assertContains(response, f'action="{self.url}"')
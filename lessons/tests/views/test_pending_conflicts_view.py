@@ -0,0 +1,82 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from lessons.models import UserAccount, Lesson, LessonType, LessonDuration, LessonStatus
+import datetime
+
+class PendingConflictsViewTestCase(TestCase):
+    """Tests of the view listing the pending lessons that overlap another booked or pending lesson"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json']
+
+    def setUp(self):
+        self.url = reverse('pending_conflicts')
+        self.admin = UserAccount.objects.get(email='bobby@example.org')
+        self.director = UserAccount.objects.get(email='jsmith@example.org')
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.other_student = UserAccount.objects.get(email='janedoe@example.org')
+        self.teacher = UserAccount.objects.get(email='barbdutch@example.org')
+
+        self.booked_lesson = self.create_lesson(self.student, 10, LessonStatus.FULLFILLED)
+
+    def create_lesson(self, student, hour, status):
+        return Lesson.objects.create(
+            type = LessonType.INSTRUMENT,
+            duration = LessonDuration.HOUR,
+            lesson_date_time = datetime.datetime(2022, 11, 21, hour, 30, tzinfo = timezone.utc),
+            teacher_id = self.teacher,
+            student_id = student,
+            lesson_status = status,
+        )
+
+    def test_pending_conflicts_url(self):
+        self.assertEqual(self.url, '/pending_conflicts')
+
+    def test_admin_sees_the_conflicting_pending_lessons(self):
+        clash = self.create_lesson(self.other_student, 11, LessonStatus.UNFULFILLED)
+        clash.lesson_date_time = datetime.datetime(2022, 11, 21, 11, 0, tzinfo = timezone.utc)
+        clash.save()
+        self.create_lesson(self.other_student, 14, LessonStatus.UNFULFILLED)
+
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'admin_pending_conflicts.html')
+        queue_conflicts = response.context['queue_conflicts']
+        self.assertEqual(len(queue_conflicts), 1)
+        self.assertEqual(queue_conflicts[0].lesson, clash)
+        self.assertEqual(queue_conflicts[0].conflicts, [self.booked_lesson])
+        self.assertContains(response, reverse('admin_update_request_page', args=[clash.lesson_id]))
+
+    def test_director_sees_an_empty_queue(self):
+        self.client.login(email=self.director.email, password='Password123')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['queue_conflicts'], [])
+        self.assertContains(response, 'No pending lesson of this page overlaps another booked or pending lesson.')
+
+    @override_settings(HISTORY_PAGE_SIZE=1)
+    def test_pending_queue_is_checked_a_page_at_a_time(self):
+        clash = self.create_lesson(self.other_student, 11, LessonStatus.UNFULFILLED)
+        clash.lesson_date_time = datetime.datetime(2022, 11, 21, 11, 0, tzinfo = timezone.utc)
+        clash.save()
+        free = self.create_lesson(self.other_student, 14, LessonStatus.UNFULFILLED)
+
+        self.client.login(email=self.admin.email, password='Password123')
+        response = self.client.get(self.url)
+        page = response.context['page']
+        self.assertEqual(page.items, [clash])
+        self.assertTrue(page.has_next)
+        self.assertEqual([queue_conflict.lesson for queue_conflict in response.context['queue_conflicts']], [clash])
+
+        response = self.client.get(self.url + '?' + response.context['next_query'])
+        page = response.context['page']
+        self.assertEqual(page.items, [free])
+        self.assertFalse(page.has_next)
+        self.assertEqual(response.context['queue_conflicts'], [])
+
+    def test_student_is_redirected_home(self):
+        self.client.login(email=self.student.email, password='Password123')
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('home'), status_code=302, fetch_redirect_response=False)
@@ -0,0 +1,174 @@
+from unittest import skipUnless
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from lessons.models import UserAccount, Lesson, LessonStatus, LessonDuration, Invoice, Transaction
+from lessons.helper import get_student_and_child_lessons, get_saved_lessons, make_lesson_timetable, get_admin_email, check_correct_student_accessing_pending_lesson, check_correct_student_accessing_saved_lesson
+from lessons.ownership import student_owns_invoice
+from lessons.payments import pay_invoice, pay_invoices
+from lessons.views import get_student_invoice, get_student_transaction, get_student_balance, get_child_invoice, update_balance
+from lessons.invoice_references import highest_existing_invoice_number
+from lessons.conflicts import find_conflicts
+from lessons.outstanding_balances import load_outstanding_page
+import datetime
+
+#Statements whose plan is checked, inserts and savepoints never read a table
+EXPLAINED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+
+#Tables read whole on purpose: the term calendar is a handful of rows loaded once and cached
+WHOLE_TABLE_READS = {'lessons_term'}
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is specific to SQLite')
+class HotQueryPlanTestCase(TestCase):
+    """Runs EXPLAIN QUERY PLAN on the hot queries of helper.py and views.py and fails when one of them scans a whole table"""
+
+    fixtures = ['lessons/tests/fixtures/useraccounts.json', 'lessons/tests/fixtures/lessons.json']
+
+    def setUp(self):
+        self.student = UserAccount.objects.get(email='johndoe@example.org')
+        self.child = UserAccount.objects.get(email='bobbylee@example.org')
+        self.admin = UserAccount.objects.get(email='bobby@example.org')
+        self.director = UserAccount.objects.get(email='jsmith@example.org')
+        self.teacher = UserAccount.objects.get(email='barbdutch@example.org')
+        self.lesson = Lesson.objects.get(lesson_id = 1)
+
+    # Runs the function and returns every (sql, params) it sent to the database
+    def capture_statements(self, function):
+        statements = []
+
+        def capture(execute, sql, params, many, context):
+            if not many:
+                statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            function()
+        return statements
+
+    # Returns the lines of the query plans of the statements that scan a whole table
+    def full_scans(self, statements):
+        scans = []
+        for sql, params in statements:
+            if not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = [row[3] for row in cursor.fetchall()]
+            for line in plan:
+                words = line.split()
+                if words[0] == 'SCAN' and words[1] not in WHOLE_TABLE_READS and words[1] != 'CONSTANT' and not words[1].startswith('('):
+                    scans.append(f'{line} in {sql}')
+        return scans
+
+    def assert_uses_indexes(self, function):
+        statements = self.capture_statements(function)
+        self.assertGreater(len(statements), 0)
+        scans = self.full_scans(statements)
+        self.assertEqual(scans, [], 'full table scan:\n' + '\n'.join(scans))
+
+    def assert_page_uses_indexes(self, account, url):
+        self.client.login(email=account.email, password='Password123')
+        response = None
+
+        def request():
+            nonlocal response
+            response = self.client.get(url)
+
+        self.assert_uses_indexes(request)
+        self.assertEqual(response.status_code, 200)
+
+    def test_plans_with_full_scans_are_detected(self):
+        statements = self.capture_statements(lambda: list(Lesson.objects.filter(type = 'INSTR')))
+        self.assertEqual(len(self.full_scans(statements)), 1)
+
+    def test_family_lessons_by_status(self):
+        for status in LessonStatus.values:
+            self.assert_uses_indexes(lambda: list(get_student_and_child_lessons(self.student, status)))
+
+    def test_saved_lessons(self):
+        self.assert_uses_indexes(lambda: list(get_saved_lessons(self.student)))
+
+    def test_requesting_saved_lessons(self):
+        self.assert_uses_indexes(lambda: get_saved_lessons(self.student).update(lesson_status = LessonStatus.UNFULFILLED))
+
+    def test_pending_lesson_ownership(self):
+        self.assert_uses_indexes(lambda: check_correct_student_accessing_pending_lesson(self.student, self.lesson))
+
+    def test_saved_lesson_ownership(self):
+        self.assert_uses_indexes(lambda: check_correct_student_accessing_saved_lesson(self.student, self.lesson))
+
+    def test_invoice_ownership(self):
+        invoice = Invoice.objects.create(reference_number = f'{self.child.id}-001', student_ID = str(self.child.id), fees_amount = 20, amounts_need_to_pay = 20, lesson_ID = '1')
+        self.assert_uses_indexes(lambda: student_owns_invoice(self.student, invoice))
+
+    def test_invoice_payments(self):
+        invoice = Invoice.objects.create(reference_number = f'{self.child.id}-001', student_ID = str(self.child.id), fees_amount = 20, amounts_need_to_pay = 20, lesson_ID = '1')
+        self.assert_uses_indexes(lambda: pay_invoice(self.student, invoice, 5))
+        self.assert_uses_indexes(lambda: pay_invoices(self.student, 5))
+        self.assert_uses_indexes(lambda: pay_invoices(self.student, 5, [invoice.reference_number]))
+
+    def test_outstanding_balances_are_read_in_index_order(self):
+        invoice = Invoice.objects.create(reference_number = f'{self.child.id}-001', student_ID = str(self.child.id), fees_amount = 20, amounts_need_to_pay = 20, lesson_ID = '1')
+        self.assert_uses_indexes(lambda: pay_invoice(self.student, invoice, 5))
+        statements = self.capture_statements(lambda: load_outstanding_page(1))
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(self.full_scans(statements), [])
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + statements[0][0], statements[0][1])
+            plan = [row[3] for row in cursor.fetchall()]
+        self.assertIn('useraccount_outstanding_idx', ' '.join(plan))
+        self.assertNotIn('TEMP B-TREE', ' '.join(plan))
+
+    def test_lesson_timetable(self):
+        self.assert_uses_indexes(lambda: make_lesson_timetable(self.student))
+
+    def test_admin_contact(self):
+        self.assert_uses_indexes(get_admin_email)
+
+    def test_student_invoices_transactions_and_balance(self):
+        self.assert_uses_indexes(lambda: list(get_student_invoice(self.student)))
+        self.assert_uses_indexes(lambda: list(get_student_transaction(self.student)))
+        self.assert_uses_indexes(lambda: list(get_student_balance(self.student)))
+        self.assert_uses_indexes(lambda: get_child_invoice(self.student))
+        self.assert_uses_indexes(lambda: update_balance(self.child))
+
+    def test_lessons_by_status(self):
+        self.assert_uses_indexes(lambda: list(Lesson.objects.filter(lesson_status = LessonStatus.FULLFILLED)))
+        self.assert_uses_indexes(lambda: list(Lesson.objects.filter(lesson_status = LessonStatus.UNFULFILLED)))
+
+    def test_invoice_of_a_lesson(self):
+        self.assert_uses_indexes(lambda: Invoice.objects.filter(booked_lesson = self.lesson).first())
+
+    def test_legacy_student_id_lookups(self):
+        self.assert_uses_indexes(lambda: highest_existing_invoice_number(self.student.id))
+        self.assert_uses_indexes(lambda: list(Transaction.objects.filter(Student_ID_transaction = str(self.student.id))))
+
+    def test_new_account_adopting_its_invoices(self):
+        self.assert_uses_indexes(lambda: UserAccount.objects.create_student(
+            first_name = 'New',
+            last_name = 'Student',
+            email = 'new.student@example.org',
+            password = 'Password123',
+        ))
+
+    def test_lesson_conflicts(self):
+        lesson_date_time = datetime.datetime(2022, 11, 20, 15, 0, tzinfo = timezone.utc)
+        self.assert_uses_indexes(lambda: find_conflicts(self.teacher.id, self.student.id, lesson_date_time, LessonDuration.HOUR))
+
+    def test_student_pages(self):
+        for url_name in ['student_feed', 'requests_page', 'balance']:
+            self.assert_page_uses_indexes(self.student, reverse(url_name))
+
+    def test_admin_pages(self):
+        self.assert_page_uses_indexes(self.admin, reverse('admin_feed'))
+        for section in ['students', 'parents', 'pending', 'booked']:
+            self.assert_page_uses_indexes(self.admin, reverse('admin_feed_section', args=[section]))
+        self.assert_page_uses_indexes(self.admin, reverse('pending_conflicts'))
+        self.assert_page_uses_indexes(self.admin, reverse('outstanding_balances'))
+        self.assert_page_uses_indexes(self.admin, reverse('student_requests', args=[self.student.id]))
+        self.assert_page_uses_indexes(self.admin, reverse('student_invoices_and_transactions', args=[self.student.id]))
+
+    def test_director_pages(self):
+        self.assert_page_uses_indexes(self.director, reverse('director_feed'))
+        self.assert_page_uses_indexes(self.director, reverse('director_manage_roles'))
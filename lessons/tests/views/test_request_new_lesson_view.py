@@ -368,3 +368,48 @@ class RequestNewLessonTest(TestCase):
         self.assertEqual(lessons[1].teacher_id, self.teacher)
 
         self.assertTemplateUsed(response, 'requests_page.html')
+
+    def create_booked_lesson(self, teacher, student):
+        return Lesson.objects.create(
+            type = LessonType.THEORY,
+            duration = LessonDuration.HOUR,
+            lesson_date_time = datetime.datetime(2023, 4, 4, 15, 0, 0, tzinfo=timezone.utc),
+            teacher_id = teacher,
+            student_id = student,
+            lesson_status = LessonStatus.FULLFILLED,
+        )
+
+    def test_unsuccesful_request_overlapping_a_lesson_of_the_teacher(self):
+        self.create_booked_lesson(self.teacher, UserAccount.objects.get(email='janedoe@example.org'))
+        self.client.login(email=self.student.email, password="Password123")
+        before_count = Lesson.objects.count()
+        response = self.client.post(self.url, self.form_input, follow = True)
+        after_count = Lesson.objects.count()
+        self.assertEqual(after_count, before_count)
+
+        self.assertTemplateUsed(response, 'requests_page.html')
+        messages_list = list(response.context['messages'])
+        self.assertEqual(str(messages_list[0]), 'The selected teacher already has a lesson from 2023-04-04 15:00 to 16:00, please choose another time')
+        self.assertEqual(messages_list[0].level, messages.ERROR)
+        self.assertTrue(response.context['form'].is_bound)
+
+    def test_unsuccesful_request_overlapping_a_lesson_of_the_student(self):
+        self.create_booked_lesson(UserAccount.objects.get(email='amanehill@example.org'), self.student)
+        self.client.login(email=self.student.email, password="Password123")
+        before_count = Lesson.objects.count()
+        response = self.client.post(self.url, self.form_input, follow = True)
+        after_count = Lesson.objects.count()
+        self.assertEqual(after_count, before_count)
+
+        messages_list = list(response.context['messages'])
+        self.assertEqual(str(messages_list[0]), 'The student already has a lesson from 2023-04-04 15:00 to 16:00, please choose another time')
+        self.assertEqual(messages_list[0].level, messages.ERROR)
+
+    def test_succesful_request_overlapping_a_saved_lesson(self):
+        lesson = self.create_booked_lesson(self.teacher, self.student)
+        lesson.lesson_status = LessonStatus.SAVED
+        lesson.save()
+        self.client.login(email=self.student.email, password="Password123")
+        before_count = Lesson.objects.count()
+        self.client.post(self.url, self.form_input, follow = True)
+        self.assertEqual(Lesson.objects.count(), before_count+1)
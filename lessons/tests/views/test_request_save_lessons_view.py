@@ -14,6 +14,8 @@ from lessons.tests.helpers import reverse_with_next
 
 from django.db import IntegrityError
 from django.db import transaction
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 class RequestSaveLessonsTest(TestCase):
     """Unit tests for saving lessons and making them a requested set of lessons."""
@@ -155,7 +157,7 @@ class RequestSaveLessonsTest(TestCase):
         self.assertTemplateUsed(response, 'student_feed.html')
 
         messages_list = list(response.context['messages'])
-        self.assertEqual(str(messages_list[0]), 'Lesson requests are now pending for validation by admin')
+        self.assertEqual(str(messages_list[0]), '3 lesson requests are now pending for validation by admin')
         self.assertEqual(messages_list[0].level, messages.SUCCESS)
 
     def test_succesfull_save_lessons_post_with_child_lessons(self):
@@ -182,5 +184,81 @@ class RequestSaveLessonsTest(TestCase):
         self.assertTemplateUsed(response, 'student_feed.html')
 
         messages_list = list(response.context['messages'])
-        self.assertEqual(str(messages_list[0]), 'Lesson requests are now pending for validation by admin')
+        self.assertEqual(str(messages_list[0]), '5 lesson requests are now pending for validation by admin')
         self.assertEqual(messages_list[0].level, messages.SUCCESS)
+
+    def test_save_lessons_post_keeps_the_stored_term_labels(self):
+        self.create_child_lessons()
+        self.create_saved_lessons()
+        Lesson.objects.filter(lesson_id = self.saved_child_lesson.lesson_id).update(term = 'Term : 9')
+        self.client.login(email = self.student.email, password = 'Password123')
+        self.client.post(self.save_lessons_url)
+
+        self.saved_child_lesson.refresh_from_db()
+        self.assertEqual(self.saved_child_lesson.lesson_status, LessonStatus.UNFULFILLED)
+        self.assertEqual(self.saved_child_lesson.term, 'Term : 9')
+
+    def test_save_lessons_post_queries_do_not_grow_with_the_number_of_lessons(self):
+        self.create_saved_lessons()
+        self.client.login(email = self.student.email, password = 'Password123')
+        with CaptureQueriesContext(connection) as few_lessons:
+            self.client.post(self.save_lessons_url)
+
+        for day in range(1, 21):
+            Lesson.objects.create(
+                type = LessonType.PRACTICE,
+                duration = LessonDuration.HOUR,
+                lesson_date_time = datetime.datetime(2022, 12, day, 15, 15, 0, tzinfo=timezone.utc),
+                teacher_id = self.teacher,
+                student_id = self.child,
+                request_date = datetime.date(2022, 10, 15),
+                lesson_status = LessonStatus.SAVED
+            )
+        with CaptureQueriesContext(connection) as many_lessons:
+            response = self.client.post(self.save_lessons_url)
+
+        self.assertEqual(len(many_lessons), len(few_lessons))
+        self.assertEqual(Lesson.objects.filter(lesson_status = LessonStatus.SAVED).count(), 0)
+        messages_list = list(messages.get_messages(response.wsgi_request))
+        self.assertEqual(str(messages_list[-1]), '20 lesson requests are now pending for validation by admin')
+
+    def test_save_lessons_post_keeps_the_overlapping_lessons_saved(self):
+        self.create_child_lessons()
+        self.create_saved_lessons()
+        booked = Lesson.objects.create(
+            type = LessonType.PRACTICE,
+            duration = LessonDuration.THIRTY,
+            lesson_date_time = self.saved_child_lesson.lesson_date_time + datetime.timedelta(minutes = 30),
+            teacher_id = self.teacher,
+            student_id = self.admin,
+            request_date = datetime.date(2022, 10, 15),
+            lesson_status = LessonStatus.FULLFILLED
+        )
+        self.client.login(email = self.student.email, password = 'Password123')
+        response = self.client.post(self.save_lessons_url, follow = True)
+
+        self.assertRedirects(response, reverse('requests_page'), status_code=302, target_status_code=200)
+        messages_list = list(response.context['messages'])
+        self.assertEqual(str(messages_list[0]), '4 lesson requests are now pending for validation by admin')
+        self.assertEqual(str(messages_list[1]), 'The saved lessons starting 2022-11-22 15:15 overlap another lesson and were not requested, please choose another time')
+        self.assertEqual(messages_list[1].level, messages.ERROR)
+
+        self.saved_child_lesson.refresh_from_db()
+        self.assertEqual(self.saved_child_lesson.lesson_status, LessonStatus.SAVED)
+        self.assertEqual(get_student_and_child_lessons(self.student, LessonStatus.UNFULFILLED).count(), 4)
+        self.assertEqual(list(get_saved_lessons(self.student)), [self.saved_child_lesson])
+
+    def test_save_lessons_post_keeps_saved_lessons_overlapping_each_other(self):
+        self.create_child_lessons()
+        Lesson.objects.filter(lesson_id = self.saved_child_lesson2.lesson_id).update(
+            lesson_date_time = self.saved_child_lesson.lesson_date_time + datetime.timedelta(minutes = 15),
+            lesson_end_time = self.saved_child_lesson.lesson_date_time + datetime.timedelta(minutes = 60),
+        )
+        Lesson.objects.filter(lesson_id__in = [1, 2, 3, 4, 5]).delete()
+        self.client.login(email = self.student.email, password = 'Password123')
+        response = self.client.post(self.save_lessons_url, follow = True)
+
+        self.assertRedirects(response, reverse('requests_page'), status_code=302, target_status_code=200)
+        messages_list = list(response.context['messages'])
+        self.assertEqual(str(messages_list[0]), 'The saved lessons starting 2022-11-22 15:15, 2022-11-22 15:30 overlap another lesson and were not requested, please choose another time')
+        self.assertEqual(get_saved_lessons(self.student).count(), 2)
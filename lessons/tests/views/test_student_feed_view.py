@@ -2,7 +2,7 @@
 from django.test import TestCase
 from django.urls import reverse
 from lessons.models import UserAccount, Lesson, Gender, LessonType,LessonDuration,LessonStatus
-from lessons.helper import make_lesson_dictionary, make_lesson_timetable_dictionary,get_student_and_child_objects,get_student_and_child_lessons
+from lessons.helper import make_lesson_dictionary, make_lesson_timetable, TimetableRow,get_student_and_child_objects,get_student_and_child_lessons
 import datetime
 from django.utils import timezone
 from lessons.tests.helpers import reverse_with_next
@@ -104,6 +104,14 @@ class StudentFeedTestCase(TestCase):
 
         return False
 
+    def get_timetable_row(self,timetable,lesson):
+        for row in timetable:
+            if row.lesson_id == lesson.lesson_id:
+                return row
+
+    def check_lesson_in_timetable(self,timetable,expected_lesson):
+        return self.get_timetable_row(timetable,expected_lesson) is not None
+
     def check_all_unfulfilled_lessons(self,list_of_dictionaries):
         self.assertTrue(self.check_lesson_in_returned_dictionary(self.get_dict_from_list(list_of_dictionaries,self.lesson),self.lesson))
         self.assertTrue(self.check_lesson_in_returned_dictionary(self.get_dict_from_list(list_of_dictionaries,self.lesson2),self.lesson2))
@@ -120,12 +128,12 @@ class StudentFeedTestCase(TestCase):
         self.assertEqual(dictionary['Lesson Duration'] , lesson_duration_string)
         self.assertEqual(dictionary['Teacher'] , teacher_name)
 
-    def check_fulfilled_dictionary_equality(self,dictionary,student_id, type_string, lesson_date_without_time_string, lesson_duration_string, teacher_name):
-        self.assertEqual(dictionary['Student'] , student_id)
-        self.assertEqual(dictionary['Lesson'] , type_string)
-        self.assertEqual(dictionary['Lesson Date'] , lesson_date_without_time_string)
-        self.assertEqual(dictionary['Lesson Duration'] , lesson_duration_string)
-        self.assertEqual(dictionary['Teacher'] , teacher_name)
+    def check_timetable_row_equality(self,row,student, type_string, lesson_date_without_time_string, lesson_duration_string, teacher_name):
+        self.assertEqual(row.student , f'{student}')
+        self.assertEqual(row.lesson , type_string)
+        self.assertEqual(row.lesson_date , lesson_date_without_time_string)
+        self.assertEqual(row.lesson_time , lesson_duration_string)
+        self.assertEqual(row.teacher , teacher_name)
 
     def test_dictionary_format_for_unfulfilled_lessons(self):
         self.change_lessons_status_to_unfulfilled()
@@ -142,17 +150,33 @@ class StudentFeedTestCase(TestCase):
         self.check_unfulfilled_dictionary_equality(self.get_dict_from_list(unfullfilled_lessons[request_date_str],self.lesson4)[self.lesson4],self.student,'4',"2022-12-25", "PRACTICE", "45 minutes", "Amane Hill")
         self.check_unfulfilled_dictionary_equality(self.get_dict_from_list(unfullfilled_lessons[request_date_str],self.lesson5)[self.lesson5],self.student,'5',"2022-09-25", "PRACTICE", "45 minutes", "Jonathan Jacks")
 
-    def test_dictionary_format_for_fullfilled_lessons(self):
-        lesson_dict = make_lesson_timetable_dictionary(self.student)
+    def test_timetable_format_for_fullfilled_lessons(self):
+        timetable = make_lesson_timetable(self.student)
 
-        #print(lesson_dict)
-        self.assertEqual(len(lesson_dict),5)
-        #print(lesson_dict[self.lesson])
-        self.check_fulfilled_dictionary_equality(lesson_dict[self.lesson], self.student,LessonType.INSTRUMENT.label, "2022-11-20", "15:15 - 15:45", "Miss Barbare Dutch")
-        self.check_fulfilled_dictionary_equality(lesson_dict[self.lesson2], self.student,LessonType.THEORY.label, "2022-10-20", "16:00 - 16:45", "Miss Barbare Dutch")
-        self.check_fulfilled_dictionary_equality(lesson_dict[self.lesson3], self.student,LessonType.PERFORMANCE.label, "2022-09-20", "09:45 - 10:45", "Mr Amane Hill")
-        self.check_fulfilled_dictionary_equality(lesson_dict[self.lesson4], self.student,LessonType.PRACTICE.label, "2022-12-25", "09:45 - 10:30", "Mr Amane Hill")
-        self.check_fulfilled_dictionary_equality(lesson_dict[self.lesson5], self.student,LessonType.PRACTICE.label, "2022-09-25", "09:45 - 10:30", "Jonathan Jacks")
+        self.assertEqual(len(timetable),5)
+        self.check_timetable_row_equality(self.get_timetable_row(timetable,self.lesson), self.student,LessonType.INSTRUMENT.label, "2022-11-20", "15:15 - 15:45", "Miss Barbare Dutch")
+        self.check_timetable_row_equality(self.get_timetable_row(timetable,self.lesson2), self.student,LessonType.THEORY.label, "2022-10-20", "16:00 - 16:45", "Miss Barbare Dutch")
+        self.check_timetable_row_equality(self.get_timetable_row(timetable,self.lesson3), self.student,LessonType.PERFORMANCE.label, "2022-09-20", "09:45 - 10:45", "Mr Amane Hill")
+        self.check_timetable_row_equality(self.get_timetable_row(timetable,self.lesson4), self.student,LessonType.PRACTICE.label, "2022-12-25", "09:45 - 10:30", "Mr Amane Hill")
+        self.check_timetable_row_equality(self.get_timetable_row(timetable,self.lesson5), self.student,LessonType.PRACTICE.label, "2022-09-25", "09:45 - 10:30", "Jonathan Jacks")
+
+    def test_timetable_is_grouped_by_student_and_sorted_by_date(self):
+        self.create_child_student_with_lessons()
+        timetable = make_lesson_timetable(self.student)
+
+        self.assertEqual([row.lesson_id for row in timetable], [5, 4, 3, 2, 1])
+        self.assertEqual([row.student for row in timetable], [f'{self.student}'] * 2 + [f'{self.child}'] * 3)
+
+    def test_timetable_rows_are_immutable(self):
+        row = make_lesson_timetable(self.student)[0]
+        self.assertIsInstance(row, TimetableRow)
+        with self.assertRaises(AttributeError):
+            row.teacher = 'Someone else'
+
+    def test_timetable_is_read_with_one_query(self):
+        self.create_child_student_with_lessons()
+        with self.assertNumQueries(1):
+            make_lesson_timetable(self.student)
 
     def test_student_feed_url(self):
         self.assertEqual(self.url,'/student_feed/')
@@ -169,11 +193,11 @@ class StudentFeedTestCase(TestCase):
 
         self.assertEqual(admin_email, f'To Further Edit Bookings Contact {self.admin.email}')
         self.assertEqual(len(fullfilled_lessons),5)
-        self.assertTrue(self.check_lesson_in_returned_dictionary(fullfilled_lessons,self.lesson))
-        self.assertTrue(self.check_lesson_in_returned_dictionary(fullfilled_lessons,self.lesson2))
-        self.assertTrue(self.check_lesson_in_returned_dictionary(fullfilled_lessons,self.lesson3))
-        self.assertTrue(self.check_lesson_in_returned_dictionary(fullfilled_lessons,self.lesson4))
-        self.assertTrue(self.check_lesson_in_returned_dictionary(fullfilled_lessons,self.lesson5))
+        self.assertTrue(self.check_lesson_in_timetable(fullfilled_lessons,self.lesson))
+        self.assertTrue(self.check_lesson_in_timetable(fullfilled_lessons,self.lesson2))
+        self.assertTrue(self.check_lesson_in_timetable(fullfilled_lessons,self.lesson3))
+        self.assertTrue(self.check_lesson_in_timetable(fullfilled_lessons,self.lesson4))
+        self.assertTrue(self.check_lesson_in_timetable(fullfilled_lessons,self.lesson5))
         self.assertEqual(greeting_str, 'Welcome back John Doe, this is your feed!')
         self.assertEqual(len(unfullfilled_lessons),0)
         self.assertEqual(response.status_code, 200)
@@ -235,9 +259,9 @@ class StudentFeedTestCase(TestCase):
         self.assertEqual(admin_email, f'To Further Edit Bookings Contact {self.admin.email}')
         self.assertEqual(greeting_str, 'Welcome back John Doe, this is your feed!')
         self.assertEqual(len(fullfilled_lessons),3)
-        self.assertTrue(self.check_lesson_in_returned_dictionary(fullfilled_lessons,self.lesson3))
-        self.assertTrue(self.check_lesson_in_returned_dictionary(fullfilled_lessons,self.lesson4))
-        self.assertTrue(self.check_lesson_in_returned_dictionary(fullfilled_lessons,self.lesson5))
+        self.assertTrue(self.check_lesson_in_timetable(fullfilled_lessons,self.lesson3))
+        self.assertTrue(self.check_lesson_in_timetable(fullfilled_lessons,self.lesson4))
+        self.assertTrue(self.check_lesson_in_timetable(fullfilled_lessons,self.lesson5))
 
         request_date_str = self.lesson.request_date.strftime("%Y-%m-%d")
         self.assertEqual(len(unfullfilled_lessons[request_date_str]),2)
@@ -280,17 +304,17 @@ class StudentFeedTestCase(TestCase):
 
         self.assertEqual(admin_email, f'To Further Edit Bookings Contact {self.admin.email}')
         self.assertEqual(len(fullfilled_lessons),5)
-        self.assertTrue(self.check_lesson_in_returned_dictionary(fullfilled_lessons,self.lesson))
-        self.assertTrue(self.check_lesson_in_returned_dictionary(fullfilled_lessons,self.lesson2))
-        self.assertTrue(self.check_lesson_in_returned_dictionary(fullfilled_lessons,self.lesson3))
-        self.assertTrue(self.check_lesson_in_returned_dictionary(fullfilled_lessons,self.lesson4))
-        self.assertTrue(self.check_lesson_in_returned_dictionary(fullfilled_lessons,self.lesson5))
-
-        self.assertEqual(fullfilled_lessons[self.lesson]['Student'].__str__(), f'{self.child}')
-        self.assertEqual(fullfilled_lessons[self.lesson2]['Student'].__str__(), f'{self.child}')
-        self.assertEqual(fullfilled_lessons[self.lesson3]['Student'].__str__(), f'{self.child}')
-        self.assertEqual(fullfilled_lessons[self.lesson4]['Student'].__str__(), f'{self.student}')
-        self.assertEqual(fullfilled_lessons[self.lesson5]['Student'].__str__(), f'{self.student}')
+        self.assertTrue(self.check_lesson_in_timetable(fullfilled_lessons,self.lesson))
+        self.assertTrue(self.check_lesson_in_timetable(fullfilled_lessons,self.lesson2))
+        self.assertTrue(self.check_lesson_in_timetable(fullfilled_lessons,self.lesson3))
+        self.assertTrue(self.check_lesson_in_timetable(fullfilled_lessons,self.lesson4))
+        self.assertTrue(self.check_lesson_in_timetable(fullfilled_lessons,self.lesson5))
+
+        self.assertEqual(self.get_timetable_row(fullfilled_lessons,self.lesson).student, f'{self.child}')
+        self.assertEqual(self.get_timetable_row(fullfilled_lessons,self.lesson2).student, f'{self.child}')
+        self.assertEqual(self.get_timetable_row(fullfilled_lessons,self.lesson3).student, f'{self.child}')
+        self.assertEqual(self.get_timetable_row(fullfilled_lessons,self.lesson4).student, f'{self.student}')
+        self.assertEqual(self.get_timetable_row(fullfilled_lessons,self.lesson5).student, f'{self.student}')
 
         self.assertEqual(greeting_str, 'Welcome back John Doe, this is your feed!')
         self.assertEqual(len(unfullfilled_lessons),0)
@@ -360,3 +384,15 @@ class StudentFeedTestCase(TestCase):
         redirect_url = reverse('admin_feed')
         self.assertRedirects(response, redirect_url, status_code=302, target_status_code=200)
         self.assertTemplateUsed(response, 'admin_feed.html')
+
+    def test_family_lessons_are_fetched_with_one_query(self):
+        self.create_child_student_with_lessons()
+        with self.assertNumQueries(1):
+            lessons = list(get_student_and_child_lessons(self.student, LessonStatus.FULLFILLED))
+            for lesson in lessons:
+                str(lesson.teacher_id)
+                str(lesson.student_id)
+
+        self.assertEqual(len(lessons), 5)
+        # the parent's own lessons come before those of the children
+        self.assertEqual([lesson.student_id for lesson in lessons], [self.student, self.student, self.child, self.child, self.child])
@@ -2,14 +2,31 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render,redirect
 from django.contrib import messages
 
-from .forms import LogInForm,SignUpForm,RequestForm,TermDatesForm,CreateAdminForm
+from .forms import LogInForm,SignUpForm,RequestForm,TermDatesForm,CreateAdminForm,HistoryFilterForm,ExportFilterForm,FeedSectionPageForm,BatchPaymentForm
 from django.contrib.auth import authenticate,login,logout
 from .models import UserRole, UserAccount, Lesson, LessonStatus, LessonType, Gender, Invoice, Transaction, InvoiceStatus,Term
-from .helper import login_prohibited,check_valid_date,make_lesson_timetable_dictionary,get_student_and_child_objects,get_student_and_child_lessons,get_saved_lessons,get_admin_email,make_lesson_dictionary,check_correct_student_accessing_pending_lesson,check_correct_student_accessing_saved_lesson
+from .term_calendar import term_calendar, start_of_day
+from .ledger import post_invoice, post_invoice_adjustment, reconcile_family_balance
+from .family import root_of, children_of, family_member_ids
+from .invoice_references import allocate_invoice_reference
+from .pagination import keyset_page
+from .exports import EXPORTS, export_rows, export_lines
+from .admin_feed_sections import ADMIN_FEED_SECTIONS
+from .conflicts import find_conflicts, find_queue_conflicts, pending_lessons
+from .bookings import confirm_bookings
+from .fragment_cache import family_fragment, bump_student_version
+from .reference_data import terms_exist
+from .ownership import student_owns_invoice
+from .payments import pay_invoice, pay_invoices
+from .outstanding_balances import outstanding_page
+from .helper import login_prohibited,check_valid_date,make_lesson_timetable,get_student_and_child_objects,get_student_and_child_lessons,get_saved_lessons,get_admin_email,make_lesson_dictionary,check_correct_student_accessing_pending_lesson,check_correct_student_accessing_saved_lesson
 
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import HttpResponseForbidden
-from django.db import IntegrityError
+from django.http import HttpResponseForbidden, StreamingHttpResponse, Http404
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.conf import settings
+from django.utils import timezone
 import datetime
 from itertools import chain
 
@@ -48,7 +65,8 @@ def get_lesson_student(dictionary):
 #This function is call when student is trying to access the balance page from student feed
 # This function will get all the invoices and transactions belongs to this student,
 # If this student has any children, all of his children's invoices will be get is well
-# The student's balance will also be update
+# The student's balance is kept up to date by the ledger, so it is only read here
+# All of it is cached per family and rebuilt after any write to the family, see fragment_cache.py
 # All of the above data will be pass into balance.html and print out
 # If the user that trying to access this page is not identify as student, he will be redirect to home page
 @login_required
@@ -56,68 +74,54 @@ def balance(request):
     if(request.user.is_authenticated and request.user.role == UserRole.STUDENT):
         if request.method == 'GET':
             student = request.user
-            student_invoice = get_student_invoice(student) #this function filter out the invocie with the same student id as the current user
-            student_transaction = get_student_transaction(student) #this function filter out the transaction with the same student id as the current user
-            update_balance(student)
-            student_balance = get_student_balance(student)
-            child_invoices =  get_child_invoice(student)
-            return render(request, 'balance.html', {'student': student, 'Invoice': student_invoice, 'Transaction': student_transaction, 'Balance': student_balance, 'child_invoices': child_invoices})
+            # the invoices, transactions and balance are cached until the family changes
+            balance_data = family_fragment(student, 'balance', lambda: {
+                'Invoice': list(get_student_invoice(student)), #this function filter out the invocie with the same student id as the current user
+                'Transaction': list(get_student_transaction(student)), #this function filter out the transaction with the same student id as the current user
+                'Balance': list(get_student_balance(student)),
+                'child_invoices': get_child_invoice(student),
+            })
+            return render(request, 'balance.html', {'student': student, **balance_data})
     else:
         return redirect('home')
 
 # This function returns all invoices that belongs to the student(params) that insert as a parameter
 # All invoices that filter out will be return
 def get_student_invoice(student):
-    return Invoice.objects.filter(student_ID = student.id)
+    return Invoice.objects.filter(student_account = student)
 
 # This function returns all transactions that belongs to this student(params).
 # All transactionss that filter out will be return
 def get_student_transaction(student):
-    return Transaction.objects.filter( Student_ID_transaction = student.id)
+    return Transaction.objects.filter(student_account = student)
 
 # This function returns the balance of this student.
 # The balance will be return
 def get_student_balance(student):
     return UserAccount.objects.filter(id = student.id).values_list('balance', flat=True)
 
-# this function filter out all children that belongs to this student(params)
-# And then all invoices belong to those children will be filter out and insert into a list
+# this function gets all children that belongs to this student(params)
+# And then all invoices belong to those children are fetched with a single query, grouped child by child
 # This list of invoices will be return
 def get_child_invoice(student):
-    list_of_child_invoice = []
+    child_ids = [child.id for child in children_of(student)]
+    if len(child_ids) == 0:
+        return []
 
-    children = UserAccount.objects.filter(parent_of_user = student)
-    for child in children:
-        child_invoice = Invoice.objects.filter(student_ID = child.id)
-        for invoice in child_invoice:
-            list_of_child_invoice.append(invoice)
+    child_position = {child_id: position for position, child_id in enumerate(child_ids)}
+    child_invoices = Invoice.objects.filter(student_account__in = child_ids).order_by('id')
+    return sorted(child_invoices, key=lambda invoice: child_position[invoice.student_account_id])
 
-    return list_of_child_invoice
 
-
-# This function update the student balance for the student(params)
-# This function filter out all existing invoices that belongs to this student and this student's children
-# This function also filter out all existing transactions that belongs to this student
-# Then a balance will be calculate by adding up fees_amounts of all transactions and using this number to minus fees_amounts of all invoices
+# This function reconciles the balance of the student(params) with his invoices and transactions
+# The balance is normally kept up to date by posting each invoice, adjustment and payment to the ledger, so this is only needed
+# when invoices or transactions were written without going through the ledger (for example from the django admin page)
+# The balance is recalculated as the transactions of this student minus the fees of all invoices of this student and his children,
+# and any difference is posted to the ledger as an adjustment. The balance of a child is carried by his parent
 def update_balance(student):
-    current_existing_invoice = Invoice.objects.filter(student_ID = student.id)
-    current_existing_transaction = Transaction.objects.filter(Student_ID_transaction = student.id)
-    child_invoices = get_child_invoice(student)
-    invoice_fee_total = 0
-    payment_fee_total = 0
-
-    # Functions below are adding up fees for each invoices and transactions
-    for invoice in current_existing_invoice:
-        invoice_fee_total += invoice.fees_amount
-
-    for child_invoice in child_invoices:
-        invoice_fee_total += child_invoice.fees_amount
-
-    for transaction in current_existing_transaction:
-        payment_fee_total += transaction.transaction_amount
-
-    student.balance = payment_fee_total - invoice_fee_total
-    student.save()
+    if student.parent_of_user_id is not None:
+        student = student.parent_of_user
+    reconcile_family_balance(student)
 
 # This function is call when student is trying to pay for he and his children's invoices
 # If the user is identify as student, he will be able to go to the next step, or else he will be redirect to home page
@@ -148,7 +152,7 @@ def pay_for_invoice(request):
                 return redirect('balance')
 
             # check if this invoice belongs to this student or his children or not
-            if(int(temp_invoice.student_ID) != int(student.id) and check_invoice_belong_to_child(temp_invoice, student) == False):
+            if(student_owns_invoice(student, temp_invoice) == False):
                 messages.add_message(request,messages.ERROR,"this invoice does not belong to you or your children!")
             # check if this invoice is paid or not, if it is there's no point to pay for it any more
             elif(temp_invoice.invoice_status == InvoiceStatus.PAID):
@@ -162,20 +166,14 @@ def pay_for_invoice(request):
             # check if the number student insert for the amount they want to pay is larger than 10000, student is not allow to insert number larger than 10000
             elif(input_amounts_pay_int > 10000):
                 messages.add_message(request,messages.ERROR,"Transaction amount cannot be larger than 10000!")
-            # update the status of the invoice, depends on how much student paid
-            else:
-                if(temp_invoice.amounts_need_to_pay <= input_amounts_pay_int):
-                    temp_invoice.invoice_status = InvoiceStatus.PAID
-                    temp_invoice.amounts_need_to_pay = 0
-                elif(temp_invoice.amounts_need_to_pay > input_amounts_pay_int):
-                    temp_invoice.invoice_status = InvoiceStatus.PARTIALLY_PAID
-                    temp_invoice.amounts_need_to_pay -= input_amounts_pay_int
-                # update the balance for student
-                update_balance(student)
-                student.save()
-                temp_invoice.save()
-
-                Transaction.objects.create(Student_ID_transaction = student.id, invoice_reference_transaction = input_invoice_reference, transaction_amount = input_amounts_pay_int)
+            # pay the invoice, the invoice and the balance are updated in one transaction, see lessons/payments.py
+            # the invoice may have been paid off or deleted by another payment since it was read
+            elif(pay_invoice(student, temp_invoice, input_amounts_pay_int) is None):
+                temp_invoice.refresh_from_db(fields = ['invoice_status'])
+                if(temp_invoice.invoice_status == InvoiceStatus.DELETED):
+                    messages.add_message(request,messages.ERROR,"This invoice has already been deleted!")
+                else:
+                    messages.add_message(request,messages.ERROR,"This invoice has already been paid!")
 
             return redirect('balance')
 
@@ -184,34 +182,48 @@ def pay_for_invoice(request):
     else:
         return redirect('home')
 
-# This function checks if the invoice is belongs the student's children or not
-# It filter out all children that belongs to this student by comparing the parent_of_user field of all students and the student(params)
-# If yes then return Ture, else False
-def check_invoice_belong_to_child(temp_invoice, student):
-    children = UserAccount.objects.filter(parent_of_user = student)
-    for child in children:
-        if int(temp_invoice.student_ID) == int(child.id):
-            return True
-    return False
+# This function is called when a student pays one amount towards several invoices of them and their children at once
+# The amount is spread over the invoices whose references were entered, or over all their unpaid invoices oldest first when none were
+# The invoices, the transactions and the balance are all updated in one transaction, see pay_invoices in lessons/payments.py
+@login_required
+def pay_family_invoices(request):
+    if(request.user.is_authenticated and request.user.role == UserRole.STUDENT):
+        if(request.method == 'POST'):
+            form = BatchPaymentForm(request.POST)
+            if not form.is_valid():
+                for errors in form.errors.values():
+                    for error in errors:
+                        messages.add_message(request,messages.ERROR,error)
+                return redirect('balance')
+
+            amount = form.cleaned_data['amounts_pay']
+            payments = pay_invoices(request.user, amount, form.references())
+            if len(payments) == 0:
+                messages.add_message(request,messages.ERROR,"There are no unpaid invoices to pay!")
+            else:
+                messages.add_message(request,messages.SUCCESS,f"Paid £{amount} towards {len(payments)} invoices!")
+
+        return redirect('balance')
+
+    else:
+        return redirect('home')
 
 # This function create new invoice for the student
-# Ths all pre exist invoices of this student will be get
-# As this will be use to construct reference number of new invoices by using function generate_new_invoice_reference_number in Invoice model
+# The reference number of the new invoice is taken from the invoice counter of this student, see allocate_invoice_reference
 # The the fees of this invoice will be calcualted by using calculate_fees_amount function from Invoice model
 # At last, all the about data will be using to create a new invoice for this student
-# And this student's balance will be update as a new invoice created
+# And the new invoice will be posted to the ledger, which updates the family balance
 def create_new_invoice(student_id, lesson):
-        student_number_of_invoice_pre_exist = Invoice.objects.filter(student_ID = student_id)
         try:
             student = UserAccount.objects.get(id=student_id)
         except ObjectDoesNotExist:
             return redirect('home')
-        reference_number_temp = Invoice.generate_new_invoice_reference_number(str(student_id), len(student_number_of_invoice_pre_exist))
+        reference_number_temp = allocate_invoice_reference(student_id)
         lesson_duration = lesson.duration
         fees = Invoice.calculate_fees_amount(lesson_duration)
         fees = int(fees)
-        Invoice.objects.create(reference_number =  reference_number_temp, student_ID = student_id, fees_amount = fees, invoice_status = InvoiceStatus.UNPAID, amounts_need_to_pay = fees, lesson_ID = lesson.lesson_id)
-        update_balance(student)
+        invoice = Invoice.objects.create(reference_number =  reference_number_temp, student_ID = student_id, fees_amount = fees, invoice_status = InvoiceStatus.UNPAID, amounts_need_to_pay = fees, lesson_ID = lesson.lesson_id, student_account = student, booked_lesson = lesson)
+        post_invoice(invoice, student)
 
 # This function update invoice for student when the lesson of this invoice refers to has been modify
 # The fees of the lesson will be recalculate if the duration of the lesson has been changed
@@ -220,8 +232,10 @@ def create_new_invoice(student_id, lesson):
 
 def update_invoice(lesson):
     try:
-        invoice = Invoice.objects.get(lesson_ID = lesson.lesson_id)
-        student = UserAccount.objects.get(id=invoice.student_ID)
+        invoice = Invoice.objects.select_related('student_account').get(booked_lesson = lesson)
+        student = invoice.student_account
+        if student is None:
+            raise UserAccount.DoesNotExist()
 
         fees = Invoice.calculate_fees_amount(lesson.duration)
         fees = int(fees)
@@ -229,46 +243,71 @@ def update_invoice(lesson):
         invoice.fees_amount = fees
         invoice.amounts_need_to_pay += difference_between_invoice
         invoice.save()
-        student = UserAccount.objects.get(id=invoice.student_ID)
 
-        update_balance(student)
+        post_invoice_adjustment(invoice, difference_between_invoice, student)
     except ObjectDoesNotExist: # this only happen in the case admin create lesson directly from django admin page
         fees = Invoice.calculate_fees_amount(lesson.duration)
         students_id_string = str(lesson.student_id.id)
-        student_number_of_invoice_pre_exist = Invoice.objects.filter(student_ID = lesson.student_id.id)
-        reference_number_temp = Invoice.generate_new_invoice_reference_number(students_id_string, len(student_number_of_invoice_pre_exist))
-        Invoice.objects.create(reference_number =  reference_number_temp, student_ID = students_id_string, fees_amount = fees, invoice_status = InvoiceStatus.UNPAID, amounts_need_to_pay = fees, lesson_ID = lesson.lesson_id)
+        reference_number_temp = allocate_invoice_reference(lesson.student_id.id)
+        invoice = Invoice.objects.create(reference_number =  reference_number_temp, student_ID = students_id_string, fees_amount = fees, invoice_status = InvoiceStatus.UNPAID, amounts_need_to_pay = fees, lesson_ID = lesson.lesson_id, student_account = lesson.student_id, booked_lesson = lesson)
+        post_invoice(invoice, lesson.student_id)
 
 # This function will update the invoice status when lesson delete
 # As there's only invoice for booked lesson, so there's a if loop to detect the status of the lesson
 # If the deleted lesson is booked, then invoice status will be set as DELETD and the field will be modify
+# The fees of the deleted invoice are given back to the family balance through the ledger
 def update_invoice_when_delete(lesson):
     if(lesson.lesson_status == LessonStatus.FULLFILLED):
         try:
-            invoice = Invoice.objects.get(lesson_ID = lesson.lesson_id)
+            invoice = Invoice.objects.get(booked_lesson = lesson)
         except ObjectDoesNotExist:
             return redirect('home')
+        difference_between_invoice = 0 - invoice.fees_amount
         invoice.invoice_status = InvoiceStatus.DELETED
         invoice.amounts_need_to_pay = 0
         invoice.fees_amount = 0
         invoice.lesson_ID = ''
+        invoice.booked_lesson = None
         invoice.save()
 
+        post_invoice_adjustment(invoice, difference_between_invoice, lesson.student_id)
+
+
+# This function filters and pages the rows of a history page with the GET parameters of the request
+# Invalid filters are reported with an error message and ignored, the page is then the first page of all rows
+# The page is read with keyset pagination, see lessons/pagination.py
+def get_history_page(request, queryset, status_field, amount_field):
+    filter_form = HistoryFilterForm(request.GET)
+    if filter_form.is_valid():
+        queryset = filter_form.filter_queryset(queryset, status_field, amount_field)
+        page = keyset_page(queryset, filter_form.page_size_value(), filter_form.cleaned_data.get('after'), filter_form.cleaned_data.get('before'))
+    else:
+        messages.add_message(request,messages.ERROR,"Invalid filters!")
+        page = keyset_page(queryset, settings.HISTORY_PAGE_SIZE)
+    return filter_form, queryset, page
+
+# This function builds the query string of the link to another page of a history page, keeping the filters of the request
+def get_history_page_query(request, cursor_name, cursor):
+    query = request.GET.copy()
+    query.pop('after', None)
+    query.pop('before', None)
+    query[cursor_name] = cursor
+    return query.urlencode()
 
 # This function will be call in admin page when press a button to display all students' transactions
 # This function only works when the user is identify as an Admin or a Director, or else the user will be redirect to home page
-# This function also calculate a total of the transaction_amounts of all transactions students made
+# The transactions can be filtered by the status of the invoice they paid for, the student and the transaction amount, and are shown a page at a time
+# This function also calculate a total of the transaction_amounts of all transactions matching the filters in the database
 # Both total and transactions will be pass into transaction_history.html and dispaly in a table
 @login_required
 def get_all_transactions(request):
     try:
         if(request.user.is_authenticated and (request.user.role == UserRole.ADMIN or request.user.role == UserRole.DIRECTOR)):
-            all_transactions = Transaction.objects.all()
-            total = 0
-            for each_transaction in all_transactions:
-                    total+= each_transaction.transaction_amount
+            filter_form, transactions, page = get_history_page(request, Transaction.objects.all(), 'invoice__invoice_status', 'transaction_amount')
+            total = transactions.aggregate(total = Sum('transaction_amount'))['total'] or 0
 
-            return render(request,'transaction_history.html', {'all_transactions': all_transactions, 'total':total})
+            return render(request,'transaction_history.html', {'all_transactions': page.items, 'total':total, 'page': page, 'filter_form': filter_form,
+                'previous_query': get_history_page_query(request, 'before', page.previous_cursor), 'next_query': get_history_page_query(request, 'after', page.next_cursor)})
         else:
             return redirect('home')
     except ObjectDoesNotExist:
@@ -277,20 +316,46 @@ def get_all_transactions(request):
 
 # This function will be call in admin page when press a button to display all students' invoices
 # This function only works when the user is identify as an Admin or a Director, or else the user will be redirect to home page
-# All invoices will be pass into invoices_history.html and dispaly in a table
+# The invoices can be filtered by status, student and fees amount, and are shown a page at a time
+# The invoices of the page will be pass into invoices_history.html and dispaly in a table
 @login_required
 def get_all_invocies(request):
     try:
         if(request.user.is_authenticated and (request.user.role == UserRole.ADMIN or request.user.role == UserRole.DIRECTOR)):
-            all_invoices = Invoice.objects.all()
+            filter_form, invoices, page = get_history_page(request, Invoice.objects.all(), 'invoice_status', 'fees_amount')
 
-            return render(request,'invoices_history.html', {'all_invoices': all_invoices})
+            return render(request,'invoices_history.html', {'all_invoices': page.items, 'page': page, 'filter_form': filter_form,
+                'previous_query': get_history_page_query(request, 'before', page.previous_cursor), 'next_query': get_history_page_query(request, 'after', page.next_cursor)})
         else:
             return redirect('home')
     except ObjectDoesNotExist:
         messages.add_message(request,messages.ERROR,"No such student exist!")
         return redirect('home')
 
+# This function is call when admin or director export the invoices, transactions or lessons of the school
+# The rows can be restricted to a date range and a student, and are exported as CSV or JSON lines (format parameter, CSV by default)
+# The export is streamed to the browser while it is read from the database, see lessons/exports.py
+@login_required
+def export_history(request, export_name):
+    if(request.user.is_authenticated and (request.user.role == UserRole.ADMIN or request.user.role == UserRole.DIRECTOR)):
+        if export_name not in EXPORTS:
+            raise Http404('No such export')
+
+        form = ExportFilterForm(request.GET)
+        if not form.is_valid():
+            messages.add_message(request,messages.ERROR,"Invalid export filters!")
+            return redirect('admin_feed')
+
+        export_format = form.cleaned_data.get('format') or 'csv'
+        rows = export_rows(export_name, form.cleaned_data.get('start_date'), form.cleaned_data.get('end_date'), form.cleaned_data.get('student'))
+        content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+
+        response = StreamingHttpResponse(export_lines(export_name, export_format, rows), content_type = content_type)
+        response['Content-Disposition'] = f'attachment; filename="{export_name}.{export_format}"'
+        return response
+    else:
+        return redirect('home')
+
 # This function will be call when admin or director try to see all invoices and transactions that belongs to this student
 # This function will get all invoices and transactions that belongs to this student and pass them into student_invoices_and_transactions.html
 # Those data will be display as two tables in the page
@@ -299,8 +364,8 @@ def get_student_invoices_and_transactions(request, student_id):
     try:
         if(request.user.is_authenticated and (request.user.role == UserRole.ADMIN or request.user.role == UserRole.DIRECTOR)):
             student = UserAccount.objects.get(id=student_id)
-            all_invoices = Invoice.objects.filter(student_ID = student_id)
-            all_transactions = Transaction.objects.filter(Student_ID_transaction = student_id)
+            all_invoices = Invoice.objects.filter(student_account = student)
+            all_transactions = Transaction.objects.filter(student_account = student)
 
             return render(request, 'student_invoices_and_transactions.html', {'student': student, 'all_invoices': all_invoices, 'all_transactions':all_transactions})
         else:
@@ -314,15 +379,6 @@ def get_student_invoices_and_transactions(request, student_id):
 # Admin functionality view functions
 
 
-def get_parent(student):
-    for eachuser in UserAccount.objects.filter(is_parent = True):
-        child_students = UserAccount.objects.filter(parent_of_user = eachuser)
-        for eachchild in child_students:
-            if(eachchild.id == student.id):
-                return eachuser
-    return None
-
-
 @login_required
 def student_requests(request,student_id):
     if (request.user.is_authenticated and request.user.role == UserRole.ADMIN or request.user.role == UserRole.DIRECTOR):
@@ -373,7 +429,7 @@ def admin_update_request(request, lesson_id):
     if (request.user.is_authenticated and request.user.role == UserRole.ADMIN or request.user.role == UserRole.DIRECTOR):
         if request.method == 'POST':
             try:
-                lesson = Lesson.objects.get(lesson_id=lesson_id)
+                lesson = Lesson.objects.select_related('student_id__parent_of_user').get(lesson_id=lesson_id)
                 form = RequestForm(request.POST)
 
                 if form.is_valid():
@@ -385,6 +441,8 @@ def admin_update_request(request, lesson_id):
                     if (lesson.type == type and lesson.duration == duration and lesson.lesson_date_time == lesson_date_time and lesson.teacher_id == teacher_id):
                         messages.add_message(request, messages.ERROR, 'Lesson details are the same as before!')
                         return render(request,'admin_update_request.html', {'form': form , 'lesson': lesson})
+                    elif report_lesson_conflicts(request, teacher_id, lesson.student_id, lesson_date_time, duration, lesson.lesson_id):
+                        return render(request,'admin_update_request.html', {'form': form , 'lesson': lesson})
                     else:
                         lesson.type = type
                         lesson.duration = duration
@@ -398,14 +456,7 @@ def admin_update_request(request, lesson_id):
 
                         messages.add_message(request, messages.SUCCESS, 'Lesson was successfully updated!')
 
-                        student = UserAccount.objects.get(id=lesson.student_id.id)
-
-                        parent = get_parent(student)
-
-                        if (parent != None):
-                            return redirect('student_requests',parent.id)
-                        else:
-                            return redirect('student_requests',student.id)
+                        return redirect('student_requests',root_of(lesson.student_id).id)
                 else:
                     messages.add_message(request, messages.ERROR, 'Invalid form data!')
                     return redirect('admin_feed')
@@ -423,7 +474,7 @@ def admin_confirm_booking(request, lesson_id):
     if (request.user.is_authenticated and request.user.role == UserRole.ADMIN or request.user.role == UserRole.DIRECTOR):
         if request.method == 'GET':
             try:
-                lesson = Lesson.objects.get(lesson_id=lesson_id)
+                lesson = Lesson.objects.select_related('student_id__parent_of_user').get(lesson_id=lesson_id)
                 if(lesson.lesson_status == LessonStatus.FULLFILLED):
                     messages.add_message(request, messages.INFO, 'Already booked!')
                 else:
@@ -432,14 +483,7 @@ def admin_confirm_booking(request, lesson_id):
                     messages.add_message(request, messages.SUCCESS, 'Successfully Booked!')
                     create_new_invoice(lesson.student_id.id, lesson)
 
-                student = UserAccount.objects.get(id=lesson.student_id.id)
-
-                parent = get_parent(student)
-
-                if (parent != None):
-                    return redirect('student_requests',parent.id)
-                else:
-                    return redirect('student_requests',student.id)
+                return redirect('student_requests',root_of(lesson.student_id).id)
 
             except ObjectDoesNotExist:
                 messages.add_message(request, messages.ERROR, 'Lesson not found !')
@@ -449,27 +493,97 @@ def admin_confirm_booking(request, lesson_id):
     else:
         return redirect('home')
 
+# Books many pending lessons in one transaction: every pending lesson of a family (family), every pending lesson of a term (term)
+# or the lessons ticked on the student requests page (lesson_ids), then shows what was booked and charged
+@login_required
+def admin_bulk_confirm_booking(request):
+    if (request.user.is_authenticated and request.user.role == UserRole.ADMIN or request.user.role == UserRole.DIRECTOR):
+        if request.method == 'POST':
+            lesson_ids = request.POST.getlist('lesson_ids')
+            family = request.POST.get('family', '')
+            term = request.POST.get('term', '')
+
+            if family.isdigit():
+                try:
+                    student = root_of(UserAccount.objects.select_related('parent_of_user').get(id = int(family), role = UserRole.STUDENT))
+                except ObjectDoesNotExist:
+                    messages.add_message(request, messages.ERROR, 'Student does not exist!')
+                    return redirect('admin_feed')
+                lessons = Lesson.objects.filter(student_id__in = family_member_ids(student))
+                selection = f'the family of {student.first_name} {student.last_name}'
+            elif term.isdigit():
+                selected_term = term_calendar.get(int(term))
+                if selected_term == None:
+                    messages.add_message(request, messages.ERROR, 'Term does not exist!')
+                    return redirect('term_management')
+                lessons = Lesson.objects.filter(lesson_date_time__gte = start_of_day(selected_term.start_date), lesson_date_time__lt = start_of_day(selected_term.end_date + datetime.timedelta(days=1)))
+                selection = f'term {selected_term.term_number}'
+            elif len(lesson_ids) > 0 and all(lesson_id.isdigit() for lesson_id in lesson_ids):
+                lessons = Lesson.objects.filter(lesson_id__in = [int(lesson_id) for lesson_id in lesson_ids])
+                selection = f'{len(lesson_ids)} selected lessons'
+            else:
+                messages.add_message(request, messages.ERROR, 'Select the lessons to book first!')
+                return redirect('admin_feed')
+
+            summary = confirm_bookings(lessons)
+            if len(summary.booked) == 0 and len(summary.skipped) == 0:
+                messages.add_message(request, messages.INFO, f'There are no pending lessons to book in {selection}')
+            elif len(summary.booked) > 0:
+                messages.add_message(request, messages.SUCCESS, f'Successfully booked {len(summary.booked)} lessons in {selection}!')
+            if len(summary.skipped) > 0:
+                messages.add_message(request, messages.WARNING, f'{len(summary.skipped)} lessons in {selection} overlap another lesson and were left pending!')
+            return render(request, 'admin_bulk_booking_summary.html', {'summary': summary, 'selection': selection})
+        else:
+            return redirect('admin_feed')
+    else:
+        return redirect('home')
+
+# Lists the pending lessons that overlap another booked or pending lesson of their teacher or of their student
+# The pending lessons are checked a page at a time, see lessons/pagination.py, each page in one pass
+@login_required
+def pending_conflicts(request):
+    if (request.user.is_authenticated and request.user.role == UserRole.ADMIN or request.user.role == UserRole.DIRECTOR):
+        page_form = FeedSectionPageForm(request.GET)
+        if page_form.is_valid():
+            page = keyset_page(pending_lessons(), page_form.page_size_value(), page_form.cleaned_data.get('after'), page_form.cleaned_data.get('before'))
+        else:
+            page = keyset_page(pending_lessons(), settings.HISTORY_PAGE_SIZE)
+
+        queue_conflicts = find_queue_conflicts(page.items)
+        return render(request,'admin_pending_conflicts.html', {'queue_conflicts': queue_conflicts, 'page': page,
+            'previous_query': get_history_page_query(request, 'before', page.previous_cursor), 'next_query': get_history_page_query(request, 'after', page.next_cursor)})
+    else:
+        return redirect('home')
+
+
+# Lists the families ranked by how much their unpaid invoices still owe, a page at a time, see lessons/outstanding_balances.py
+# The pages are cached until an invoice, a payment or a student account is written
+@login_required
+def outstanding_balances(request):
+    if (request.user.is_authenticated and request.user.role == UserRole.ADMIN or request.user.role == UserRole.DIRECTOR):
+        try:
+            number = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            number = 1
+        page = outstanding_page(number)
+        return render(request,'admin_outstanding_balances.html', {'page': page,
+            'previous_query': get_history_page_query(request, 'page', number - 1), 'next_query': get_history_page_query(request, 'page', number + 1)})
+    else:
+        return redirect('home')
 
 @login_required
 def delete_lesson(request, lesson_id):
     if (request.user.is_authenticated and request.user.role == UserRole.ADMIN or request.user.role == UserRole.DIRECTOR):
         if request.method == 'GET':
             try:
-                lesson = Lesson.objects.get(lesson_id=lesson_id)
+                lesson = Lesson.objects.select_related('student_id__parent_of_user').get(lesson_id=lesson_id)
                 if lesson is not None:
                     update_invoice_when_delete(lesson)
                     lesson.delete()
 
                     messages.add_message(request, messages.SUCCESS, 'Lesson was successfully deleted!')
 
-                    student = UserAccount.objects.get(id=lesson.student_id.id)
-
-                    parent = get_parent(student)
-
-                    if (parent != None):
-                        return redirect('student_requests',parent.id)
-                    else:
-                        return redirect('student_requests',student.id)
+                    return redirect('student_requests',root_of(lesson.student_id).id)
             except ObjectDoesNotExist:
                 messages.add_message(request, messages.ERROR, 'The lesson you tried to delete does not exist!')
                 return redirect('admin_feed')
@@ -485,7 +599,7 @@ def delete_lesson(request, lesson_id):
 @login_required
 def term_management_page(request):
     if (request.user.is_authenticated and request.user.role == UserRole.ADMIN or request.user.role == UserRole.DIRECTOR):
-        terms_list = Term.objects.all().order_by('term_number').values()
+        terms_list = term_calendar.all()
         return render(request,'term_management.html', {'terms_list': terms_list})
     else:
         return redirect('home')
@@ -493,7 +607,7 @@ def term_management_page(request):
 @login_required
 def add_term_page(request):
     if (request.user.is_authenticated and request.user.role == UserRole.ADMIN or request.user.role == UserRole.DIRECTOR):
-        if len(Term.objects.all()) < 6:
+        if term_calendar.count() < 6:
             form = TermDatesForm()
             return render(request, 'create_term_form.html', {'form':form})
         else:
@@ -527,21 +641,21 @@ def create_term(request):
 
                 if(term_number!=1):
 
-                    if(len(Term.objects.filter(term_number=term_number)) !=0):
+                    if(term_calendar.get(term_number) != None):
                         messages.add_message(request, messages.ERROR, 'There already exists a term with this term number!')
                         return render(request,'create_term_form.html', {'form': form})
 
-                    if (len(Term.objects.filter(term_number=term_number-1)) !=0):
+                    previous_term = term_calendar.get(term_number-1)
 
-                        previous_term = Term.objects.get(term_number=term_number-1)
+                    if (previous_term != None):
 
                         if(start_date <= previous_term.end_date):
                             messages.add_message(request, messages.ERROR, "This term's start date overlaps with the previous term's ending date!")
                             return render(request, 'create_term_form.html', {'form':form})
 
                 if(term_number!= 6):
-                    if(len(Term.objects.filter(term_number=term_number+1)) !=0):
-                        next_term = Term.objects.get(term_number=term_number+1)
+                    next_term = term_calendar.get(term_number+1)
+                    if(next_term != None):
 
                         if(end_date >= next_term.start_date):
                             messages.add_message(request, messages.ERROR, "This term's end date overlaps with the next term's starting date!")
@@ -563,29 +677,21 @@ def create_term(request):
 def edit_term_details_page(request,term_number):
     if (request.user.is_authenticated and request.user.role == UserRole.ADMIN or request.user.role == UserRole.DIRECTOR):
         if(request.method == 'GET'):
-            try:
-                term = Term.objects.get(term_number=term_number)
-
-                try:
-                    previous_term = Term.objects.get(term_number=str(int(term_number)-1))
-                except ObjectDoesNotExist:
-                    previous_term = None
+            term = term_calendar.get(term_number)
+            if term == None:
+                return redirect('term_management')
 
-                try:
-                    next_term = Term.objects.get(term_number=str(int(term_number)+1))
-                except ObjectDoesNotExist:
-                    next_term = None
+            previous_term = term_calendar.get(int(term_number)-1)
+            next_term = term_calendar.get(int(term_number)+1)
 
-                data = {
-                    'term_number': term.term_number,
-                    'start_date': term.start_date,
-                    'end_date': term.end_date,
-                    }
+            data = {
+                'term_number': term.term_number,
+                'start_date': term.start_date,
+                'end_date': term.end_date,
+                }
 
-                form = TermDatesForm(data)
-                return render(request,'edit_term_form.html', {'form': form, 'term':term,'previous_term':previous_term,'next_term':next_term})
-            except ObjectDoesNotExist:
-                return redirect('term_management')
+            form = TermDatesForm(data)
+            return render(request,'edit_term_form.html', {'form': form, 'term':term,'previous_term':previous_term,'next_term':next_term})
         else:
             return redirect('term_management')
     else:
@@ -608,46 +714,37 @@ def update_term_details(request,term_number):
                         messages.add_message(request, messages.ERROR, "Dates must not be left empty!")
                         return render(request, 'create_term_form.html', {'form':form})
 
-                    if(int(term_number) != int(term_number_in) and len(Term.objects.filter(term_number=term_number_in)) !=0):
+                    if(int(term_number) != int(term_number_in) and term_calendar.get(term_number_in) != None):
                             messages.add_message(request, messages.ERROR, 'There already exists a term with this term number!')
                             return redirect(request,'edit_term_form.html', {'form': form})
 
 
-                    try:
-                        previous_term = Term.objects.get(term_number=str(int(term_number_in)-1))
-
-                        if(int(term_number_in)-1 == int(term_number)):
-                            previous_term = None
-
-                        if(previous_term != None and start_date < previous_term.end_date and term_number != term_number_in):
-                            messages.add_message(request, messages.ERROR, "Term's start date overlaps with the previous term's end date for the chosen term number! Try changing the term number or fix term overlap before attempting to alter term number.")
-                            return render(request,'edit_term_form.html', {'form': form, 'term':term,'previous_term':previous_term})#,'next_term':next_term})
-
-                        if(previous_term != None and start_date < previous_term.end_date):
-                            messages.add_message(request, messages.ERROR, "This term's start date overlaps with the previous term's ending date!")
-                            return render(request,'edit_term_form.html', {'form': form, 'term':term,'previous_term':previous_term})#,'next_term':next_term})
-
+                    previous_term = term_calendar.get(int(term_number_in)-1)
 
-                    except ObjectDoesNotExist:
+                    if(int(term_number_in)-1 == int(term_number)):
                         previous_term = None
 
-                    try:
-                        next_term = Term.objects.get(term_number=str(int(term_number_in)+1))
+                    if(previous_term != None and start_date < previous_term.end_date and term_number != term_number_in):
+                        messages.add_message(request, messages.ERROR, "Term's start date overlaps with the previous term's end date for the chosen term number! Try changing the term number or fix term overlap before attempting to alter term number.")
+                        return render(request,'edit_term_form.html', {'form': form, 'term':term,'previous_term':previous_term})#,'next_term':next_term})
 
-                        if(int(term_number_in)+1 == int(term_number)):
-                            next_term = None
+                    if(previous_term != None and start_date < previous_term.end_date):
+                        messages.add_message(request, messages.ERROR, "This term's start date overlaps with the previous term's ending date!")
+                        return render(request,'edit_term_form.html', {'form': form, 'term':term,'previous_term':previous_term})#,'next_term':next_term})
 
-                        if(next_term!= None and end_date > next_term.start_date and term_number != term_number_in):
-                            messages.add_message(request, messages.ERROR, "Term's end date overlaps with the next term's start date for the chosen term number. Try changing the term number or fix term overlap before attempting to alter term number!")
-                            return render(request,'edit_term_form.html', {'form': form, 'term':term,'previous_term':previous_term,'next_term':next_term})
-
-                        if(next_term!= None and end_date > next_term.start_date):
-                            messages.add_message(request, messages.ERROR, "This term's end date overlaps with the next term's starting date!")
-                            return render(request,'edit_term_form.html', {'form': form, 'term':term,'previous_term':previous_term,'next_term':next_term})
+                    next_term = term_calendar.get(int(term_number_in)+1)
 
-                    except ObjectDoesNotExist:
+                    if(int(term_number_in)+1 == int(term_number)):
                         next_term = None
 
+                    if(next_term!= None and end_date > next_term.start_date and term_number != term_number_in):
+                        messages.add_message(request, messages.ERROR, "Term's end date overlaps with the next term's start date for the chosen term number. Try changing the term number or fix term overlap before attempting to alter term number!")
+                        return render(request,'edit_term_form.html', {'form': form, 'term':term,'previous_term':previous_term,'next_term':next_term})
+
+                    if(next_term!= None and end_date > next_term.start_date):
+                        messages.add_message(request, messages.ERROR, "This term's end date overlaps with the next term's starting date!")
+                        return render(request,'edit_term_form.html', {'form': form, 'term':term,'previous_term':previous_term,'next_term':next_term})
+
                     if(previous_term !=None and next_term !=None  and end_date > next_term.start_date and start_date < previous_term.end_date):
                         messages.add_message(request, messages.ERROR, "This term's end date and start date overlap with other terms!")
                         return render(request,'edit_term_form.html', {'form': form, 'term':term,'previous_term':previous_term,'next_term':next_term})
@@ -717,9 +814,13 @@ def student_feed(request):
         if request.method == 'GET':
             greeting_str = f'Welcome back {request.user}, this is your feed!'
 
-            #get any unfullfilled or fullfilled lessons for both the student and its children
-            fullfilled_lessons = make_lesson_timetable_dictionary(request.user)
-            unfulfilled_requests = make_lesson_dictionary(request.user,"Lesson Request")
+            #get any unfullfilled or fullfilled lessons for both the student and its children, cached until the family changes
+            lessons = family_fragment(request.user, 'student_feed', lambda: {
+                'fullfilled_lessons': make_lesson_timetable(request.user),
+                'unfulfilled_requests': make_lesson_dictionary(request.user,"Lesson Request"),
+            })
+            fullfilled_lessons = lessons['fullfilled_lessons']
+            unfulfilled_requests = lessons['unfulfilled_requests']
 
             admin = get_admin_email()
 
@@ -751,7 +852,7 @@ def student_feed(request):
 def requests_page(request):
     if (request.user.is_authenticated and request.user.role == UserRole.STUDENT):
         if request.method == 'GET':
-            if(len(Term.objects.all()) == 0):
+            if not terms_exist():
                 messages.add_message(request, messages.ERROR, 'Please wait for the admin to add term dates')
                 # return redirect('student_feed')
             student = request.user
@@ -764,20 +865,36 @@ def requests_page(request):
     else:
         return redirect('home')
 
+# The admin feed is a shell of collapsed panels, each panel loads its section from admin_feed_section when it is expanded
+# so the page renders without reading any student or lesson, see lessons/admin_feed_sections.py
 @login_required
 def admin_feed(request):
 
     if (request.user.is_authenticated and (request.user.role == UserRole.ADMIN or request.user.role == UserRole.DIRECTOR)):
-        student = UserAccount.objects.filter(role=UserRole.STUDENT.value,is_parent = False)
-        parents = UserAccount.objects.filter(role=UserRole.STUDENT,is_parent = True)
+        return render(request,'admin_feed.html')
+    else:
+        # return redirect('log_in')
+        return redirect('home')
 
-        fulfilled_lessons = Lesson.objects.filter(lesson_status = LessonStatus.FULLFILLED)
+# This function returns one page of a section of the admin feed (students, parents, pending or booked lessons) as an HTML table
+# The admin feed fetches it when the panel of the section is expanded and when a link to another page of the section is clicked
+# The page is read with keyset pagination, an invalid page request is answered with the first page
+@login_required
+def admin_feed_section(request, section):
+    if (request.user.is_authenticated and (request.user.role == UserRole.ADMIN or request.user.role == UserRole.DIRECTOR)):
+        if section not in ADMIN_FEED_SECTIONS:
+            raise Http404('No such section')
 
-        unfulfilled_lessons = Lesson.objects.filter(lesson_status = LessonStatus.UNFULFILLED)
+        feed_section = ADMIN_FEED_SECTIONS[section]
+        page_form = FeedSectionPageForm(request.GET)
+        if page_form.is_valid():
+            page = keyset_page(feed_section.rows(), page_form.page_size_value(), page_form.cleaned_data.get('after'), page_form.cleaned_data.get('before'))
+        else:
+            page = keyset_page(feed_section.rows(), settings.HISTORY_PAGE_SIZE)
 
-        return render(request,'admin_feed.html',{'student':student,'parents':parents,'fulfilled_lessons':fulfilled_lessons,'unfulfilled_lessons':unfulfilled_lessons})
+        return render(request, feed_section.template, {'section': feed_section, 'section_name': section, 'rows': page.items, 'page': page,
+            'previous_query': get_history_page_query(request, 'before', page.previous_cursor), 'next_query': get_history_page_query(request, 'after', page.next_cursor)})
     else:
-        # return redirect('log_in')
         return redirect('home')
 
 
@@ -1082,6 +1199,30 @@ def sign_up(request):
         form = SignUpForm()
     return render(request, 'sign_up.html', {'form': form})
 
+"""
+@params: request: the request the error message is added to, teacher: teacher UserAccount, student: student UserAccount,
+         lesson_date_time: start of the lesson, duration: LessonDuration value, lesson_id: id of the lesson being edited if any
+
+@Description: Checks that neither the teacher nor the student already has a booked or pending lesson overlapping the lesson
+              Adds an error message naming the first overlapping lesson when there is one
+
+@return: True when the lesson overlaps another lesson, False otherwise
+"""
+def report_lesson_conflicts(request, teacher, student, lesson_date_time, duration, lesson_id = None):
+    conflicts = find_conflicts(teacher.id, student.id, lesson_date_time, duration, exclude_lesson_id = lesson_id)
+    if len(conflicts) == 0:
+        return False
+
+    teacher_conflicts = [lesson for lesson in conflicts if lesson.teacher_id_id == teacher.id]
+    if len(teacher_conflicts) > 0:
+        who, conflict = "The selected teacher", teacher_conflicts[0]
+    else:
+        who, conflict = "The student", conflicts[0]
+    start = timezone.localtime(conflict.lesson_date_time).strftime('%Y-%m-%d %H:%M')
+    end = timezone.localtime(conflict.lesson_end_time).strftime('%H:%M')
+    messages.add_message(request, messages.ERROR, f"{who} already has a lesson from {start} to {end}, please choose another time")
+    return True
+
 """
 @params: Either a post or get request to the url new_lesson associated to new_lesson function in views
 
@@ -1102,7 +1243,7 @@ def new_lesson(request):
             request_form = RequestForm(request.POST)
             if request_form.is_valid():
 
-                if(len(Term.objects.all()) == 0):
+                if not terms_exist():
                     messages.add_message(request, messages.ERROR, 'Please wait for the admin to add term dates')
                     return redirect('requests_page')
 
@@ -1118,6 +1259,10 @@ def new_lesson(request):
                     students_option = get_student_and_child_objects(request.user)
                     return render(request,'requests_page.html', {'form' : request_form , 'lessons': get_saved_lessons(request.user), 'students_option':students_option})
 
+                if report_lesson_conflicts(request, request_form.cleaned_data.get('teachers'), actual_student, request_form.cleaned_data.get('lesson_date_time'), request_form.cleaned_data.get('duration')):
+                    students_option = get_student_and_child_objects(request.user)
+                    return render(request,'requests_page.html', {'form' : request_form , 'lessons': get_saved_lessons(request.user), 'students_option':students_option})
+
                 try:
                     request_form.save(actual_student)
                 except IntegrityError:
@@ -1143,7 +1288,9 @@ def new_lesson(request):
 @Description: Function called when a student attempts save and request the lessons they have created
               Lessons are uniquely identified by their request_date,lesson_Date_time and student_id, enforcing this as the primary key to avoid duplicates
               The student utilising this functionality can save lessons for themselves and for their children
-              POST Requests makes all saved lessons attributed to the student and any of their children into unfullfilled lessons
+              POST Requests makes all saved lessons attributed to the student and any of their children into unfullfilled lessons with a single UPDATE
+              and reports how many lessons were requested. Saved lessons overlapping another booked or pending lesson of their teacher or student,
+              or another saved lesson of the family, are kept saved and reported instead
               GET requests render the requests_page template with any saved lessons
               Only Student UserAccounts can acces this functionality
 
@@ -1153,17 +1300,28 @@ def save_lessons(request):
     if (request.user.is_authenticated and request.user.role == UserRole.STUDENT):
         current_student = request.user
         if request.method == 'POST':
-            all_unsaved_lessons = get_saved_lessons(current_student)
-
-            if len(all_unsaved_lessons) == 0:
+            #One UPDATE over the saved lessons of the family that overlap nothing, the term labels already stored do not depend on the status so they are kept
+            #The account is written first so the write lock is held before the lessons are checked, as in payments.pay_invoices
+            with transaction.atomic():
+                UserAccount.objects.filter(id = current_student.id).update(balance = F('balance'))
+                overlapping = find_queue_conflicts(get_saved_lessons(current_student))
+                requested_lessons = get_saved_lessons(current_student)
+                if len(overlapping) > 0:
+                    requested_lessons = requested_lessons.exclude(lesson_id__in = [queue_conflict.lesson.lesson_id for queue_conflict in overlapping])
+                requested_count = requested_lessons.update(lesson_status = LessonStatus.UNFULFILLED)
+                for member in get_student_and_child_objects(current_student):
+                    bump_student_version(member.id)
+
+            if requested_count == 0 and len(overlapping) == 0:
                 messages.add_message(request,messages.ERROR,"Lessons should be saved before attempting to request")
                 return redirect('requests_page')
 
-            for eachLesson in all_unsaved_lessons:
-                eachLesson.lesson_status = LessonStatus.UNFULFILLED
-                eachLesson.save()
-
-            messages.add_message(request,messages.SUCCESS, "Lesson requests are now pending for validation by admin")
+            if requested_count > 0:
+                messages.add_message(request,messages.SUCCESS, f"{requested_count} lesson requests are now pending for validation by admin")
+            if len(overlapping) > 0:
+                starts = ', '.join(timezone.localtime(queue_conflict.lesson.lesson_date_time).strftime('%Y-%m-%d %H:%M') for queue_conflict in overlapping)
+                messages.add_message(request,messages.ERROR, f"The saved lessons starting {starts} overlap another lesson and were not requested, please choose another time")
+                return redirect('requests_page')
             return redirect('student_feed')
         else:
             return redirect('requests_page')
@@ -1231,6 +1389,9 @@ def edit_lesson(request,lesson_id):
                     messages.add_message(request,messages.ERROR,"The lesson date provided is beyond the term dates available")
                     return render_edit_request(request,lesson_id)
 
+                if report_lesson_conflicts(request, request_form.cleaned_data.get('teachers'), to_edit_lesson.student_id, request_form.cleaned_data.get('lesson_date_time'), request_form.cleaned_data.get('duration'), to_edit_lesson.lesson_id):
+                    return render_edit_request(request,lesson_id)
+
                 try:
                     request_form.update_lesson(to_edit_lesson)
                 except IntegrityError:
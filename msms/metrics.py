@@ -0,0 +1,203 @@
+"""
+Per request instrumentation of the msms project.
+RequestMetricsMiddleware records, for every resolved url name, the request latency, the number of SQL queries, the time spent in
+them and the size of the response as histograms, which the staff only metrics view serves in the Prometheus text format.
+Requests slower than settings.SLOW_REQUEST_MS are also logged as one JSON line on the msms.metrics logger.
+
+Recording a request costs a few dictionary lookups and a bisect per histogram under one lock, and counting queries wraps each
+database call with a perf_counter pair, so it can stay on in production. The histograms live in the memory of the process,
+every worker of a multi process server keeps and serves its own
+"""
+import json
+import logging
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from threading import Lock
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+from lessons.models import UserRole
+
+logger = logging.getLogger('msms.metrics')
+
+#Upper bounds of the histogram buckets, a last +Inf bucket is always added
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SIZE_BUCKETS = (1000, 5000, 10000, 50000, 100000, 500000, 1000000, 5000000)
+
+#Label of the requests that did not resolve to any url
+UNRESOLVED = '<unresolved>'
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Returns the (upper bound, cumulative count) pairs of the buckets, the last bound being '+Inf'
+    def cumulative(self):
+        total = 0
+        buckets = []
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            total += count
+            buckets.append((bound, total))
+        return buckets
+
+"""
+Description of one metric: its Prometheus name, help text and histogram buckets, and the RequestSample attribute it observes
+"""
+class Metric:
+    def __init__(self, name, description, bounds, attribute):
+        self.name = name
+        self.description = description
+        self.bounds = bounds
+        self.attribute = attribute
+
+METRICS = (
+    Metric('msms_request_duration_seconds', 'Request latency in seconds by url name', DURATION_BUCKETS, 'duration'),
+    Metric('msms_request_queries', 'SQL queries run per request by url name', QUERY_BUCKETS, 'queries'),
+    Metric('msms_request_sql_seconds', 'Time spent in SQL queries per request in seconds by url name', DURATION_BUCKETS, 'sql_time'),
+    Metric('msms_response_size_bytes', 'Response body size in bytes by url name, streamed responses are not counted', SIZE_BUCKETS, 'size'),
+)
+
+# Measurements of one request
+class RequestSample:
+    def __init__(self, view_name, duration, queries, sql_time, size):
+        self.view_name = view_name
+        self.duration = duration
+        self.queries = queries
+        self.sql_time = sql_time
+        self.size = size
+
+"""
+Histograms of every metric per url name, shared by all the threads of the process
+"""
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = Lock()
+        self._histograms = {}
+
+    def record(self, sample):
+        with self._lock:
+            histograms = self._histograms.get(sample.view_name)
+            if histograms is None:
+                histograms = {metric.name: Histogram(metric.bounds) for metric in METRICS}
+                self._histograms[sample.view_name] = histograms
+            for metric in METRICS:
+                value = getattr(sample, metric.attribute)
+                if value is not None:
+                    histograms[metric.name].observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._histograms = {}
+
+    """
+    @return type: String
+
+    @Description: Returns every histogram in the Prometheus text exposition format
+    """
+    def render(self):
+        with self._lock:
+            snapshot = {
+                view_name: {name: (histogram.cumulative(), histogram.sum, histogram.count) for name, histogram in histograms.items()}
+                for view_name, histograms in self._histograms.items()
+            }
+
+        lines = []
+        for metric in METRICS:
+            lines.append(f'# HELP {metric.name} {metric.description}')
+            lines.append(f'# TYPE {metric.name} histogram')
+            for view_name in sorted(snapshot):
+                buckets, total, count = snapshot[view_name][metric.name]
+                label = escape_label(view_name)
+                for bound, cumulative_count in buckets:
+                    lines.append(f'{metric.name}_bucket{{view="{label}",le="{bound}"}} {cumulative_count}')
+                lines.append(f'{metric.name}_sum{{view="{label}"}} {total}')
+                lines.append(f'{metric.name}_count{{view="{label}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+metrics_registry = MetricsRegistry()
+
+# Database execute wrapper counting the queries of a request and the time spent in them
+class QueryCounter:
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
+
+"""
+Middleware recording the metrics of every request into metrics_registry, it is the first middleware so the time spent
+in the other middleware (sessions, authentication, messages) is part of the request latency
+"""
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        view_name = UNRESOLVED
+        if request.resolver_match is not None:
+            view_name = request.resolver_match.view_name
+
+        size = None
+        if not response.streaming:
+            size = len(response.content)
+
+        metrics_registry.record(RequestSample(view_name, duration, counter.queries, counter.seconds, size))
+
+        if duration * 1000 >= settings.SLOW_REQUEST_MS:
+            log_slow_request(request, response, view_name, duration, counter, size)
+
+        return response
+
+# Writes the slow request as one JSON line, so the log can be searched and aggregated by field
+def log_slow_request(request, response, view_name, duration, counter, size):
+    user = getattr(request, 'user', None)
+    logger.warning(json.dumps({
+        'event': 'slow_request',
+        'view': view_name,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 3),
+        'queries': counter.queries,
+        'sql_ms': round(counter.seconds * 1000, 3),
+        'response_bytes': size,
+        'user_id': user.id if user is not None and user.is_authenticated else None,
+    }))
+
+# Serves the histograms in the Prometheus text format, only to admins and directors
+# Teachers are staff accounts too, so the role is checked rather than is_staff
+@login_required
+def metrics(request):
+    if request.user.role not in (UserRole.ADMIN, UserRole.DIRECTOR):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics_registry.render(), content_type = 'text/plain; version=0.0.4; charset=utf-8')
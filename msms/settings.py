@@ -7,6 +7,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 from django.contrib.messages import constants as message_constants
 from datetime import date
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'msms.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,6 +84,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # the tests run on a database file like the site does: an in memory database shared between threads locks whole tables
+        # and fails at once instead of waiting, so concurrent writes could not be tested on it. The file is kept in the system
+        # temporary directory, away from the repository
+        'TEST': {
+            'NAME': os.path.join(tempfile.gettempdir(), 'msms_test_db.sqlite3'),
+        },
     }
 }
 
@@ -167,3 +175,68 @@ MESSAGE_TAGS = {
 # Store the current date
 
 CURRENT_DATE = date.today()
+
+# Number of rows shown per page of the invoice and transaction history pages, and the most a request may ask for
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+# The fragments cache keeps the per family fragments of the student feed and balance pages, the reference data, the outstanding
+# balances and the versions the term calendar of every worker is checked against, see lessons/fragment_cache.py.
+# It must be shared by every worker serving the site, otherwise a worker keeps serving what another worker changed until it
+# expires. In production point it at a shared backend such as redis or memcached (see the README). The file based cache below
+# is the default for a single machine, kept outside the repository unless MSMS_FRAGMENT_CACHE_DIR says otherwise. It holds
+# up to FRAGMENT_CACHE_MAX_ENTRIES entries before culling, which must cover the fragments of every active family, and the
+# prefix keeps its keys apart from other sites sharing the backend. A per process cache (LocMemCache) is only correct with a
+# single worker. The tests and the benchmarks always use their own throwaway cache, see msms/test_runner.py
+
+FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get('MSMS_FRAGMENT_CACHE_MAX_ENTRIES', 100000))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('MSMS_FRAGMENT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'msms_fragment_cache')),
+        'KEY_PREFIX': 'msms',
+        'OPTIONS': {
+            'MAX_ENTRIES': FRAGMENT_CACHE_MAX_ENTRIES,
+        },
+    },
+}
+
+# Cache alias the fragments are kept in and for how many seconds
+
+FRAGMENT_CACHE = 'fragments'
+FRAGMENT_CACHE_TIMEOUT = 600
+
+# Longest time in seconds a worker keeps using its term calendar before checking whether another worker changed the terms,
+# see lessons/term_calendar.py
+
+TERM_CALENDAR_CHECK_SECONDS = 1
+
+# Runs the tests with their own fragment cache, see msms/test_runner.py
+
+TEST_RUNNER = 'msms.test_runner.IsolatedCacheTestRunner'
+
+# Requests taking at least this many milliseconds are logged on the msms.metrics logger, see msms/metrics.py
+
+SLOW_REQUEST_MS = 1000
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'msms.metrics': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
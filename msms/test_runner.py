@@ -0,0 +1,46 @@
+from contextlib import ExitStack, contextmanager
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+"""
+Test runner keeping the fragments of the tests away from the ones of the site.
+The tests and the benchmarks clear and fill the cache named by FRAGMENT_CACHE, so they get their own file based cache in a
+fresh temporary directory under their own key prefix for as long as they run, whatever the site is configured with
+"""
+
+#Key prefix of the fragments cached by the tests and the benchmarks
+TEST_KEY_PREFIX = 'msms-test'
+
+"""
+@Description: Points the cache named by FRAGMENT_CACHE at a fresh temporary directory for the duration of the block and removes
+              the directory afterwards
+"""
+@contextmanager
+def isolated_fragment_cache():
+    location = tempfile.mkdtemp(prefix = 'msms-fragments-')
+    fragments = dict(
+        settings.CACHES[settings.FRAGMENT_CACHE],
+        BACKEND = 'django.core.cache.backends.filebased.FileBasedCache',
+        LOCATION = location,
+        KEY_PREFIX = TEST_KEY_PREFIX,
+    )
+    try:
+        with override_settings(CACHES = {**settings.CACHES, settings.FRAGMENT_CACHE: fragments}):
+            yield location
+    finally:
+        shutil.rmtree(location, ignore_errors = True)
+
+# The default runner, with the fragments of the test run kept in an isolated cache, see isolated_fragment_cache
+class IsolatedCacheTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.isolated_cache = ExitStack()
+        self.isolated_cache.enter_context(isolated_fragment_cache())
+
+    def teardown_test_environment(self, **kwargs):
+        self.isolated_cache.close()
+        super().teardown_test_environment(**kwargs)
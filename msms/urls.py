@@ -16,6 +16,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 from lessons import views
+from msms import metrics
 from django.contrib.auth import views as auth_views
 
 #Required for admin DateTimeField
@@ -35,6 +36,7 @@ urlpatterns = [
     path('edit_lesson/<int:lesson_id>', views.edit_lesson, name = 'edit_lesson'),
 
     path('admin_feed', views.admin_feed, name = 'admin_feed'),
+    path('admin_feed/<str:section>', views.admin_feed_section, name = 'admin_feed_section'), # one page of the students, parents, pending or booked lessons of the admin feed
 
     path('director_manage_roles/', views.director_manage_roles, name = 'director_manage_roles'),
     path('director_feed', views.director_feed, name = 'director_feed'),
@@ -52,17 +54,23 @@ urlpatterns = [
 
     path('balance/', views.balance, name = 'balance'), # this is the url for student balance page that shows all the information relates to balance, invoices and transactions
     path('pay_for_invoice/', views.pay_for_invoice, name = 'pay_for_invoice'), # this is the url for function that allows student to pay for his and his children's invoices
+    path('pay_family_invoices/', views.pay_family_invoices, name = 'pay_family_invoices'), # this is the url for function that allows student to pay one amount towards several of their own and their children's invoices
     path('transaction_history/', views.get_all_transactions,name='transaction_history'), # this is the url for transaction_history that dispaly all students' transaction history in a table
     path('invoices_history/', views.get_all_invocies, name = 'invoices_history'), # this is the url for invoices_history that dispaly all students' invoice history in a table
+    path('export/<str:export_name>', views.export_history, name = 'export_history'), # this is the url that streams the invoices, transactions or lessons as a CSV or JSON lines file
     path('student_invoices_and_transactions/<str:student_id>', views.get_student_invoices_and_transactions, name = 'student_invoices_and_transactions'), # this is the url for student_invoices_and_transactions page 
                                                                                                                                                         # that display all the transactions and invoices history for on particular student
 
     path('log_out/', views.log_out, name = 'log_out'),
+    path('metrics', metrics.metrics, name = 'metrics'), # this is the url that serves the request metrics of msms/metrics.py in the Prometheus text format, to staff only
 
     path('student_requests/<str:student_id>', views.student_requests, name='student_requests'),
     path('admin_update_request_page/<str:lesson_id>', views.admin_update_request_page,name='admin_update_request_page'),
     path('admin_confirm_booking/<str:lesson_id>', views.admin_confirm_booking,name='admin_confirm_booking'),
+    path('admin_bulk_confirm_booking', views.admin_bulk_confirm_booking, name='admin_bulk_confirm_booking'), # books the selected pending lessons, or all those of a family or term, in one transaction
     path('admin_update_request/<str:lesson_id>', views.admin_update_request, name='admin_update_request'),
+    path('pending_conflicts', views.pending_conflicts, name='pending_conflicts'), # lists the pending lessons overlapping another booked or pending lesson of their teacher or student
+    path('outstanding_balances', views.outstanding_balances, name='outstanding_balances'), # lists the families ranked by how much their unpaid invoices still owe
     path('delete_lesson/<str:lesson_id>', views.delete_lesson, name='delete_lesson'),
 
     path('term_management', views.term_management_page, name='term_management'),